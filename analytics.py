@@ -0,0 +1,446 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import database
+from carbon_emission_db import ACTIVITY_TABLES
+
+# A columnar snapshot holds each activity table as one binary file per column
+# (carbon_emission_columns/Transportation/day.int64, ...) that is opened with
+# np.memmap, so aggregates over millions of rows are a few vectorized NumPy
+# operations on the mapped pages instead of a scan that decodes every row's
+# text date and subtype. Dates are day numbers (days since 1970-01-01, the
+# int64 of a datetime64[D], NaT for NULL), subtypes the dimension codes (0 for
+# NULL) and users their User_ID (-1 for NULL). manifest.json holds the row
+# counts, the subtype and location names by code, and a fingerprint of every
+# table that tells whether the database has changed since the export.
+
+# Files of each activity table: column -> (dtype, SQL of its value)
+COLUMNS = {
+    'id': ('int64', "{id}"),
+    'day': ('int64', "COALESCE(CAST(julianday(date(Date)) - 2440587.5 AS INTEGER), -9223372036854775808)"),
+    'user': ('int32', "COALESCE(User_ID, -1)"),
+    'code': ('int32', "COALESCE({code}, 0)"),
+    'quantity': ('float64', "{quantity}")
+}
+# Files of User_Profile, for aggregates by location
+USER_COLUMNS = {'user': 'int32', 'location': 'int32'}
+
+# Rows read from SQLite per chunk while exporting
+EXPORT_CHUNK_ROWS = 100000
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+def snapshot_directory(db_path=None):
+    """Default snapshot directory of a database file, next to it"""
+    base, _ = os.path.splitext(database.database_file(db_path))
+    return base + '_columns'
+
+def fingerprint_sql(table):
+    """SQL of an activity table's fingerprint: its row count and sums of every column
+
+    Any insert or delete, and any update of a user, subtype, quantity or date,
+    changes it; only an edit that leaves every sum as it was (two rows
+    swapping their values) goes unseen.
+    """
+    spec = ACTIVITY_TABLES[table]
+    return (f"SELECT COUNT(*), MAX({spec['id']}), TOTAL({spec['id']}), TOTAL(User_ID), TOTAL({spec['code']}), "
+            f"TOTAL({spec['quantity']}), TOTAL(julianday(Date)) FROM {spec['data']}")
+
+def fingerprints(conn):
+    """The fingerprint of every activity table, and a hash of the users' locations"""
+    result = {table: list(conn.execute(fingerprint_sql(table)).fetchone()) for table in ACTIVITY_TABLES}
+    users = conn.execute("SELECT User_ID, Location FROM User_Profile ORDER BY User_ID").fetchall()
+    result['User_Profile'] = hashlib.sha1(repr(users).encode()).hexdigest()
+    return result
+
+def source_connection(db_path=None, archive=False):
+    """The connection a snapshot is read from: the database file, or with every archived year too"""
+    if archive:
+        from archive import connection_for
+        return connection_for(db_path=db_path)
+    return database.get_connection(db_path)
+
+def write_columns(cursor, directory, columns, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write the rows of a cursor to one file per column; return (rows, NULLs per float column)"""
+    dtype = np.dtype([(name, kind) for name, kind in columns.items()])
+    files = {name: open(os.path.join(directory, f"{name}.{kind}"), 'wb') for name, kind in columns.items()}
+    rows, nulls = 0, {name: 0 for name, kind in columns.items() if kind.startswith('float')}
+    try:
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            # NULLs of the float columns become NaN here; the others were replaced in the SQL
+            values = np.array(chunk, dtype=dtype)
+            for name, file in files.items():
+                np.ascontiguousarray(values[name]).tofile(file)
+            for name in nulls:
+                nulls[name] += int(np.isnan(values[name]).sum())
+            rows += len(values)
+    finally:
+        for file in files.values():
+            file.close()
+    return rows, nulls
+
+def names_by_code(conn, sql):
+    """A list of names indexed by code (None at 0) from (code, name) rows"""
+    rows = conn.execute(sql).fetchall()
+    names = [None] * (max((code for code, _ in rows), default=0) + 1)
+    for code, name in rows:
+        if code > 0:
+            names[code] = name
+    return names
+
+def export_snapshot(db_path=None, directory=None, archive=False, progress=None):
+    """Write the columnar snapshot of the activity tables and User_Profile; return the manifest
+
+    Everything is read in one transaction, so the columns and the fingerprints
+    describe the same state of the database. The snapshot is written next to
+    the old one and swapped in when complete; snapshots already open keep the
+    files they mapped. `archive` includes the years moved out by archive.py.
+    progress(table, rows) is called after each table.
+    """
+    directory = directory or snapshot_directory(db_path)
+    conn = source_connection(db_path, archive)
+    for table, spec in ACTIVITY_TABLES.items():
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (spec['data'],)).fetchone():
+            raise ValueError("Migrate the database before exporting (python carbon_emission_db.py --migrate)")
+
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'source': database.database_file(db_path),
+        'archive': archive,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'tables': {}
+    }
+    conn.execute("BEGIN")
+    try:
+        for table, spec in ACTIVITY_TABLES.items():
+            os.makedirs(os.path.join(staging, table))
+            select = ", ".join(sql.format(**spec) for _, sql in COLUMNS.values())
+            cursor = conn.execute(f"SELECT {select} FROM {spec['data']} ORDER BY {spec['id']}")
+            rows, nulls = write_columns(cursor, os.path.join(staging, table),
+                                        {name: kind for name, (kind, _) in COLUMNS.items()})
+            manifest['tables'][table] = {
+                'rows': rows,
+                'nulls': nulls,
+                'subtypes': names_by_code(conn, f"SELECT {spec['code']}, {spec['subtype']} FROM {spec['dimension']}")
+            }
+            if progress:
+                progress(table, rows)
+
+        # Locations are coded in order of their names, 0 standing for NULL
+        users = conn.execute("SELECT User_ID, Location FROM User_Profile ORDER BY User_ID").fetchall()
+        locations = [None] + sorted({location for _, location in users if location is not None})
+        codes = {name: code for code, name in enumerate(locations)}
+        os.makedirs(os.path.join(staging, 'User_Profile'))
+        for name, values in (('user', [user for user, _ in users]),
+                             ('location', [codes[location] for _, location in users])):
+            np.array(values, dtype=USER_COLUMNS[name]).tofile(
+                os.path.join(staging, 'User_Profile', f"{name}.{USER_COLUMNS[name]}")
+            )
+        manifest['users'] = {'rows': len(users), 'locations': locations}
+        if progress:
+            progress('User_Profile', len(users))
+
+        manifest['fingerprints'] = fingerprints(conn)
+    finally:
+        conn.rollback()
+
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return manifest
+
+# Snapshots already checked against their database: directory -> (created
+# stamp, write counters of the tables, id of the connection checked on, its
+# data_version then). A snapshot is checked again only after a write.
+_lock = threading.Lock()
+_checked = {}
+
+def checked_tables():
+    """Tables whose writes may make a snapshot stale, as database.record_writes names them"""
+    return [name for table, spec in ACTIVITY_TABLES.items() for name in (table, spec['data'])] + ['User_Profile']
+
+class Snapshot:
+    """A columnar snapshot opened with np.memmap
+
+    column() maps a file on first use and returns it without copying; the
+    aggregates below read only the pages of the columns they need.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        if self.manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{directory} was written by another version; export it again")
+        self._columns = {}
+        self._user_locations = None
+
+    def rows(self, table):
+        """Number of rows of a table"""
+        if table == 'User_Profile':
+            return self.manifest['users']['rows']
+        return self.manifest['tables'][table]['rows']
+
+    def column(self, table, name):
+        """A column of a table ('User_Profile' or an activity table) as a read-only array"""
+        key = (table, name)
+        if key not in self._columns:
+            kind = USER_COLUMNS[name] if table == 'User_Profile' else COLUMNS[name][0]
+            rows = self.rows(table)
+            path = os.path.join(self.directory, table, f"{name}.{kind}")
+            # np.memmap cannot map an empty file
+            self._columns[key] = (np.memmap(path, dtype=kind, mode='r', shape=(rows,)) if rows
+                                  else np.empty(0, dtype=kind))
+        return self._columns[key]
+
+    def has_nulls(self, table, name):
+        """Whether a float column holds NaN for NULL"""
+        return self.manifest['tables'][table]['nulls'].get(name, 0) > 0
+
+    def subtypes(self, table):
+        """Subtype names of a table indexed by code"""
+        return self.manifest['tables'][table]['subtypes']
+
+    def user_locations(self):
+        """Location code of every User_ID (-1 for no profile), with a -1 at the end for NULL users"""
+        if self._user_locations is None:
+            users = self.column('User_Profile', 'user')
+            lookup = np.full((int(users.max()) if len(users) else 0) + 2, -1, dtype=np.int32)
+            lookup[users] = self.column('User_Profile', 'location')
+            self._user_locations = lookup
+        return self._user_locations
+
+    def stale_tables(self, conn):
+        """The tables whose fingerprint in `conn`'s database differs from the snapshot's"""
+        current = fingerprints(conn)
+        return [table for table, values in self.manifest['fingerprints'].items() if current.get(table) != values]
+
+    def is_fresh(self, conn=None, db_path=None):
+        """Whether the snapshot still matches the database
+
+        The fingerprints are compared once, then again only after this process
+        records a write to one of the tables or PRAGMA data_version shows
+        another connection committed.
+        """
+        conn = conn or source_connection(db_path, self.manifest['archive'])
+        versions = database.write_versions(checked_tables(), db_path)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        state = (self.manifest['created'], versions, id(conn), data_version)
+        with _lock:
+            if _checked.get(self.directory) == state:
+                return True
+        if self.stale_tables(conn):
+            return False
+        with _lock:
+            _checked[self.directory] = state
+        return True
+
+def open_snapshot(db_path=None, directory=None, archive=False, refresh=False):
+    """Open the snapshot of a database, checking that it is current
+
+    A missing or stale snapshot is exported again when `refresh` is set, and
+    raises ValueError otherwise.
+    """
+    directory = directory or snapshot_directory(db_path)
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        if not refresh:
+            raise ValueError(f"No snapshot in {directory}; export one (python analytics.py --export)")
+        export_snapshot(db_path, directory, archive)
+    snapshot = Snapshot(directory)
+    if snapshot.manifest['archive'] != archive or not snapshot.is_fresh(db_path=db_path):
+        if not refresh:
+            problem = "is out of date" if snapshot.manifest['archive'] == archive else (
+                "includes the archived years" if snapshot.manifest['archive'] else "leaves out the archived years")
+            raise ValueError(f"The snapshot in {directory} {problem}; export it again (python analytics.py --export)")
+        export_snapshot(db_path, directory, archive)
+        snapshot = Snapshot(directory)
+    return snapshot
+
+def group_totals(snapshot, table, groups, size, valid=None):
+    """Count, total and mean of a table's quantity per group (0 <= group < size)
+
+    Totals of groups without a non-NULL quantity are NaN, as SQL's SUM and AVG
+    give NULL. `valid` masks out rows that belong to no group.
+    """
+    quantity = snapshot.column(table, 'quantity')
+    if valid is not None:
+        groups, quantity = groups[valid], quantity[valid]
+    counts = np.bincount(groups, minlength=size)
+    if snapshot.has_nulls(table, 'quantity'):
+        present = ~np.isnan(quantity)
+        groups, quantity = groups[present], quantity[present]
+    filled = np.bincount(groups, minlength=size)
+    totals = np.bincount(groups, weights=quantity, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = totals / filled
+    totals[filled == 0] = np.nan
+    return counts, totals, means
+
+def totals_frame(names, counts, totals, means, name_column):
+    """DataFrame of the groups that have rows"""
+    used = counts > 0
+    return pd.DataFrame({
+        name_column: np.asarray(names, dtype=object)[used],
+        'Count': counts[used],
+        'Total': totals[used],
+        'Average': means[used]
+    })
+
+def by_subtype(snapshot, table):
+    """Count, total and average quantity per subtype (Vehicle_Type, ...)"""
+    names = snapshot.subtypes(table)
+    counts, totals, means = group_totals(snapshot, table, snapshot.column(table, 'code'), len(names))
+    return totals_frame(names, counts, totals, means, ACTIVITY_TABLES[table]['subtype'])
+
+def by_month(snapshot, table):
+    """Count, total and average quantity per month ('YYYY-MM', '' for rows without a date)"""
+    days = snapshot.column(table, 'day')
+    valid = days != np.iinfo(np.int64).min
+    if not valid.any():
+        counts, totals, means = group_totals(snapshot, table, np.zeros(len(days), dtype=np.intp), 1)
+        return totals_frame([''], counts, totals, means, 'Month')
+
+    # Group of every day between the first and the last, looked up for each
+    # row: far cheaper than converting every row's date to a month. Group 0
+    # holds the rows without a date, as Monthly_Rollup's '' month does.
+    first, last = int(days[valid].min()), int(days[valid].max())
+    months = np.arange(first, last + 1).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    lookup = months - months[0] + 1
+    if valid.all():
+        groups = lookup[days - first]
+    else:
+        groups = np.zeros(len(days), dtype=lookup.dtype)
+        groups[valid] = lookup[days[valid] - first]
+    size = int(lookup[-1]) + 1
+    counts, totals, means = group_totals(snapshot, table, groups, size)
+    names = [''] + [str(np.datetime64(int(months[0]) + offset, 'M')) for offset in range(size - 1)]
+    return totals_frame(names, counts, totals, means, 'Month')
+
+def by_location(snapshot, table):
+    """Count, total and average quantity per location of the rows' users (rows without a profile left out)"""
+    names = snapshot.manifest['users']['locations']
+    lookup = snapshot.user_locations()
+    locations = lookup[np.clip(snapshot.column(table, 'user'), -1, len(lookup) - 1)]
+    valid = locations >= 0
+    counts, totals, means = group_totals(snapshot, table, locations, len(names), valid)
+    return totals_frame(names, counts, totals, means, 'Location')
+
+# The named queries (predefined_queries.py) answered from a snapshot: the
+# table, the grouping, the columns kept under the query's names, and its
+# ORDER BY column and direction
+NAMED_AGGREGATES = {
+    "Monthly Energy Consumption": ('Energy_Consumption', by_month, {'Month': 'Month', 'Total': 'Total_KWH'},
+                                   ('Month', True)),
+    "Most Common Transportation Type": ('Transportation', by_subtype, {'Vehicle_Type': 'Vehicle_Type', 'Count': 'Count'},
+                                        ('Count', False)),
+    "Total Waste by Type": ('Waste_Management', by_subtype, {'Waste_Type': 'Waste_Type', 'Total': 'Total_Weight'},
+                            ('Total_Weight', False)),
+    "Average Emission by Industry Type": ('Industrial_Activity', by_subtype,
+                                          {'Activity_Type': 'Activity_Type', 'Average': 'Average_Emission'},
+                                          ('Average_Emission', False)),
+    "Waste Reduction by Month": ('Waste_Management', by_month, {'Month': 'Month', 'Total': 'Total_Waste'},
+                                 ('Month', True)),
+    "Transportation Distance by Vehicle Type": ('Transportation', by_subtype,
+                                                {'Vehicle_Type': 'Vehicle_Type', 'Total': 'Total_Distance'},
+                                                ('Total_Distance', False)),
+    "Energy Source Distribution": ('Energy_Consumption', by_subtype,
+                                   {'Energy_Source': 'Energy_Source', 'Count': 'Usage_Count', 'Total': 'Total_KWH'},
+                                   ('Total_KWH', False)),
+    "Industry Emission by Location": ('Industrial_Activity', by_location,
+                                      {'Location': 'Location', 'Total': 'Total_Emission'}, ('Total_Emission', False))
+}
+
+def named_aggregate(snapshot, name):
+    """The result of a named query in NAMED_AGGREGATES, as a DataFrame with the query's columns and order"""
+    table, group, columns, (order, ascending) = NAMED_AGGREGATES[name]
+    frame = group(snapshot, table)[list(columns)].rename(columns=columns)
+    return frame.sort_values(order, ascending=ascending, kind='stable', na_position='last').reset_index(drop=True)
+
+def same_rows(frame, rows, tolerance=1e-6):
+    """Whether a DataFrame holds the rows of a SQL result, in any order, floats within a relative tolerance"""
+    if len(frame) != len(rows):
+        return False
+    key = lambda row: tuple((value is None, '' if value is None else str(value)) for value in row[:1])
+    expected = sorted(rows, key=key)
+    actual = sorted([tuple(None if isinstance(v, float) and np.isnan(v) else v for v in row)
+                     for row in frame.itertuples(index=False)], key=key)
+    for a, b in zip(actual, expected):
+        for x, y in zip(a, b):
+            if isinstance(y, float) or isinstance(x, float):
+                if x is None or y is None:
+                    if x is not y:
+                        return False
+                elif abs(x - y) > tolerance * max(1.0, abs(y)):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+def run_benchmark(db_path=None, directory=None, archive=False, repeat=3):
+    """Time every named aggregate in SQL and on the snapshot, checking that they agree"""
+    from predefined_queries import predefined_queries
+    conn = source_connection(db_path, archive)
+    snapshot = open_snapshot(db_path, directory, archive)
+    print(f"{'query':42} {'SQL':>9} {'snapshot':>9}  same")
+    for name in NAMED_AGGREGATES:
+        # Each side runs back to back: a SQLite scan in between leaves NumPy
+        # to fault its scratch memory in again
+        sql_times, snapshot_times = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = conn.execute(predefined_queries[name]).fetchall()
+            sql_times.append(time.perf_counter() - started)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            frame = named_aggregate(snapshot, name)
+            snapshot_times.append(time.perf_counter() - started)
+        print(f"{name:42} {min(sql_times) * 1000:7.1f}ms {min(snapshot_times) * 1000:7.1f}ms  "
+              f"{'yes' if same_rows(frame, rows) else 'NO'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar snapshot of the activity tables for analytic scans")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--dir", help="snapshot directory (default: the database name with _columns)")
+    parser.add_argument("--archive", action="store_true", help="include the rows moved to archive files by archive.py")
+    parser.add_argument("--export", action="store_true", help="write the snapshot")
+    parser.add_argument("--check", action="store_true", help="tell whether the snapshot matches the database")
+    parser.add_argument("--benchmark", action="store_true", help="time the named aggregates in SQL and on the snapshot")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query when benchmarking (best is shown)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    if not (args.export or args.check or args.benchmark):
+        parser.error("nothing to do: give --export, --check and/or --benchmark")
+
+    try:
+        if args.export:
+            started = time.perf_counter()
+            export_snapshot(directory=args.dir, archive=args.archive, progress=lambda table, rows: print(
+                f"{table}: {rows:,} rows ({time.perf_counter() - started:.1f} s)", flush=True
+            ))
+            print(f"Snapshot written to {args.dir or snapshot_directory()}")
+        if args.check:
+            snapshot = Snapshot(args.dir or snapshot_directory())
+            stale = snapshot.stale_tables(source_connection(archive=snapshot.manifest['archive']))
+            print(f"Out of date: {', '.join(stale)}" if stale else f"Current (exported {snapshot.manifest['created']})")
+        if args.benchmark:
+            run_benchmark(directory=args.dir, archive=args.archive, repeat=args.repeat)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
@@ -0,0 +1,329 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from datetime import date
+import database
+from carbon_emission_db import (ACTIVITY_TABLES, create_data_table, create_indexes, decode_sql, emission_sql,
+                                encoded, record_tables, record_values_sql, rollup_key_sql, table_exists,
+                                totals_amount_column)
+
+# Activity rows dated before a cutoff can be moved out of the database file
+# into one file per year (carbon_emission_2022.db next to carbon_emission.db)
+# holding the same data tables and indexes; Archive_Year in the main file lists
+# them. Moving a row out updates the totals, rollups and emission records as
+# deleting it would, so the main file's derived tables cover the rows still in
+# it, and its scans, backups and VACUUMs skip the archived years.
+#
+# Readers whose date range reaches into an archived year use connection_for():
+# a second connection with just the years needed ATTACHed and TEMP views that
+# shadow the activity views, their data tables and the derived tables with
+# UNION ALLs over the main file and the archives, so the same SQL (the
+# reports, the named queries) sees the whole history. Every other date range
+# is read from the main file alone.
+
+# Schema name of an attached year
+SCHEMA = 'archive_{year}'
+
+# Rows moved per transaction
+MOVE_CHUNK_ROWS = 50000
+
+# SQLite attaches at most this many files to a connection (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED = 10
+
+def create_archive_table(cursor):
+    """Create the Archive_Year table listing the archive files"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Archive_Year (
+        Year INTEGER PRIMARY KEY,
+        File VARCHAR(255) NOT NULL,
+        Row_Count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+def archive_file(year, db_path=None):
+    """Name of a year's archive file, next to the database file"""
+    base, extension = os.path.splitext(os.path.basename(database.database_file(db_path)))
+    return f"{base}_{year}{extension or '.db'}"
+
+def archive_path(file, db_path=None):
+    """Full path of an archive file listed in Archive_Year"""
+    return os.path.join(os.path.dirname(database.database_file(db_path)), file)
+
+def create_archive_file(path):
+    """Create an archive file's data tables and their indexes, if missing
+
+    The file keeps SQLite's default rollback journal: it is written only by
+    archive_rows(), so it needs no WAL files beside it.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            for table in ACTIVITY_TABLES:
+                create_data_table(cursor, table)
+            create_indexes(cursor)
+    finally:
+        conn.close()
+
+def year_of(value, default):
+    """The year of an ISO date string, or `default` for None"""
+    return default if value is None else int(str(value)[:4])
+
+def archived_years(conn, date_from=None, date_to=None):
+    """Years with an archive file that may hold rows dated date_from to date_to (None: unbounded)"""
+    if not table_exists(conn.cursor(), 'Archive_Year'):
+        return []
+    return [year for (year,) in conn.execute(
+        "SELECT Year FROM Archive_Year WHERE Year BETWEEN ? AND ? ORDER BY Year",
+        (year_of(date_from, 0), year_of(date_to, 9999))
+    )]
+
+def register_year(conn, year, db_path=None):
+    """List a year in Archive_Year, creating its file, and return the file's path"""
+    row = conn.execute("SELECT File FROM Archive_Year WHERE Year = ?", (year,)).fetchone()
+    if row is not None:
+        path = archive_path(row[0], db_path)
+    else:
+        file = archive_file(year, db_path)
+        path = archive_path(file, db_path)
+        # A file left by an earlier database of the same name would mix its rows in
+        if os.path.exists(path):
+            raise ValueError(f"{path} exists but is not an archive of this database; move it away first")
+        with conn:
+            conn.execute("INSERT INTO Archive_Year (Year, File) VALUES (?, ?)", (year, file))
+    create_archive_file(path)
+    return path
+
+def archive_rows(before, db_path=None, chunk_rows=MOVE_CHUNK_ROWS, progress=None):
+    """Move the activity rows dated before `before` (an ISO date) into their year's archive file
+
+    Each chunk is copied into the archive and committed, then deleted from the
+    main file (with the derived tables updated by the delete triggers) and
+    committed, so the job can be stopped at any point and run again; only a
+    crash between the two commits leaves rows in both files, until the next
+    run moves them. The year is listed in Archive_Year before its first rows
+    are copied, so no committed state hides a row from readers.
+
+    The newest row of each table stays in the main file: SQLite gives new
+    rows the largest id plus one, so keeping it means an archived id is never
+    handed out again. progress(table, year, rows moved so far) is called
+    after each chunk. Returns the number of rows moved.
+    """
+    conn = database.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        for table in ACTIVITY_TABLES:
+            if not encoded(cursor, table):
+                raise ValueError("Migrate the database before archiving (python carbon_emission_db.py --migrate)")
+        with conn:
+            create_archive_table(cursor)
+
+        moved = 0
+        for table, spec in ACTIVITY_TABLES.items():
+            data, row_id = spec['data'], spec['id']
+            columns = ", ".join([row_id, 'User_ID', spec['code'], spec['quantity'], 'Date'])
+            newest = cursor.execute(f"SELECT MAX({row_id}) FROM {data}").fetchone()[0]
+            years = [int(year) for (year,) in cursor.execute(
+                f"SELECT DISTINCT substr(Date, 1, 4) FROM {data} "
+                f"WHERE Date < ? AND Date GLOB '[0-9][0-9][0-9][0-9]-*' AND {row_id} < ?",
+                (before, newest)
+            )]
+            for year in sorted(years):
+                path = register_year(conn, year, db_path)
+                schema = SCHEMA.format(year=year)
+                cursor.execute("ATTACH DATABASE ? AS " + schema, (path,))
+                try:
+                    bounds = (f"{year:04d}-01-01", min(before, f"{year + 1:04d}-01-01"), newest)
+                    done = 0
+                    while True:
+                        # Rows are taken in id order, so each chunk's search
+                        # starts where the last one ended
+                        last = cursor.execute(
+                            f"SELECT MAX({row_id}) FROM (SELECT {row_id} FROM main.{data} "
+                            f"WHERE {row_id} > ? AND Date >= ? AND Date < ? AND {row_id} < ? "
+                            f"ORDER BY {row_id} LIMIT ?)",
+                            (done,) + bounds + (chunk_rows,)
+                        ).fetchone()[0]
+                        if last is None:
+                            break
+                        where = f"{row_id} > ? AND {row_id} <= ? AND Date >= ? AND Date < ? AND {row_id} < ?"
+                        params = (done, last) + bounds
+                        with conn:
+                            cursor.execute(
+                                f"INSERT OR IGNORE INTO {schema}.{data} ({columns}) "
+                                f"SELECT {columns} FROM main.{data} WHERE {where}", params
+                            )
+                        with conn:
+                            cursor.execute(f"DELETE FROM main.{data} WHERE {where}", params)
+                            count = cursor.rowcount
+                            cursor.execute(
+                                "UPDATE Archive_Year SET Row_Count = Row_Count + ? WHERE Year = ?", (count, year)
+                            )
+                        database.record_writes(None, db_path)
+                        moved += count
+                        done = last
+                        if progress:
+                            progress(table, year, moved)
+                finally:
+                    cursor.execute("DETACH DATABASE " + schema)
+        return moved
+    finally:
+        conn.close()
+
+def attached_years(conn):
+    """Years attached to a connection"""
+    prefix = SCHEMA.format(year='')
+    return {int(name[len(prefix):]) for _, name, _ in conn.execute("PRAGMA database_list")
+            if name.startswith(prefix)}
+
+def union_sql(arms):
+    """The SELECTs as one UNION ALL"""
+    return "\nUNION ALL\n".join(arms)
+
+def totals_columns():
+    """User_Emission_Totals' columns after User_ID, as (name, how the files' values combine)"""
+    columns = []
+    for spec in ACTIVITY_TABLES.values():
+        prefix = spec['category']
+        columns += [(totals_amount_column(spec), 'SUM'), (f"{prefix}_Records", 'SUM'), (f"Has_{prefix}", 'MAX')]
+    return columns + [('Net_Emissions', 'SUM')]
+
+def archive_views_sql(cursor, years):
+    """CREATE TEMP VIEW statements shadowing the tables and views that hold activity with ones over the archives"""
+    schemas = [SCHEMA.format(year=year) for year in years]
+    statements = []
+
+    # Each archive's rows with their subtype names, decoded as the activity
+    # views do (the dimension tables are only in the main file)
+    decoded = {}
+    for table, spec in ACTIVITY_TABLES.items():
+        data, row_id = spec['data'], spec['id']
+        columns = f"r.{row_id}, r.User_ID, r.{spec['code']}, r.{spec['quantity']}, r.Date"
+        statements.append(f"CREATE TEMP VIEW {data} AS " + union_sql(
+            [f"SELECT {columns} FROM main.{data} r"] + [f"SELECT {columns} FROM {schema}.{data} r" for schema in schemas]
+        ))
+        decoded[table] = [
+            f"SELECT r.{row_id}, r.User_ID, {decode_sql(cursor, spec, 'r')} AS {spec['subtype']}, "
+            f"r.{spec['quantity']}, r.Date FROM {schema}.{data} r" for schema in schemas
+        ]
+        statements.append(f"CREATE TEMP VIEW {table} AS " + union_sql([f"SELECT * FROM main.{table}"] + decoded[table]))
+
+    # Emission records, rollups and totals of the archived rows are computed
+    # as they are read, so they always follow the current Emission_Factor
+    statements.append("CREATE TEMP VIEW Emission_Record AS " + union_sql(
+        ["SELECT * FROM main.Emission_Record"] + [
+            f"SELECT NULL, {', '.join(record_values_sql(ACTIVITY_TABLES[table], 'r'))} FROM ({rows}) r"
+            for table in record_tables() for rows in decoded[table]
+        ]
+    ))
+    # A (user, category, subtype, month) with rows in several files has a
+    # row per file; the named queries sum them
+    statements.append("CREATE TEMP VIEW Monthly_Rollup AS " + union_sql(
+        ["SELECT * FROM main.Monthly_Rollup"] + [
+            f"SELECT {', '.join(rollup_key_sql(spec, 'r'))}, COUNT(*), COALESCE(SUM(r.{spec['quantity']}), 0), "
+            f"SUM({emission_sql(spec, 'r')}) FROM ({rows}) r GROUP BY 1, 2, 3, 4"
+            for table, spec in ACTIVITY_TABLES.items() for rows in decoded[table]
+        ]
+    ))
+    columns = totals_columns()
+    arms = ["SELECT * FROM main.User_Emission_Totals"]
+    for table, spec in ACTIVITY_TABLES.items():
+        emission = f"SUM({emission_sql(spec, 'r')})"
+        values = {
+            totals_amount_column(spec): emission, f"{spec['category']}_Records": "COUNT(*)",
+            f"Has_{spec['category']}": "1", 'Net_Emissions': f"{spec['sign']} * {emission}"
+        }
+        select = ", ".join(values.get(name, "0") for name, _ in columns)
+        arms += [f"SELECT r.User_ID, {select} FROM ({rows}) r WHERE r.User_ID IS NOT NULL GROUP BY r.User_ID"
+                 for rows in decoded[table]]
+    statements.append(
+        f"CREATE TEMP VIEW User_Emission_Totals AS SELECT User_ID, "
+        f"{', '.join(f'{how}({name}) AS {name}' for name, how in columns)} "
+        f"FROM ({union_sql(arms)}) GROUP BY User_ID"
+    )
+
+    # The main file's other views (Carbon_Footprint_View) read the main
+    # tables only; their TEMP copies read the views above
+    for (sql,) in cursor.execute(
+        f"SELECT sql FROM main.sqlite_master WHERE type = 'view' AND name NOT IN "
+        f"({', '.join('?' for _ in ACTIVITY_TABLES)})", list(ACTIVITY_TABLES)
+    ).fetchall():
+        statements.append(re.sub(r'^\s*CREATE\s+VIEW', 'CREATE TEMP VIEW', sql, count=1, flags=re.IGNORECASE))
+    return statements
+
+def attach_years(conn, years, db_path=None):
+    """Attach the archive files of the years and (re)create the TEMP views over them"""
+    attached = attached_years(conn)
+    if len(attached | set(years)) > MAX_ATTACHED:
+        raise ValueError(f"The date range reaches {len(attached | set(years))} archived years; "
+                         f"SQLite attaches at most {MAX_ATTACHED} files, so narrow the range")
+    for year, file in conn.execute(
+        f"SELECT Year, File FROM main.Archive_Year WHERE Year IN ({', '.join('?' for _ in years)})", list(years)
+    ).fetchall():
+        if year not in attached:
+            path = archive_path(file, db_path)
+            # ATTACH would create an empty file in its place
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"The archive of {year} ({path}) is missing")
+            conn.execute("ATTACH DATABASE ? AS " + SCHEMA.format(year=year), (path,))
+
+    cursor = conn.cursor()
+    for (name,) in cursor.execute("SELECT name FROM temp.sqlite_master WHERE type = 'view'").fetchall():
+        cursor.execute(f"DROP VIEW temp.{name}")
+    for statement in archive_views_sql(cursor, sorted(attached_years(conn))):
+        cursor.execute(statement)
+
+def connection_for(date_from=None, date_to=None, db_path=None):
+    """The connection to read activity dated date_from to date_to with (None: unbounded)
+
+    This thread's pooled connection when no archived year falls in the range;
+    otherwise this thread's archive connection, with those years attached
+    (on top of any attached before) and the TEMP views over them. Writes
+    belong on the pooled connection: the archive connection's activity
+    tables are views.
+    """
+    conn = database.get_connection(db_path)
+    years = archived_years(conn, date_from, date_to)
+    if not years:
+        return conn
+    reader = database.get_connection(db_path, name='archive')
+    if not set(years) <= attached_years(reader):
+        attach_years(reader, years, db_path)
+    return reader
+
+def archive_status(db_path=None):
+    """(year, file, rows) of every archive file"""
+    conn = database.get_connection(db_path)
+    if not table_exists(conn.cursor(), 'Archive_Year'):
+        return []
+    return conn.execute("SELECT Year, File, Row_Count FROM Archive_Year ORDER BY Year").fetchall()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old activity rows into per-year archive files")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--before", default=date.today().replace(month=1, day=1).isoformat(),
+                        help="archive rows dated before this day (default: January 1 of this year)")
+    parser.add_argument("--chunk-rows", type=int, default=MOVE_CHUNK_ROWS, help="rows moved per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database file afterwards")
+    parser.add_argument("--list", action="store_true", help="only list the archive files")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+
+    if not args.list:
+        started = time.perf_counter()
+        try:
+            moved = archive_rows(args.before, chunk_rows=args.chunk_rows, progress=lambda table, year, rows: print(
+                f"{table} {year}: {rows:,} rows moved ({time.perf_counter() - started:.1f} s)", flush=True
+            ))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Moved {moved:,} rows dated before {args.before} in {time.perf_counter() - started:.1f} s")
+        if args.vacuum:
+            database.get_connection().execute("VACUUM")
+            print("Database vacuumed.")
+    for year, file, rows in archive_status():
+        print(f"{year}: {file} ({rows:,} rows)")
@@ -0,0 +1,126 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import database
+from archive import connection_for
+from carbon_emission_db import ACTIVITY_TABLES, totals_amount_column
+from emission_engine import get_factors
+from report_data import REPORT_CATEGORIES, RECOMMENDATIONS, OFFSET_SHARE, category_recommendations
+
+# Summary column of each report category, as in the report's summary block
+SUMMARY_KEYS = {
+    'transport': 'transport_emissions',
+    'energy': 'energy_emissions',
+    'waste': 'waste_emissions',
+    'industrial': 'industrial_emissions',
+    'offset': 'total_offset'
+}
+SUMMARY_COLUMNS = ['transport_emissions', 'energy_emissions', 'waste_emissions', 'industrial_emissions',
+                   'total_emissions', 'total_offset', 'net_emissions']
+
+FORMATS = ['csv', 'json']
+
+def category_totals(conn, key, date_from, date_to):
+    """A category's emission total per user over a date range, as (user ids, totals) arrays
+
+    One GROUP BY User_ID over the whole data table: users without rows in
+    the range are missing and count as 0. The factors are inlined per subtype
+    code, so every column is read from the (User_ID, Date) index.
+    """
+    spec = ACTIVITY_TABLES[REPORT_CATEGORIES[key][0]]
+    amount = get_factors(conn).emission_sql(spec['category'], f"t.{spec['code']}", f"t.{spec['quantity']}")
+    rows = conn.execute(
+        f"SELECT t.User_ID, TOTAL({amount}) FROM {spec['data']} t "
+        f"WHERE t.Date BETWEEN ? AND ? GROUP BY t.User_ID",
+        (date_from, date_to)
+    ).fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    user_ids, totals = zip(*rows)
+    return np.array(user_ids, dtype=np.int64), np.array(totals, dtype=float)
+
+def batch_summaries(conn, date_from=None, date_to=None):
+    """The report summary of every user, one row per user
+
+    Without a date range the totals are read from User_Emission_Totals, one
+    row per user. With one, each category is aggregated once for all users.
+    """
+    users = pd.read_sql_query("SELECT User_ID, Full_Name FROM User_Profile ORDER BY User_ID", conn)
+    if date_from is None and date_to is None:
+        columns = {
+            totals_amount_column(ACTIVITY_TABLES[REPORT_CATEGORIES[key][0]]): column
+            for key, column in SUMMARY_KEYS.items()
+        }
+        totals = pd.read_sql_query(
+            f"SELECT User_ID, {', '.join(columns)} FROM User_Emission_Totals", conn
+        ).rename(columns=columns)
+        summaries = users.merge(totals, on='User_ID', how='left')
+    else:
+        date_from = date_from or '0000-01-01'
+        date_to = date_to or '9999-12-31'
+        summaries = users
+        positions = pd.Index(users['User_ID'])
+        for key, column in SUMMARY_KEYS.items():
+            user_ids, totals = category_totals(conn, key, date_from, date_to)
+            values = np.zeros(len(users))
+            found = positions.get_indexer(user_ids)
+            values[found[found >= 0]] = totals[found >= 0]
+            summaries[column] = values
+
+    emission_columns = [SUMMARY_KEYS[key] for key in ('transport', 'energy', 'waste', 'industrial')]
+    summaries[list(SUMMARY_KEYS.values())] = summaries[list(SUMMARY_KEYS.values())].fillna(0.0)
+    summaries['total_emissions'] = summaries[emission_columns].sum(axis=1)
+    summaries['net_emissions'] = summaries['total_emissions'] - summaries['total_offset']
+    return summaries[['User_ID', 'Full_Name'] + SUMMARY_COLUMNS]
+
+def batch_recommendations(summaries):
+    """Add each user's highest category and recommendations (a list) to the summaries
+
+    There are only eight possible lists (four categories, with or without
+    the offset advice), so they are built once and picked by index.
+    """
+    categories = list(RECOMMENDATIONS)
+    emissions = summaries[[RECOMMENDATIONS[category][0] for category in categories]].to_numpy()
+    # argmax keeps the first of tied maxima, like max() in report_data.recommendations
+    highest = emissions.argmax(axis=1)
+    low_offset = (summaries['total_offset'] < summaries['total_emissions'] * OFFSET_SHARE).to_numpy()
+
+    choices = np.empty(len(categories) * 2, dtype=object)
+    choices[:] = [category_recommendations(category, low) for category in categories for low in (False, True)]
+
+    summaries = summaries.copy()
+    summaries['highest_category'] = np.array(categories, dtype=object)[highest]
+    summaries['recommendations'] = choices[highest * 2 + low_offset]
+    return summaries
+
+def generate_batch_reports(db_path=None, date_from=None, date_to=None):
+    """Summary and recommendations of every user's report for a date range"""
+    conn = connection_for(date_from, date_to, db_path)
+    return batch_recommendations(batch_summaries(conn, date_from, date_to))
+
+def write_reports(reports, path, file_format=None):
+    """Write batch reports as CSV (recommendations joined by newlines) or as a JSON array"""
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format == 'csv':
+        reports = reports.assign(recommendations=reports['recommendations'].str.join("\n"))
+        reports.to_csv(path, index=False)
+    elif file_format == 'json':
+        reports.to_json(path, orient='records', indent=2)
+    else:
+        raise ValueError(f"Unknown output format: {file_format} (use one of {', '.join(FORMATS)})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the report summary and recommendations of every user")
+    parser.add_argument("output", help="CSV or JSON file to write")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the extension)")
+    parser.add_argument("--from", dest="date_from", help="first report date (default: all dates)")
+    parser.add_argument("--to", dest="date_to", help="last report date (default: all dates)")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    reports = generate_batch_reports(args.db, args.date_from, args.date_to)
+    write_reports(reports, args.output, args.format)
+    print(f"Wrote {len(reports):,} reports to {args.output} in {time.perf_counter() - started:.1f} s")
@@ -0,0 +1,314 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import database
+from database import split_statements
+from predefined_queries import predefined_queries
+from updated_queries import updated_queries
+from query_plans import explain_query_plan
+from synthetic_data import generate_database
+
+# Rows per activity table of each benchmark database, and users per row
+DEFAULT_SCALES = [10000, 100000, 1000000]
+ROWS_PER_USER = 100
+
+# Timed runs per query (cold and warm each), and the time after which a slow
+# query stops being repeated
+DEFAULT_REPEAT = 5
+DEFAULT_TIME_BUDGET = 30.0
+
+# A single run taking longer than this is interrupted and the query reported
+# as timed out
+DEFAULT_TIMEOUT = 60.0
+
+# A query regresses when its warm p50 grows by more than the threshold and by
+# more than the noise floor (in milliseconds)
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR_MS = 1.0
+
+# Plan steps worth calling out in the report
+PLAN_WARNINGS = ('SCAN', 'USE TEMP B-TREE', 'AUTOMATIC')
+
+QUERY_SETS = {
+    'predefined': predefined_queries,
+    'updated': updated_queries
+}
+
+def named_queries(pattern=None):
+    """Every benchmarked query as (key, sql), optionally filtered by a substring"""
+    queries = []
+    for set_name, query_set in QUERY_SETS.items():
+        for name, sql in query_set.items():
+            key = f"{set_name}: {name}"
+            if pattern is None or pattern.lower() in key.lower():
+                queries.append((key, sql))
+    return queries
+
+def schema_fingerprint(conn):
+    """The schema objects and version of a database, to tell when a cached copy is stale"""
+    objects = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_stat%' ORDER BY type, name"
+    ).fetchall()
+    return [conn.execute("PRAGMA user_version").fetchone()[0]] + [list(row) for row in objects]
+
+def prepare_database(work_dir, rows, seed, rebuild=False):
+    """Path of the benchmark database for a scale, generated unless an up-to-date copy exists"""
+    path = os.path.join(work_dir, f"bench_{rows}_seed{seed}.db")
+
+    if os.path.exists(path) and not rebuild:
+        # Reuse the cached database only if its schema matches what the code creates now
+        reference = os.path.join(work_dir, "schema_reference.db")
+        generate_database(reference, users=1, records=0)
+        database.close_all(reference)
+        with sqlite3.connect(reference) as ref, sqlite3.connect(path) as cached:
+            if schema_fingerprint(ref) == schema_fingerprint(cached):
+                return path
+
+    users = max(rows // ROWS_PER_USER, 10)
+    generate_database(path, users=users, records=rows, seed=seed)
+    database.close_all(path)
+    return path
+
+def run_query(conn, sql, timeout=DEFAULT_TIMEOUT):
+    """Run every statement of a query, fetching all rows of the last; return the row count"""
+    # SQLite calls the progress handler every 100k VM steps; a true result interrupts the statement
+    deadline = time.perf_counter() + timeout
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline, 100000)
+    rows = 0
+    try:
+        with conn:
+            for statement in split_statements(sql):
+                cursor = conn.execute(statement)
+                if cursor.description is not None:
+                    rows = len(cursor.fetchall())
+    finally:
+        conn.set_progress_handler(None, 0)
+    return rows
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def timed_runs(run, repeat, budget):
+    """Call run() up to `repeat` times (fewer once `budget` seconds are spent); return times in ms"""
+    times = []
+    spent = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed * 1000)
+        spent += elapsed
+        if spent > budget:
+            break
+    return times
+
+def query_plan(conn, sql):
+    """EXPLAIN QUERY PLAN of every statement of a query that returns rows"""
+    plans = []
+    for statement in split_statements(sql):
+        if statement.lstrip().upper().startswith(('CREATE', 'DROP', 'INSERT', 'UPDATE', 'DELETE')):
+            continue
+        plans.append(explain_query_plan(conn, statement))
+    return plans
+
+def benchmark_query(path, sql, repeat, budget, timeout=DEFAULT_TIMEOUT):
+    """Cold and warm latencies, peak Python memory, row count and plan of one query
+
+    Cold runs each use a new connection, so SQLite's page cache and statement
+    cache start empty (the OS file cache is not dropped). Warm runs reuse one
+    connection after a first untimed run.
+    """
+    def cold():
+        conn = database.connect(path)
+        try:
+            run_query(conn, sql, timeout)
+        finally:
+            conn.close()
+
+    conn = database.connect(path)
+    try:
+        cold_times = timed_runs(cold, repeat, budget)
+        rows = run_query(conn, sql, timeout)
+        warm_times = timed_runs(lambda: run_query(conn, sql, timeout), repeat, budget)
+
+        # Peak memory is measured on a separate run, since tracing slows Python down
+        tracemalloc.start()
+        try:
+            run_query(conn, sql, timeout)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        plan = query_plan(conn, sql)
+    finally:
+        conn.close()
+
+    return {
+        'rows': rows,
+        'cold_p50_ms': percentile(cold_times, 0.50),
+        'cold_p95_ms': percentile(cold_times, 0.95),
+        'warm_p50_ms': percentile(warm_times, 0.50),
+        'warm_p95_ms': percentile(warm_times, 0.95),
+        'runs': len(warm_times),
+        'peak_kib': peak / 1024,
+        'plan': plan
+    }
+
+def run_benchmark(scales=None, repeat=DEFAULT_REPEAT, budget=DEFAULT_TIME_BUDGET, timeout=DEFAULT_TIMEOUT,
+                  seed=0, work_dir='.benchmark', pattern=None, rebuild=False, progress=None):
+    """Benchmark the named queries at every scale and return the report dict"""
+    os.makedirs(work_dir, exist_ok=True)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'timeout': timeout,
+        'scales': {}
+    }
+
+    for rows in scales or DEFAULT_SCALES:
+        path = prepare_database(work_dir, rows, seed, rebuild)
+        results = {}
+        for key, sql in named_queries(pattern):
+            try:
+                results[key] = benchmark_query(path, sql, repeat, budget, timeout)
+            except sqlite3.Error as e:
+                error = f"timed out after {timeout:g} s" if 'interrupted' in str(e) else str(e)
+                results[key] = {'error': error}
+            if progress:
+                progress(rows, key, results[key])
+        report['scales'][str(rows)] = {
+            'rows_per_table': rows,
+            'users': max(rows // ROWS_PER_USER, 10),
+            'queries': results
+        }
+    return report
+
+def plan_warnings(plan):
+    """The plan steps of a query that are worth a look (full scans, temp b-trees, ...)"""
+    return sorted({
+        line.strip() for statement in plan for line in statement
+        if any(warning in line for warning in PLAN_WARNINGS)
+    })
+
+def compare_reports(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare a report with a baseline; return a list of regressions, improvements and plan changes"""
+    findings = []
+    for scale, current in report['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for key, result in current['queries'].items():
+            old = previous['queries'].get(key)
+            if old is None or 'error' in result or 'error' in old:
+                continue
+
+            before, after = old['warm_p50_ms'], result['warm_p50_ms']
+            change = (after - before) / before if before else 0.0
+            if abs(after - before) > NOISE_FLOOR_MS and abs(change) > threshold:
+                findings.append({
+                    'scale': scale, 'query': key,
+                    'kind': 'regression' if change > 0 else 'improvement',
+                    'before_ms': before, 'after_ms': after, 'change': change
+                })
+            if old['plan'] != result['plan']:
+                findings.append({'scale': scale, 'query': key, 'kind': 'plan changed'})
+    return findings
+
+def format_markdown(report, findings=None):
+    """Render a report (and its baseline comparison) as Markdown"""
+    lines = [
+        "# Query Benchmark",
+        "",
+        f"Created {report['created']} with Python {report['python']}, SQLite {report['sqlite']} "
+        f"on {report['platform']}; seed {report['seed']}, {report['repeat']} runs per query.",
+        ""
+    ]
+
+    if findings is not None:
+        lines += ["## Comparison with Baseline", ""]
+        if not findings:
+            lines.append("No regressions, improvements or plan changes.")
+        for finding in findings:
+            if finding['kind'] == 'plan changed':
+                lines.append(f"- **plan changed** at {finding['scale']} rows: {finding['query']}")
+            else:
+                lines.append(
+                    f"- **{finding['kind']}** at {finding['scale']} rows: {finding['query']} "
+                    f"({finding['before_ms']:.2f} ms -> {finding['after_ms']:.2f} ms, {finding['change']:+.0%})"
+                )
+        lines.append("")
+
+    for scale, data in report['scales'].items():
+        lines += [
+            f"## {int(scale):,} rows per table ({data['users']:,} users)",
+            "",
+            "| Query | Rows | Cold p50 (ms) | Cold p95 (ms) | Warm p50 (ms) | Warm p95 (ms) | Peak (KiB) | Plan notes |",
+            "|---|---:|---:|---:|---:|---:|---:|---|"
+        ]
+        for key, result in data['queries'].items():
+            if 'error' in result:
+                lines.append(f"| {key} | | | | | | | ERROR: {result['error']} |")
+                continue
+            notes = "; ".join(plan_warnings(result['plan']))
+            lines.append(
+                f"| {key} | {result['rows']:,} | {result['cold_p50_ms']:.2f} | {result['cold_p95_ms']:.2f} "
+                f"| {result['warm_p50_ms']:.2f} | {result['warm_p95_ms']:.2f} | {result['peak_kib']:,.0f} | {notes} |"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the predefined and updated queries at several data scales")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated rows per activity table (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="cold and warm runs per query")
+    parser.add_argument("--budget", type=float, default=DEFAULT_TIME_BUDGET,
+                        help="seconds after which a slow query is not repeated further")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds after which a single run is interrupted")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated databases")
+    parser.add_argument("--queries", help="only benchmark queries whose name contains this text")
+    parser.add_argument("--work-dir", default=".benchmark", help="where the benchmark databases are kept")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the databases even if up to date")
+    parser.add_argument("--output", default="benchmark_report", help="report path without extension (.json and .md are written)")
+    parser.add_argument("--baseline", help="report JSON to compare against; exits with status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative warm p50 slowdown counted as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        [int(s) for s in args.scales.split(',')], args.repeat, args.budget, args.timeout, args.seed,
+        args.work_dir, args.queries, args.rebuild,
+        progress=lambda rows, key, result: print(
+            f"[{rows:,}] {key}: " + (result['error'] if 'error' in result else f"{result['warm_p50_ms']:.2f} ms"),
+            flush=True
+        )
+    )
+
+    findings = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            findings = compare_reports(report, json.load(f), args.threshold)
+
+    with open(args.output + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(args.output + '.md', 'w') as f:
+        f.write(format_markdown(report, findings))
+    print(f"Report written to {args.output}.json and {args.output}.md")
+
+    if findings and any(finding['kind'] == 'regression' for finding in findings):
+        print(f"{sum(f['kind'] == 'regression' for f in findings)} regression(s) against the baseline")
+        sys.exit(1)
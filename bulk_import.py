@@ -0,0 +1,178 @@
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+from operator import itemgetter
+import database
+from validation import CATEGORIES, validate_records, find_category, insert_sql
+from carbon_emission_db import MIGRATIONS, bulk_insert
+
+# Rows validated and written per transaction
+BATCH_SIZE = 50000
+
+# Rejected rows kept in the report (all of them go to the rejects file)
+MAX_REPORTED_ERRORS = 20
+
+def detect_format(path):
+    """Guess the file format from its extension"""
+    return 'ndjson' if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl', '.json') else 'csv'
+
+def read_csv(file, columns):
+    """Yield (line_number, values) for each CSV row, values in `columns` order
+
+    The header row names the columns (case-insensitive); extra columns are
+    ignored. A short row yields None so it is rejected.
+    """
+    reader = csv.reader(file)
+    header = [name.strip().lower() for name in next(reader, [])]
+    missing = [column for column in columns if column.lower() not in header]
+    if missing:
+        raise ValueError(f"Missing column(s) in header: {', '.join(missing)}")
+
+    get_values = itemgetter(*[header.index(column.lower()) for column in columns])
+    for row in reader:
+        if not row:
+            continue
+        try:
+            yield reader.line_num, get_values(row)
+        except IndexError:
+            yield reader.line_num, None
+
+def read_ndjson(file, columns):
+    """Yield (line_number, values) for each JSON object line, values in `columns` order
+
+    A line that is not a JSON object yields None so it is rejected.
+    """
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None
+            continue
+        yield line_number, [record.get(column) for column in columns]
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson
+}
+
+def import_file(path, category, db_path=None, file_format=None, batch_size=BATCH_SIZE,
+                rejects_path=None, progress=None):
+    """Stream a CSV or NDJSON file into a category's table
+
+    Rows are validated with the same rules as the Insert Data forms and
+    written batch by batch, one transaction per batch. Rejected rows are
+    counted, the first few kept in the report and, if rejects_path is given,
+    all of them written there with their line number and error. progress is
+    called with the report after every batch. Returns the report dict.
+    """
+    category = find_category(category)
+    spec = CATEGORIES[category]
+    read_rows = READERS[file_format or detect_format(path)]
+
+    report = {
+        'category': category,
+        'rows_read': 0,
+        'rows_inserted': 0,
+        'rows_rejected': 0,
+        'errors': [],
+        'elapsed': 0.0,
+        'rows_per_sec': 0.0
+    }
+    conn = database.get_connection(db_path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < len(MIGRATIONS):
+        raise ValueError("Migrate the database before importing (python carbon_emission_db.py --migrate)")
+    cursor = conn.cursor()
+    rejects_file = rejects_writer = None
+    start = time.perf_counter()
+
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            rows = read_rows(file, spec['columns'])
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+
+                # Validate the chunk; lines that could not be parsed are rejected outright
+                rejects = [(i, "Line is not a valid record") for i, (_, values) in enumerate(chunk) if values is None]
+                parsed = [values for _, values in chunk if values is not None]
+                records, invalid = validate_records(category, parsed)
+                if invalid:
+                    positions = [i for i, (_, values) in enumerate(chunk) if values is not None]
+                    rejects.extend((positions[i], error) for i, error in invalid)
+
+                for i, error in sorted(rejects):
+                    line_number, values = chunk[i]
+                    report['rows_rejected'] += 1
+                    if len(report['errors']) < MAX_REPORTED_ERRORS:
+                        report['errors'].append((line_number, error))
+                    if rejects_path:
+                        if rejects_writer is None:
+                            rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8')
+                            rejects_writer = csv.writer(rejects_file)
+                            rejects_writer.writerow(['Line', 'Error'] + spec['columns'])
+                        rejects_writer.writerow([line_number, error] + list(values or []))
+
+                # Write the valid rows in one transaction
+                if records:
+                    with conn:
+                        report['rows_inserted'] += bulk_insert(cursor, spec['table'], spec['columns'], records)
+
+                    # Let caches know which tables and users changed
+                    user_ids = None
+                    if 'User_ID' in spec['columns']:
+                        user_ids = set(map(itemgetter(spec['columns'].index('User_ID')), records))
+                    database.record_statement_writes(insert_sql(category), db_path, user_ids)
+
+                report['rows_read'] += len(chunk)
+                report['elapsed'] = time.perf_counter() - start
+                report['rows_per_sec'] = report['rows_inserted'] / report['elapsed'] if report['elapsed'] else 0.0
+                if progress:
+                    progress(dict(report))
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+
+    return report
+
+def format_report(report):
+    """Summarise an import report in a few lines of text"""
+    lines = [
+        f"{report['category']}: {report['rows_inserted']:,} rows imported, "
+        f"{report['rows_rejected']:,} rejected of {report['rows_read']:,} read",
+        f"{report['elapsed']:.2f} s ({report['rows_per_sec']:,.0f} rows/sec)"
+    ]
+    for line_number, error in report['errors']:
+        lines.append(f"  line {line_number}: {error}")
+    if report['rows_rejected'] > len(report['errors']):
+        lines.append(f"  ... and {report['rows_rejected'] - len(report['errors']):,} more")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a CSV or NDJSON file into one data category")
+    parser.add_argument("file", help="CSV file with a header row, or NDJSON file with one object per line")
+    parser.add_argument("--category", required=True,
+                        help="category or table name, e.g. Transportation or Energy_Consumption")
+    parser.add_argument("--format", choices=sorted(READERS), help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--rejects", help="write rejected rows to this CSV file")
+    parser.add_argument("--db", help="database file to import into")
+    args = parser.parse_args()
+
+    try:
+        report = import_file(
+            args.file, args.category, db_path=args.db, file_format=args.format,
+            batch_size=args.batch_size, rejects_path=args.rejects,
+            progress=lambda report: print(f"{report['rows_read']:,} rows read...", flush=True)
+        )
+    except (LookupError, ValueError) as e:
+        parser.error(str(e))
+    print(format_report(report))
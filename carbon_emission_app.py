@@ -1,24 +1,42 @@
+import time
+_import_started = time.perf_counter()
+import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import sqlite3
-import pandas as pd
+import database
+from query_runner import QueryRunner
+from result_grid import ResultGrid
+from plan_view import PlanWindow
+from query_inspector import format_timings
 from updated_queries import updated_queries
-from carbon_emission_db import setup_database
-from data_insertion import DataInsertionFrame
-from reports import ReportsFrame
+from carbon_emission_db import setup_database, migrate_database, backfill_emission_records
+
+# The Insert Data and Carbon Reports tabs (and their modules) are built the
+# first time they are selected; pandas and matplotlib load with the first report
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 class CarbonEmissionApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=False):
         self.root = root
+        self.profile = profile
         self.root.title("Carbon Emission Database - SQL Query Tool")
         self.root.geometry("1200x800")
         self.root.minsize(800, 600)
         
         # Set up the database if it doesn't exist
+        started = time.perf_counter()
         try:
             self.check_database()
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to set up database: {str(e)}")
+        self.report_phase("database check", started)
+        
+        # Queries run on a background worker so the window stays responsive
+        started = time.perf_counter()
+        self.query_runner = QueryRunner()
+        self.running_job = None
+        self.result_job = None
+        self.report_phase("query worker", started)
         
         # Create main notebook (tabs)
         self.notebook = ttk.Notebook(self.root)
@@ -36,14 +54,14 @@ class CarbonEmissionApp:
         self.reports_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.reports_tab, text="Carbon Reports")
         
-        # Set up query tab
+        # Set up query tab; the other two are set up when first selected
+        started = time.perf_counter()
         self.setup_query_tab()
-        
-        # Set up data insertion tab
-        self.setup_insertion_tab()
-        
-        # Set up reports tab
-        self.setup_reports_tab()
+        self.report_phase("Query Database tab", started)
+        self.tab_setups = {
+            str(self.insertion_tab): self.setup_insertion_tab,
+            str(self.reports_tab): self.setup_reports_tab
+        }
         
         # Initialize the query history
         self.query_history = []
@@ -52,19 +70,27 @@ class CarbonEmissionApp:
         # Add tab change event handler to refresh users when the Reports tab is selected
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
         
+        # Start handling results from the query worker
+        self.root.after(50, self.poll_query)
+        
     def check_database(self):
-        """Check if database exists, if not create it"""
+        """Check if database exists, if not create it, otherwise migrate it"""
         try:
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='User_Profile'")
+            conn = database.get_connection()
+            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='User_Profile'")
             if not cursor.fetchone():
-                conn.close()
                 setup_database()
-            else:
-                conn.close()
+                return
         except Exception as e:
             setup_database()
+            return
+        
+        # Existing database: bring its schema up to date (errors are reported by the caller)
+        migrate_database()
+        
+        # Activity rows older than the emission record triggers get their
+        # records in the background, a chunk per transaction
+        threading.Thread(target=backfill_emission_records, name="record-backfill", daemon=True).start()
     
     def setup_query_tab(self):
         """Set up the query tab components"""
@@ -82,15 +108,32 @@ class CarbonEmissionApp:
     
     def setup_insertion_tab(self):
         """Set up the data insertion tab"""
+        started = time.perf_counter()
+        from data_insertion import DataInsertionFrame
+        self.report_phase("Insert Data tab imports", started)
+        
         # Create the data insertion frame
+        started = time.perf_counter()
         self.insertion_frame = DataInsertionFrame(self.insertion_tab)
         self.insertion_frame.pack(fill=tk.BOTH, expand=True)
+        self.report_phase("Insert Data tab", started)
     
     def setup_reports_tab(self):
         """Set up the reports tab"""
+        started = time.perf_counter()
+        from reports import ReportsFrame
+        self.report_phase("Carbon Reports tab imports", started)
+        
         # Create the reports frame
+        started = time.perf_counter()
         self.reports_frame = ReportsFrame(self.reports_tab)
         self.reports_frame.pack(fill=tk.BOTH, expand=True)
+        self.report_phase("Carbon Reports tab", started)
+    
+    def report_phase(self, phase, started):
+        """With startup profiling on, print how long a phase took since `started`"""
+        if self.profile:
+            print(f"{phase:<28} {(time.perf_counter() - started) * 1000:8.1f} ms", flush=True)
             
     def create_query_frames(self):
         """Create the main application frames for the query tab"""
@@ -120,6 +163,10 @@ class CarbonEmissionApp:
         run_button = ttk.Button(button_frame, text="Run Query", command=self.run_custom_query)
         run_button.pack(side=tk.LEFT, padx=5)
         
+        # Explain button: show the query plan and timings instead of the rows
+        explain_button = ttk.Button(button_frame, text="Explain", command=self.explain_custom_query)
+        explain_button.pack(side=tk.LEFT, padx=5)
+        
         # Clear button
         clear_button = ttk.Button(button_frame, text="Clear", command=self.clear_query)
         clear_button.pack(side=tk.LEFT, padx=5)
@@ -131,27 +178,20 @@ class CarbonEmissionApp:
         next_button = ttk.Button(button_frame, text="Next Query", command=self.load_next_query)
         next_button.pack(side=tk.LEFT, padx=5)
         
-    def create_results_section(self):
-        """Create the results display section"""
-        # Create a frame for the Treeview
-        tree_frame = ttk.Frame(self.results_frame)
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # Scrollbars for the Treeview
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
-        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
+        # Cancel button (enabled while a query is running)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_query, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         
-        # Results Treeview
-        self.results_tree = ttk.Treeview(tree_frame, yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        # Read the rows moved to the per-year archive files too (see archive.py)
+        self.include_archives = tk.BooleanVar(value=False)
+        archives_check = ttk.Checkbutton(button_frame, text="Include archived years", variable=self.include_archives)
+        archives_check.pack(side=tk.LEFT, padx=5)
         
-        # Configure scrollbars
-        vsb.config(command=self.results_tree.yview)
-        hsb.config(command=self.results_tree.xview)
-        
-        # Place the Treeview and scrollbars
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
-        hsb.pack(side=tk.BOTTOM, fill=tk.X)
-        self.results_tree.pack(fill=tk.BOTH, expand=True)
+    def create_results_section(self):
+        """Create the results display section"""
+        # Result grid that streams rows from the worker as the user scrolls
+        self.results_grid = ResultGrid(self.results_frame, request_rows=self.request_result_rows)
+        self.results_grid.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # Status bar for showing query info
         self.status_bar = ttk.Label(self.results_frame, text="Ready", anchor=tk.W)
@@ -204,6 +244,15 @@ class CarbonEmissionApp:
         # Run the query
         self.execute_query(query, "Custom Query")
         
+    def explain_custom_query(self):
+        """Plan and time the query in the text input"""
+        query = self.query_text.get("1.0", tk.END).strip()
+        if not query:
+            messagebox.showwarning("Empty Query", "Please enter an SQL query to explain.")
+            return
+        
+        self.execute_query(query, "Custom Query", explain=True)
+        
     def run_predefined_query(self, query, name):
         """Run a predefined query"""
         # Set the query text in the input area
@@ -218,65 +267,131 @@ class CarbonEmissionApp:
         # Run the query
         self.execute_query(query, name)
         
-    def execute_query(self, query, name):
-        """Execute the given SQL query and display results"""
-        try:
-            # Connect to the database
-            conn = sqlite3.connect('carbon_emission.db')
-            
-            # Check if it's a SELECT query
-            is_select = query.strip().upper().startswith("SELECT")
-            
-            if is_select:
-                # For SELECT queries, fetch and display results
-                df = pd.read_sql_query(query, conn)
-                self.display_results(df)
-                row_count = len(df)
-                col_count = len(df.columns)
-                self.status_bar.config(text=f"{name}: {row_count} rows, {col_count} columns")
-            else:
-                # For other queries (INSERT, UPDATE, DELETE, etc.)
-                cursor = conn.cursor()
-                cursor.execute(query)
-                conn.commit()
-                affected_rows = cursor.rowcount
-                self.status_bar.config(text=f"{name}: {affected_rows} rows affected")
-                self.clear_results()
-                messagebox.showinfo("Success", f"Query executed successfully. {affected_rows} rows affected.")
-            
-            conn.close()
-            
-        except Exception as e:
-            self.status_bar.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Query Error", str(e))
-            
-    def display_results(self, df):
-        """Display the results DataFrame in the Treeview"""
-        # Clear previous results
-        self.clear_results()
-        
-        # Configure columns
-        self.results_tree["columns"] = list(df.columns)
-        
-        # Format column headings
-        self.results_tree.column("#0", width=0, stretch=False)
-        for col in df.columns:
-            self.results_tree.column(col, anchor=tk.W, width=100)
-            self.results_tree.heading(col, text=col, anchor=tk.W)
-        
-        # Add data rows
-        for i, row in df.iterrows():
-            values = [row[col] for col in df.columns]
-            self.results_tree.insert("", tk.END, text=str(i), values=values)
+    def execute_query(self, query, name, explain=False):
+        """Start the given SQL query on the worker thread (or its inspection, with explain)"""
+        if self.running_job is not None:
+            messagebox.showwarning("Query Running", "Please wait for the current query to finish or cancel it.")
+            return
+        
+        archives = self.include_archives.get()
+        if explain:
+            self.running_job = self.query_runner.explain(query, name, archives)
+        else:
+            self.running_job = self.query_runner.submit(query, name, archives)
+        self.query_started = time.perf_counter()
+        self.query_name = name
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_bar.config(text=f"{name}: running...")
+    
+    def poll_query(self):
+        """Handle results from the query worker (runs every 50 ms through Tk's after())"""
+        result = self.query_runner.poll()
+        while result is not None:
+            if result['kind'] in ('query', 'explain') and result['job_id'] == self.running_job:
+                self.running_job = None
+                self.cancel_button.config(state=tk.DISABLED)
+                if result['kind'] == 'explain':
+                    self.show_explain_result(result)
+                else:
+                    self.show_query_result(result)
+            elif result['job_id'] == self.result_job:
+                if result['kind'] == 'rows':
+                    self.show_more_rows(result)
+                elif result['kind'] == 'count' and result['status'] == 'ok':
+                    self.results_grid.set_total(result['total'])
+                    self.update_result_status(result['total'])
+            result = self.query_runner.poll()
+        
+        if self.running_job is not None:
+            elapsed = time.perf_counter() - self.query_started
+            self.status_bar.config(text=f"{self.query_name}: running... {elapsed:.1f} s")
+        self.root.after(50, self.poll_query)
+    
+    def show_query_result(self, result):
+        """Display a finished query's result"""
+        name = result['name']
+        elapsed = result['elapsed']
+        
+        if result['status'] == 'cancelled':
+            self.status_bar.config(text=f"{name}: cancelled after {elapsed:.1f} s")
+        elif result['status'] == 'error':
+            self.status_bar.config(text=f"Error: {result['error']}")
+            messagebox.showerror("Query Error", result['error'])
+        elif 'rows' in result:
+            # For queries returning rows, show the first page; the rest streams in on scroll
+            self.result_job = result['job_id']
+            self.result_info = (name, len(result['columns']), elapsed, result.get('cached', False),
+                                result.get('archived_years'))
+            self.results_grid.show(result['columns'], result['rows'], result['exhausted'])
+            if 'total' in result:
+                self.results_grid.set_total(result['total'])
+            self.update_result_status(result.get('total'))
+        else:
+            # For other queries (INSERT, UPDATE, DELETE, etc.)
+            affected_rows = result['rowcount']
+            self.status_bar.config(text=f"{name}: {affected_rows} rows affected ({elapsed:.2f} s)"
+                                        f"{self.archives_note(result.get('archived_years'))}")
+            self.clear_results()
+            messagebox.showinfo("Success", f"Query executed successfully. {affected_rows} rows affected.")
+    
+    def show_explain_result(self, result):
+        """Open the plan window for a finished inspection"""
+        name = result['name']
+        if result['status'] == 'cancelled':
+            self.status_bar.config(text=f"{name}: cancelled after {result['elapsed']:.1f} s")
+        elif result['status'] == 'error':
+            self.status_bar.config(text=f"Error: {result['error']}")
+            messagebox.showerror("Query Error", result['error'])
+        else:
+            # The status bar summarises the statement that produces the result
+            statements = result['statements']
+            warnings = sum(len(statement['warnings']) for statement in statements)
+            self.status_bar.config(
+                text=f"{name}: {format_timings(statements[-1])}, {warnings} plan warnings"
+            )
+            PlanWindow(self.root, name, statements)
+    
+    def update_result_status(self, total):
+        """Show the row count of the displayed result (None while it is being counted)"""
+        name, col_count, elapsed, cached, archived = self.result_info
+        rows = f"{total} rows" if total is not None else "counting rows..."
+        source = "from cache" if cached else f"{elapsed:.2f} s"
+        stats = self.query_runner.cache.stats()
+        self.status_bar.config(
+            text=f"{name}: {rows}, {col_count} columns ({source}){self.archives_note(archived)}  |  "
+                 f"cache: {stats['hits']} hits, {stats['misses']} misses, "
+                 f"{stats['entries']} results, {stats['bytes'] / 1048576:.1f} MiB"
+        )
+    
+    def archives_note(self, years):
+        """Status bar note naming the archived years a result did not read"""
+        if not years:
+            return ""
+        return f", archived {', '.join(map(str, years))} not included"
+    
+    def request_result_rows(self, offset, limit):
+        """Ask the worker for more rows of the displayed result"""
+        if self.result_job is not None:
+            self.query_runner.fetch_rows(self.result_job, offset, limit)
+    
+    def show_more_rows(self, result):
+        """Add a page fetched on scroll to the result grid"""
+        if result['status'] == 'ok':
+            self.results_grid.add_rows(result['offset'], result['rows'], result['exhausted'])
+        else:
+            self.results_grid.pending = False
+            self.status_bar.config(text=f"Error fetching rows: {result.get('error', result['status'])}")
+    
+    def cancel_query(self):
+        """Interrupt the running query"""
+        if self.running_job is not None:
+            self.query_runner.cancel()
+            self.status_bar.config(text=f"{self.query_name}: cancelling...")
             
     def clear_results(self):
-        """Clear the results Treeview"""
-        # Delete all items
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
-            
-        # Reset columns
-        self.results_tree["columns"] = []
+        """Clear the result grid"""
+        self.result_job = None
+        self.results_grid.clear()
         
     def clear_query(self):
         """Clear the query text area"""
@@ -310,13 +425,35 @@ class CarbonEmissionApp:
         current_tab = self.notebook.select()
         current_tab_index = self.notebook.index(current_tab)
         
-        # If the Reports tab is selected, refresh the user list
-        if current_tab_index == 2:  # Index 2 is the Reports tab
+        # Build a tab the first time it is selected (a new Reports tab loads its users itself)
+        setup = self.tab_setups.pop(current_tab, None)
+        if setup is not None:
+            setup()
+        
+        # If the Reports tab is selected again, refresh the user list
+        elif current_tab_index == 2:  # Index 2 is the Reports tab
             if hasattr(self, 'reports_frame') and hasattr(self.reports_frame, 'refresh_users'):
                 self.reports_frame.refresh_users()
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Carbon Emission Database - SQL Query Tool")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time taken by the imports and each startup phase")
+    args = parser.parse_args()
+    if args.db:
+        database.set_database_path(args.db)
+    if args.profile_startup:
+        print(f"{'imports':<28} {IMPORT_SECONDS * 1000:8.1f} ms", flush=True)
+    
     # Create main window
+    started = time.perf_counter()
     root = tk.Tk()
-    app = CarbonEmissionApp(root)
+    app = CarbonEmissionApp(root, profile=args.profile_startup)
+    app.report_phase("window and app setup, total", started)
+    
+    # Idle callbacks run once the window has been drawn
+    root.after_idle(lambda: app.report_phase("first draw (since imports)", _import_started))
     root.mainloop() 
\ No newline at end of file
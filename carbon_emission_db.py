@@ -1,65 +1,922 @@
-import sqlite3
 import os
+import database
+from validation import VOCABULARIES
 
-def setup_database():
-    # Delete the database file if it exists
-    if os.path.exists('carbon_emission.db'):
-        os.remove('carbon_emission.db')
+# Secondary indexes. The activity indexes lead with (User_ID, Date) so the
+# per-user date range filters in the reports and the User_ID joins in the
+# aggregate queries are index lookups, and end with the measure column and the
+# subtype code so SUM()/COUNT() over them, and the views decoding the codes,
+# never have to touch the table itself. Emission_Record's indexes answer the
+# per-user and per-category emission totals, over any date range, from the
+# index alone.
+INDEXES = {
+    'idx_transportation_user_date': 'Transportation_Data (User_ID, Date, Distance_KM, Vehicle_Type_ID)',
+    'idx_energy_user_date': 'Energy_Consumption_Data (User_ID, Date, Consumption_KWH, Energy_Source_ID)',
+    'idx_waste_user_date': 'Waste_Management_Data (User_ID, Date, Waste_Weight_KG, Waste_Type_ID)',
+    'idx_industrial_user_date': 'Industrial_Activity_Data (User_ID, Date, Emission_Produced, Activity_Type_ID)',
+    'idx_offset_user_date': 'Carbon_Offset_Data (User_ID, Date, Offset_Amount, Offset_Type_ID)',
+    'idx_emission_record_user_date': 'Emission_Record (User_ID, Date, Category, Emission_Amount)',
+    'idx_emission_record_category_date': 'Emission_Record (Category, Date, Emission_Amount)',
+    'idx_emission_factor_source': 'Emission_Factor (Source_Type, Emission_Per_Unit)',
+    'idx_user_location': 'User_Profile (Location)'
+}
+
+def create_indexes(cursor, indexes=None):
+    """Create any missing secondary indexes (skipping tables an older database does not have yet)
+
+    indexes maps index names to definitions and defaults to INDEXES;
+    migrations pass the indexes of their own schema version.
+    """
+    for name, definition in (INDEXES if indexes is None else indexes).items():
+        if not table_exists(cursor, definition.split()[0]):
+            continue
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+def drop_indexes(cursor):
+    """Drop the secondary indexes (used to compare query plans)"""
+    for name in INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+# The activity tables and how each one contributes to the derived tables below:
+# the category name used for its totals columns and rollup rows, its id,
+# subtype and quantity columns, the emission of a row ({row} is NEW, OLD or a
+# table alias, {subtype} the SQL of the row's subtype name), the Source_Type of
+# the Emission_Factor that emission is computed with (None when the quantity
+# already is the emission) and the sign that emission contributes to
+# Net_Emissions.
+#
+# Rows are stored in the 'data' table with the subtype as an integer code into
+# the 'dimension' table, which holds each subtype name once. The table's own
+# name is a view decoding the codes, with INSTEAD OF triggers, so queries and
+# forms written against the original tables keep working unchanged.
+ACTIVITY_TABLES = {
+    'Transportation': {
+        'category': 'Transport', 'id': 'Transport_ID', 'subtype': 'Vehicle_Type', 'quantity': 'Distance_KM',
+        'data': 'Transportation_Data', 'dimension': 'Vehicle_Type_Dim', 'code': 'Vehicle_Type_ID',
+        'emission': "COALESCE({row}.Distance_KM * (SELECT Emission_Per_Unit FROM Emission_Factor "
+                    "WHERE Source_Type = {subtype}), 0)",
+        'factor': "{subtype}",
+        'sign': 1
+    },
+    'Energy_Consumption': {
+        'category': 'Energy', 'id': 'Energy_ID', 'subtype': 'Energy_Source', 'quantity': 'Consumption_KWH',
+        'data': 'Energy_Consumption_Data', 'dimension': 'Energy_Source_Dim', 'code': 'Energy_Source_ID',
+        'emission': "COALESCE({row}.Consumption_KWH * (SELECT Emission_Per_Unit FROM Emission_Factor "
+                    "WHERE Source_Type = {subtype}), 0)",
+        'factor': "{subtype}",
+        'sign': 1
+    },
+    'Waste_Management': {
+        'category': 'Waste', 'id': 'Waste_ID', 'subtype': 'Waste_Type', 'quantity': 'Waste_Weight_KG',
+        'data': 'Waste_Management_Data', 'dimension': 'Waste_Type_Dim', 'code': 'Waste_Type_ID',
+        'emission': "COALESCE({row}.Waste_Weight_KG * (SELECT Emission_Per_Unit FROM Emission_Factor "
+                    "WHERE Source_Type = 'Waste'), 0)",
+        'factor': "'Waste'",
+        'sign': 1
+    },
+    'Industrial_Activity': {
+        'category': 'Industrial', 'id': 'Industry_ID', 'subtype': 'Activity_Type', 'quantity': 'Emission_Produced',
+        'data': 'Industrial_Activity_Data', 'dimension': 'Activity_Type_Dim', 'code': 'Activity_Type_ID',
+        'emission': "COALESCE({row}.Emission_Produced, 0)",
+        'factor': None,
+        'sign': 1
+    },
+    'Carbon_Offset': {
+        'category': 'Offset', 'id': 'Offset_ID', 'subtype': 'Offset_Type', 'quantity': 'Offset_Amount',
+        'data': 'Carbon_Offset_Data', 'dimension': 'Offset_Type_Dim', 'code': 'Offset_Type_ID',
+        'emission': "COALESCE({row}.Offset_Amount, 0)",
+        'factor': None,
+        'sign': -1
+    }
+}
+
+def table_exists(cursor, name):
+    """Whether the database has a table (not a view) of that name"""
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (name,)
+    ).fetchone() is not None
+
+def encoded(cursor, table):
+    """Whether an activity table's rows are stored with subtype codes
+
+    Databases made before the dimension tables keep the original table until
+    migration_encode_dimensions runs, and the triggers are built to match.
+    """
+    return table_exists(cursor, ACTIVITY_TABLES[table]['data'])
+
+def subtype_sql(spec, row, coded):
+    """SQL of an activity row's subtype name, from its code when `coded`"""
+    if coded:
+        return f"(SELECT {spec['subtype']} FROM {spec['dimension']} WHERE {spec['code']} = {row}.{spec['code']})"
+    return f"{row}.{spec['subtype']}"
+
+def emission_sql(spec, row, coded=False):
+    """SQL of an activity row's emission"""
+    return spec['emission'].format(row=row, subtype=subtype_sql(spec, row, coded))
+
+# Dimension tables. Each subtype name is stored once, seeded in order with the
+# vocabulary the data entry forms offer, and the activity rows refer to it by
+# a small integer: rows and their indexes get smaller, and readers that decode
+# codes themselves (the reports, emission_engine) look names and factors up in
+# arrays instead of comparing strings. Names first seen in new rows are added
+# as they arrive; a code never changes or loses its name, so the views can
+# spell the known codes out.
+def create_dimension_table(cursor, spec):
+    """Create an activity table's dimension table, seeded with the form vocabulary"""
+    dimension = spec['dimension']
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {dimension} (
+        {spec['code']} INTEGER PRIMARY KEY,
+        {spec['subtype']} VARCHAR(100) NOT NULL UNIQUE
+    )
+    ''')
+    for event in ('UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{dimension.lower()}_{event.lower()} BEFORE {event} ON {dimension}
+        BEGIN
+            SELECT RAISE(ABORT, 'Subtype codes of {dimension} cannot be changed or removed');
+        END
+        ''')
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {dimension} ({spec['subtype']}) VALUES (?)",
+        [(value,) for value in VOCABULARIES[spec['subtype']]]
+    )
+
+def create_data_table(cursor, table):
+    """Create the table holding an activity table's rows, with subtype codes"""
+    spec = ACTIVITY_TABLES[table]
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {spec['data']} (
+        {spec['id']} INTEGER PRIMARY KEY,
+        User_ID INTEGER,
+        {spec['code']} INTEGER,
+        {spec['quantity']} FLOAT,
+        Date DATE,
+        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID),
+        FOREIGN KEY ({spec['code']}) REFERENCES {spec['dimension']}({spec['code']})
+    )
+    ''')
+
+def decode_sql(cursor, spec, row):
+    """SQL of a row's subtype name: a CASE over the codes known now, a lookup for newer ones
+
+    A CASE costs a fraction of a lookup per row, and unlike a join it lets
+    SQLite flatten the view into queries that LEFT JOIN it.
+    """
+    known = cursor.execute(
+        f"SELECT {spec['code']}, {spec['subtype']} FROM {spec['dimension']} ORDER BY {spec['code']}"
+    ).fetchall()
+    cases = " ".join(f"WHEN {code} THEN '{name.replace(chr(39), chr(39) * 2)}'" for code, name in known)
+    return f"CASE {row}.{spec['code']} {cases} ELSE {subtype_sql(spec, row, True)} END"
+
+def create_activity_view(cursor, table):
+    """Create the view giving an activity table's rows under its original name and columns
+
+    INSTEAD OF triggers write through the view: a new subtype name is added
+    to the dimension table and the row stored with its code. SQLite does not
+    count rows written this way in a statement's rowcount (see
+    count_view_writes()).
+    """
+    spec = ACTIVITY_TABLES[table]
+    data, dimension, code = spec['data'], spec['dimension'], spec['code']
+    row_id, subtype, quantity = spec['id'], spec['subtype'], spec['quantity']
+    cursor.execute(f'''
+    CREATE VIEW IF NOT EXISTS {table} AS
+    SELECT {row_id}, User_ID, {decode_sql(cursor, spec, data)} AS {subtype}, {quantity}, Date
+    FROM {data}
+    ''')
     
-    conn = sqlite3.connect('carbon_emission.db')
-    cursor = conn.cursor()
+    add_name = f"INSERT OR IGNORE INTO {dimension} ({subtype}) SELECT NEW.{subtype} WHERE NEW.{subtype} IS NOT NULL;"
+    new_code = f"(SELECT {code} FROM {dimension} WHERE {subtype} = NEW.{subtype})"
+    name = table.lower()
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{name}_view_insert INSTEAD OF INSERT ON {table}
+    BEGIN
+        {add_name}
+        INSERT INTO {data} ({row_id}, User_ID, {code}, {quantity}, Date)
+        VALUES (NEW.{row_id}, NEW.User_ID, {new_code}, NEW.{quantity}, NEW.Date);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{name}_view_update INSTEAD OF UPDATE ON {table}
+    BEGIN
+        {add_name}
+        UPDATE {data}
+        SET {row_id} = NEW.{row_id}, User_ID = NEW.User_ID, {code} = {new_code},
+            {quantity} = NEW.{quantity}, Date = NEW.Date
+        WHERE {row_id} = OLD.{row_id};
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{name}_view_delete INSTEAD OF DELETE ON {table}
+    BEGIN
+        DELETE FROM {data} WHERE {row_id} = OLD.{row_id};
+    END
+    ''')
+
+def count_view_writes(cursor):
+    """Have the cursor's connection count the rows written to the data tables
+
+    TEMP triggers, which exist on this connection only, add up the rows each
+    statement inserts, updates or deletes in a data table in
+    temp.View_Writes, so writes through the activity views can be reported
+    (see execute_counted()).
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS View_Writes (Rows INTEGER NOT NULL)")
+    cursor.execute("INSERT INTO temp.View_Writes SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM temp.View_Writes)")
+    for table, spec in ACTIVITY_TABLES.items():
+        if not encoded(cursor, table):
+            continue
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TEMP TRIGGER IF NOT EXISTS trg_{table.lower()}_count_{event.lower()}
+            AFTER {event} ON main.{spec['data']}
+            BEGIN
+                UPDATE View_Writes SET Rows = Rows + 1;
+            END
+            ''')
+
+def execute_counted(cursor, statement):
+    """Execute a statement; return the rows it changed, including those written through the activity views
+
+    -1 for statements that return rows, as with cursor.rowcount. The
+    connection must have run count_view_writes().
+    """
+    before = cursor.connection.execute("SELECT Rows FROM temp.View_Writes").fetchone()[0]
+    cursor.execute(statement)
+    if cursor.description is not None:
+        return cursor.rowcount
+    written = cursor.connection.execute("SELECT Rows FROM temp.View_Writes").fetchone()[0] - before
+    return max(cursor.rowcount, written)
+
+def create_activity_table(cursor, table):
+    """Create an activity table: its dimension, its data table and the view under its name"""
+    create_dimension_table(cursor, ACTIVITY_TABLES[table])
+    create_data_table(cursor, table)
+    create_activity_view(cursor, table)
+
+def dimension_codes(cursor, spec):
+    """An activity table's subtype names and their codes, as a dict"""
+    return dict(cursor.execute(f"SELECT {spec['subtype']}, {spec['code']} FROM {spec['dimension']}"))
+
+def encode_rows(cursor, spec, columns, rows):
+    """(columns, rows) with the subtype replaced by its code, adding new names to the dimension
+
+    `rows` are tuples, as validation.validate_record returns them.
+    """
+    position = columns.index(spec['subtype'])
+    codes = dimension_codes(cursor, spec)
+    new = {row[position] for row in rows} - codes.keys() - {None}
+    if new:
+        cursor.executemany(
+            f"INSERT INTO {spec['dimension']} ({spec['subtype']}) VALUES (?)", [(name,) for name in sorted(new)]
+        )
+        codes = dimension_codes(cursor, spec)
+    columns = [spec['code'] if column == spec['subtype'] else column for column in columns]
+    get = codes.get
+    return columns, [row[:position] + (get(row[position]),) + row[position + 1:] for row in rows]
+
+def totals_amount_column(spec):
+    """Name of the User_Emission_Totals column holding a category's total"""
+    return f"{spec['category']}_Emissions" if spec['sign'] > 0 else f"{spec['category']}_Amount"
+
+# Per-user emission totals. User_Emission_Totals is kept current by triggers on
+# the activity tables, so the footprint queries read one row per user instead of
+# re-aggregating every activity row.
+def create_totals_table(cursor):
+    """Create the User_Emission_Totals table and the Carbon_Footprint_View over it"""
+    columns = []
+    for spec in ACTIVITY_TABLES.values():
+        prefix, amount = spec['category'], totals_amount_column(spec)
+        columns.append(f"{amount} FLOAT NOT NULL DEFAULT 0")
+        columns.append(f"{prefix}_Records INTEGER NOT NULL DEFAULT 0")
+        columns.append(f"Has_{prefix} INTEGER NOT NULL DEFAULT 0")
     
-    # Create tables based on the schema
-    cursor.execute('''
-    CREATE TABLE User_Profile (
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS User_Emission_Totals (
         User_ID INTEGER PRIMARY KEY,
-        Full_Name VARCHAR(100),
-        Email VARCHAR(100),
-        Location VARCHAR(100)
+        {", ".join(columns)},
+        Net_Emissions FLOAT NOT NULL DEFAULT 0,
+        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
     )
     ''')
     
+    cursor.execute("DROP VIEW IF EXISTS Carbon_Footprint_View")
     cursor.execute('''
-    CREATE TABLE Transportation (
-        Transport_ID INTEGER PRIMARY KEY,
-        User_ID INTEGER,
-        Vehicle_Type VARCHAR(50),
-        Distance_KM FLOAT,
-        Date DATE,
-        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
-    )
+    CREATE VIEW Carbon_Footprint_View AS
+    SELECT 
+        up.User_ID, 
+        up.Full_Name,
+        up.Location,
+        COALESCE(uet.Transport_Emissions, 0) as Transport_Emissions,
+        COALESCE(uet.Energy_Emissions, 0) as Energy_Emissions,
+        COALESCE(uet.Waste_Emissions, 0) as Waste_Emissions,
+        COALESCE(uet.Industrial_Emissions, 0) as Industrial_Emissions,
+        COALESCE(uet.Offset_Amount, 0) as Offset_Amount,
+        COALESCE(uet.Net_Emissions, 0) as Net_Emissions
+    FROM User_Profile up
+    LEFT JOIN User_Emission_Totals uet ON uet.User_ID = up.User_ID
     ''')
+
+def create_totals_triggers(cursor):
+    """Create the triggers that keep User_Emission_Totals current"""
+    for table, spec in ACTIVITY_TABLES.items():
+        prefix, amount = spec['category'], totals_amount_column(spec)
+        op = '+' if spec['sign'] > 0 else '-'
+        coded = encoded(cursor, table)
+        new, old = emission_sql(spec, 'NEW', coded), emission_sql(spec, 'OLD', coded)
+        
+        add_new = f'''
+            INSERT OR IGNORE INTO User_Emission_Totals (User_ID) SELECT NEW.User_ID WHERE NEW.User_ID IS NOT NULL;
+            UPDATE User_Emission_Totals
+            SET {amount} = {amount} + {new},
+                {prefix}_Records = {prefix}_Records + 1,
+                Has_{prefix} = 1,
+                Net_Emissions = Net_Emissions {op} {new}
+            WHERE User_ID = NEW.User_ID;'''
+        remove_old = f'''
+            UPDATE User_Emission_Totals
+            SET {amount} = {amount} - {old},
+                {prefix}_Records = {prefix}_Records - 1,
+                Has_{prefix} = {prefix}_Records > 1,
+                Net_Emissions = Net_Emissions {'-' if spec['sign'] > 0 else '+'} {old}
+            WHERE User_ID = OLD.User_ID;'''
+        
+        name, target = table.lower(), spec['data'] if coded else table
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_totals_insert AFTER INSERT ON {target} BEGIN {add_new} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_totals_delete AFTER DELETE ON {target} BEGIN {remove_old} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_totals_update AFTER UPDATE ON {target} BEGIN {remove_old} {add_new} END")
     
+    # Every user gets a (zero) totals row as soon as the profile exists
     cursor.execute('''
-    CREATE TABLE Energy_Consumption (
-        Energy_ID INTEGER PRIMARY KEY,
-        User_ID INTEGER,
-        Energy_Source VARCHAR(50),
-        Consumption_KWH FLOAT,
-        Date DATE,
-        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+    CREATE TRIGGER IF NOT EXISTS trg_user_profile_totals_insert AFTER INSERT ON User_Profile
+    BEGIN
+        INSERT OR IGNORE INTO User_Emission_Totals (User_ID) VALUES (NEW.User_ID);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_user_profile_totals_delete AFTER DELETE ON User_Profile
+    BEGIN
+        DELETE FROM User_Emission_Totals WHERE User_ID = OLD.User_ID;
+    END
+    ''')
+    
+    # A changed emission factor can affect every user, so recompute everything
+    rebuild = rebuild_totals_sql()
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_emission_factor_totals_{event.lower()} AFTER {event} ON Emission_Factor
+        BEGIN
+            {rebuild}
+        END
+        ''')
+
+def rebuild_totals_sql():
+    """SQL statements that recompute User_Emission_Totals from the activity tables (or their views)"""
+    statements = [
+        "DELETE FROM User_Emission_Totals;",
+        "INSERT INTO User_Emission_Totals (User_ID) SELECT User_ID FROM User_Profile;"
+    ]
+    for table, spec in ACTIVITY_TABLES.items():
+        prefix, amount = spec['category'], totals_amount_column(spec)
+        statements.append(f'''
+            INSERT INTO User_Emission_Totals (User_ID, {amount}, {prefix}_Records, Has_{prefix})
+            SELECT r.User_ID, SUM({emission_sql(spec, 'r')}), COUNT(*), 1
+            FROM {table} r
+            WHERE r.User_ID IS NOT NULL
+            GROUP BY r.User_ID
+            ON CONFLICT(User_ID) DO UPDATE SET
+                {amount} = excluded.{amount},
+                {prefix}_Records = excluded.{prefix}_Records,
+                Has_{prefix} = 1;''')
+    statements.append(
+        "UPDATE User_Emission_Totals SET Net_Emissions = "
+        "Transport_Emissions + Energy_Emissions + Waste_Emissions + Industrial_Emissions - Offset_Amount;"
     )
+    return "\n".join(statements)
+
+def rebuild_emission_totals(cursor):
+    """Recompute User_Emission_Totals from scratch"""
+    for statement in rebuild_totals_sql().split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+# Monthly rollups. Monthly_Rollup holds one row per (user, category, subtype,
+# month) with the record count, quantity and emissions, kept current by the
+# same kind of triggers, so the month-bucketed queries and report charts read
+# a few rows per month instead of rescanning the raw history.
+def create_rollup_table(cursor):
+    """Create the Monthly_Rollup table and its (Category, Month) index"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Monthly_Rollup (
+        User_ID INTEGER NOT NULL,
+        Category VARCHAR(20) NOT NULL,
+        Subtype VARCHAR(100) NOT NULL,
+        Month CHAR(7) NOT NULL,
+        Record_Count INTEGER NOT NULL DEFAULT 0,
+        Quantity FLOAT NOT NULL DEFAULT 0,
+        Emissions FLOAT NOT NULL DEFAULT 0,
+        PRIMARY KEY (User_ID, Category, Subtype, Month)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_monthly_rollup_category_month
+    ON Monthly_Rollup (Category, Month, Record_Count, Quantity, Emissions)
     ''')
+
+ROLLUP_KEY = ('User_ID', 'Category', 'Subtype', 'Month')
+
+def rollup_key_sql(spec, row, coded=False):
+    """The (User_ID, Category, Subtype, Month) key expressions of an activity row"""
+    return [
+        f"COALESCE({row}.User_ID, 0)",
+        f"'{spec['category']}'",
+        f"COALESCE({subtype_sql(spec, row, coded)}, '')",
+        f"COALESCE(strftime('%Y-%m', {row}.Date), '')"
+    ]
+
+def rollup_match_sql(spec, row, coded=False):
+    """WHERE condition selecting the rollup row an activity row belongs to"""
+    return " AND ".join(f"{column} = {value}" for column, value in zip(ROLLUP_KEY, rollup_key_sql(spec, row, coded)))
+
+def create_rollup_triggers(cursor):
+    """Create the triggers that keep Monthly_Rollup current"""
+    for table, spec in ACTIVITY_TABLES.items():
+        quantity = spec['quantity']
+        coded = encoded(cursor, table)
+        
+        add_new = f'''
+            INSERT INTO Monthly_Rollup (User_ID, Category, Subtype, Month, Record_Count, Quantity, Emissions)
+            VALUES ({", ".join(rollup_key_sql(spec, 'NEW', coded))}, 1, COALESCE(NEW.{quantity}, 0), {emission_sql(spec, 'NEW', coded)})
+            ON CONFLICT (User_ID, Category, Subtype, Month) DO UPDATE SET
+                Record_Count = Record_Count + 1,
+                Quantity = Quantity + excluded.Quantity,
+                Emissions = Emissions + excluded.Emissions;'''
+        remove_old = f'''
+            UPDATE Monthly_Rollup
+            SET Record_Count = Record_Count - 1,
+                Quantity = Quantity - COALESCE(OLD.{quantity}, 0),
+                Emissions = Emissions - {emission_sql(spec, 'OLD', coded)}
+            WHERE {rollup_match_sql(spec, 'OLD', coded)};
+            DELETE FROM Monthly_Rollup
+            WHERE {rollup_match_sql(spec, 'OLD', coded)} AND Record_Count <= 0;'''
+        
+        name, target = table.lower(), spec['data'] if coded else table
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_rollup_insert AFTER INSERT ON {target} BEGIN {add_new} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_rollup_delete AFTER DELETE ON {target} BEGIN {remove_old} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_rollup_update AFTER UPDATE ON {target} BEGIN {remove_old} {add_new} END")
     
+    # Emission factors feed the Emissions column, so a change recomputes the rollups
+    rebuild = rebuild_rollups_sql()
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_emission_factor_rollup_{event.lower()} AFTER {event} ON Emission_Factor
+        BEGIN
+            {rebuild}
+        END
+        ''')
+
+def rebuild_rollups_sql():
+    """SQL statements that recompute Monthly_Rollup from the activity tables (or their views)"""
+    statements = ["DELETE FROM Monthly_Rollup;"]
+    for table, spec in ACTIVITY_TABLES.items():
+        statements.append(f'''
+            INSERT INTO Monthly_Rollup (User_ID, Category, Subtype, Month, Record_Count, Quantity, Emissions)
+            SELECT {", ".join(rollup_key_sql(spec, 'r'))}, COUNT(*), COALESCE(SUM(r.{spec['quantity']}), 0),
+                   SUM({emission_sql(spec, 'r')})
+            FROM {table} r
+            GROUP BY 1, 2, 3, 4;''')
+    return "\n".join(statements)
+
+def rebuild_monthly_rollups(cursor):
+    """Recompute Monthly_Rollup from scratch"""
+    for statement in rebuild_rollups_sql().split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+# Emission records. Emission_Record holds one row per emitting activity row
+# (offsets are not emissions) with its category, user, subtype, factor and
+# emission, written by triggers in the same transaction as the activity row,
+# so aggregate emission queries scan one narrow table instead of joining every
+# activity table to Emission_Factor. Source_ID is the activity row's id within
+# its Category. Databases migrated to it are filled by
+# backfill_emission_records(), a chunk at a time.
+RECORD_COLUMNS = ('Factor_ID', 'Source_Type', 'Source_ID', 'Emission_Amount', 'Date', 'Category', 'User_ID')
+
+def record_tables():
+    """The activity tables whose rows have emission records"""
+    return [table for table, spec in ACTIVITY_TABLES.items() if spec['sign'] > 0]
+
+def create_record_tables(cursor):
+    """Create Emission_Record's (Category, Source_ID) index and the backfill progress table"""
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_emission_record_source
+    ON Emission_Record (Category, Source_ID)
+    ''')
+    # One row per category still being backfilled: the last activity id done
     cursor.execute('''
-    CREATE TABLE Waste_Management (
-        Waste_ID INTEGER PRIMARY KEY,
+    CREATE TABLE IF NOT EXISTS Emission_Record_Backfill (
+        Category VARCHAR(20) PRIMARY KEY,
+        Last_ID INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+def record_values_sql(spec, row, coded=False):
+    """The RECORD_COLUMNS values of an activity row's emission record"""
+    subtype = subtype_sql(spec, row, coded)
+    factor = "NULL"
+    if spec['factor']:
+        factor = f"(SELECT Factor_ID FROM Emission_Factor WHERE Source_Type = {spec['factor'].format(subtype=subtype)})"
+    return [factor, subtype, f"{row}.{spec['id']}", emission_sql(spec, row, coded), f"{row}.Date",
+            f"'{spec['category']}'", f"{row}.User_ID"]
+
+def add_records_sql(table, where="1"):
+    """INSERT of the emission records of an activity table's rows (alias r) matching `where`
+
+    Rows that already have their record are skipped.
+    """
+    return f'''
+        INSERT OR IGNORE INTO Emission_Record ({", ".join(RECORD_COLUMNS)})
+        SELECT {", ".join(record_values_sql(ACTIVITY_TABLES[table], 'r'))}
+        FROM {table} r
+        WHERE {where}'''
+
+def create_record_triggers(cursor):
+    """Create the triggers that keep Emission_Record current"""
+    for table in record_tables():
+        spec = ACTIVITY_TABLES[table]
+        coded = encoded(cursor, table)
+        
+        add_new = f'''
+            INSERT OR REPLACE INTO Emission_Record ({", ".join(RECORD_COLUMNS)})
+            VALUES ({", ".join(record_values_sql(spec, 'NEW', coded))});'''
+        remove_old = f'''
+            DELETE FROM Emission_Record WHERE Category = '{spec['category']}' AND Source_ID = OLD.{spec['id']};'''
+        
+        name, target = table.lower(), spec['data'] if coded else table
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_records_insert AFTER INSERT ON {target} BEGIN {add_new} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_records_delete AFTER DELETE ON {target} BEGIN {remove_old} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name}_records_update AFTER UPDATE ON {target} BEGIN {remove_old} {add_new} END")
+    
+    # Only the categories computed with a factor depend on Emission_Factor
+    rebuild = rebuild_records_sql([table for table in record_tables() if ACTIVITY_TABLES[table]['factor']])
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_emission_factor_records_{event.lower()} AFTER {event} ON Emission_Factor
+        BEGIN
+            {rebuild}
+        END
+        ''')
+
+def rebuild_records_sql(tables=None):
+    """SQL statements that recompute the emission records of the activity tables (all by default)"""
+    tables = record_tables() if tables is None else tables
+    categories = ", ".join(f"'{ACTIVITY_TABLES[table]['category']}'" for table in tables)
+    statements = [f"DELETE FROM Emission_Record WHERE Category IN ({categories});"]
+    statements += [add_records_sql(table) + ";" for table in tables]
+    return "\n".join(statements)
+
+def rebuild_emission_records(cursor):
+    """Recompute Emission_Record from scratch (which leaves nothing to backfill)"""
+    for statement in rebuild_records_sql().split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+    cursor.execute("DELETE FROM Emission_Record_Backfill")
+
+# Activity rows backfilled per transaction
+BACKFILL_CHUNK_ROWS = 50000
+
+def backfill_emission_records(db_path=None, chunk_rows=BACKFILL_CHUNK_ROWS, progress=None):
+    """Write the emission records of the activity rows older than the record triggers
+
+    Works through each category listed in Emission_Record_Backfill in id
+    order, chunk_rows activity rows per transaction; the last id done is
+    committed with each chunk, so the job can be stopped at any point and
+    started again, and readers and writers only ever wait for one chunk. Rows
+    written meanwhile already have their records and are skipped. A category
+    is removed from the list once done. progress(table, records written so
+    far) is called after each chunk. Returns the number of records written.
+    """
+    conn = database.get_connection(db_path)
+    cursor = conn.cursor()
+    if not table_exists(cursor, 'Emission_Record_Backfill'):
+        return 0
+    
+    written = 0
+    for table in record_tables():
+        spec = ACTIVITY_TABLES[table]
+        row_id, category = spec['id'], spec['category']
+        while True:
+            state = cursor.execute(
+                "SELECT Last_ID FROM Emission_Record_Backfill WHERE Category = ?", (category,)
+            ).fetchone()
+            if state is None:
+                break
+            last = cursor.execute(
+                f"SELECT MAX({row_id}) FROM (SELECT {row_id} FROM {table} WHERE {row_id} > ? ORDER BY {row_id} LIMIT ?)",
+                (state[0], chunk_rows)
+            ).fetchone()[0]
+            with conn:
+                if last is None:
+                    cursor.execute("DELETE FROM Emission_Record_Backfill WHERE Category = ?", (category,))
+                    break
+                cursor.execute(add_records_sql(table, f"r.{row_id} > ? AND r.{row_id} <= ?"), (state[0], last))
+                written += cursor.rowcount
+                cursor.execute("UPDATE Emission_Record_Backfill SET Last_ID = ? WHERE Category = ?", (last, category))
+            database.record_writes(['Emission_Record'], db_path)
+            if progress:
+                progress(table, written)
+    
+    # The statistics were taken while the table was empty
+    if written:
+        cursor.execute("ANALYZE Emission_Record")
+        conn.commit()
+    return written
+
+# Bulk loads. Firing the totals, rollup and record triggers once per row
+# dominates the cost of a large insert, so bulk_insert() drops the insert
+# triggers for the duration of its transaction, writes the batch's emission
+# records with one INSERT ... SELECT, and applies the batch to the totals and
+# rollups from a small per-(user, subtype, date) summary of it. Every emission
+# expression is a row's quantity times a factor that only depends on its
+# subtype, so a summary row with the summed quantity has the same emissions as
+# the rows it stands for. DDL is transactional, so a failed batch rolls back
+# with the triggers intact.
+def insert_trigger_names(table):
+    """Names of the per-row insert triggers that maintain the derived tables"""
+    name = table.lower()
+    return [f"trg_{name}_totals_insert", f"trg_{name}_rollup_insert", f"trg_{name}_records_insert"]
+
+def summary_table(table):
+    """Name of the temp table holding a bulk batch's summary"""
+    return f"temp.Bulk_{table}"
+
+def create_summary_table(cursor, table):
+    """Create (or empty) the temp summary table for bulk loads into an activity table"""
+    spec = ACTIVITY_TABLES[table]
+    cursor.execute(f'''
+    CREATE TEMP TABLE IF NOT EXISTS Bulk_{table} (
         User_ID INTEGER,
-        Waste_Type VARCHAR(50),
-        Waste_Weight_KG FLOAT,
+        {spec['subtype']} VARCHAR(100),
+        {spec['quantity']} FLOAT,
         Date DATE,
-        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+        Record_Count INTEGER,
+        Emissions FLOAT
     )
     ''')
+    cursor.execute(f"DELETE FROM {summary_table(table)}")
+
+def add_totals_sql(table):
+    """UPSERT adding a bulk batch's summary to User_Emission_Totals"""
+    spec = ACTIVITY_TABLES[table]
+    prefix, amount = spec['category'], totals_amount_column(spec)
+    return f'''
+        INSERT INTO User_Emission_Totals (User_ID, {amount}, {prefix}_Records, Has_{prefix}, Net_Emissions)
+        SELECT User_ID, SUM(Emissions), SUM(Record_Count), 1, {spec['sign']} * SUM(Emissions)
+        FROM {summary_table(table)}
+        WHERE User_ID IS NOT NULL
+        GROUP BY User_ID
+        ON CONFLICT(User_ID) DO UPDATE SET
+            {amount} = {amount} + excluded.{amount},
+            {prefix}_Records = {prefix}_Records + excluded.{prefix}_Records,
+            Has_{prefix} = 1,
+            Net_Emissions = Net_Emissions + excluded.Net_Emissions'''
+
+def add_rollups_sql(table):
+    """UPSERT adding a bulk batch's summary to Monthly_Rollup"""
+    spec = ACTIVITY_TABLES[table]
+    return f'''
+        INSERT INTO Monthly_Rollup (User_ID, Category, Subtype, Month, Record_Count, Quantity, Emissions)
+        SELECT {", ".join(rollup_key_sql(spec, 'r'))}, SUM(r.Record_Count), COALESCE(SUM(r.{spec['quantity']}), 0),
+               SUM(r.Emissions)
+        FROM {summary_table(table)} r
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (User_ID, Category, Subtype, Month) DO UPDATE SET
+            Record_Count = Record_Count + excluded.Record_Count,
+            Quantity = Quantity + excluded.Quantity,
+            Emissions = Emissions + excluded.Emissions'''
+
+def summarize_rows(connection, spec, columns, rows):
+    """Group validated activity rows by (User_ID, subtype, Date): count and summed quantity
+
+    Each group's emission is its summed quantity times its factor, computed
+    for all the groups at once by emission_engine (0 where there is no
+    factor, as the 'emission' SQL of the triggers gives).
+    """
+    user, subtype, quantity, date = (columns.index(c) for c in ('User_ID', spec['subtype'], spec['quantity'], 'Date'))
+    groups = {}
+    for row in rows:
+        key = (row[user], row[subtype], row[date])
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [1, row[quantity]]
+        else:
+            group[0] += 1
+            group[1] += row[quantity]
+    summary = [(u, s, total, d, count) for (u, s, d), (count, total) in groups.items()]
+    if not summary:
+        return []
+
+    # Imported here: emission_engine imports this module
+    import numpy as np
+    from emission_engine import CATEGORY_CODES, get_factors
+    subtypes = [row[1] for row in summary]
+    quantities = [row[2] for row in summary]
+    emissions = get_factors(connection).emissions(np.full(len(summary), CATEGORY_CODES[spec['category']]),
+                                                  subtypes, quantities)
+    return [row + (emission,) for row, emission in zip(summary, np.nan_to_num(emissions).tolist())]
+
+def insert_sql(table, columns):
+    """INSERT statement of a row of the columns"""
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+def bulk_insert(cursor, table, columns, rows):
+    """Insert many validated rows inside the caller's transaction; return the number inserted"""
+    if table not in ACTIVITY_TABLES:
+        cursor.executemany(insert_sql(table, columns), rows)
+        return cursor.rowcount
+
+    spec = ACTIVITY_TABLES[table]
+    create_summary_table(cursor, table)
+    cursor.executemany(
+        f"INSERT INTO {summary_table(table)} VALUES (?, ?, ?, ?, ?, ?)",
+        summarize_rows(cursor.connection, spec, columns, rows)
+    )
+
+    # Rows go straight into the data table, their subtypes encoded here
+    # rather than by the view's trigger
+    target = table
+    if encoded(cursor, table):
+        columns, rows = encode_rows(cursor, spec, columns, rows)
+        target = spec['data']
+    for trigger in insert_trigger_names(table):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    last = cursor.execute(f"SELECT MAX({spec['id']}) FROM {target}").fetchone()[0]
+    cursor.executemany(insert_sql(target, columns), rows)
+    count = cursor.rowcount
+
+    # The batch's rows are the ones past the previous largest id
+    if spec['sign'] > 0:
+        cursor.execute(add_records_sql(table, f"r.{spec['id']} > ?"), (last or 0,))
+    cursor.execute(add_totals_sql(table))
+    cursor.execute(add_rollups_sql(table))
+    create_totals_triggers(cursor)
+    create_rollup_triggers(cursor)
+    create_record_triggers(cursor)
+    return count
+
+# Migrations bring a database created by an older version of the app up to
+# date. PRAGMA user_version holds the number of migrations already applied, so
+# new steps must only ever be appended to this list.
+#
+# Each migration builds the indexes of its own schema version rather than
+# INDEXES, whose later entries can name columns a migration further down
+# the list adds. The first indexes were on the activity tables as they were
+# before their subtypes were encoded.
+ORIGINAL_INDEXES = {
+    'idx_transportation_user_date': 'Transportation (User_ID, Date, Distance_KM)',
+    'idx_energy_user_date': 'Energy_Consumption (User_ID, Date, Consumption_KWH)',
+    'idx_waste_user_date': 'Waste_Management (User_ID, Date, Waste_Weight_KG)',
+    'idx_industrial_user_date': 'Industrial_Activity (User_ID, Date, Emission_Produced)',
+    'idx_offset_user_date': 'Carbon_Offset (User_ID, Date, Offset_Amount)',
+    'idx_emission_factor_source': 'Emission_Factor (Source_Type, Emission_Per_Unit)',
+    'idx_user_location': 'User_Profile (Location)'
+}
+
+ENCODED_INDEXES = {
+    name: INDEXES[name] for name in (
+        'idx_transportation_user_date', 'idx_energy_user_date', 'idx_waste_user_date',
+        'idx_industrial_user_date', 'idx_offset_user_date', 'idx_emission_factor_source',
+        'idx_user_location'
+    )
+}
+
+def migration_add_indexes(cursor):
+    create_indexes(cursor, ORIGINAL_INDEXES)
+    cursor.execute("ANALYZE")
+
+def migration_add_emission_totals(cursor):
+    create_totals_table(cursor)
+    create_totals_triggers(cursor)
+    rebuild_emission_totals(cursor)
+
+def migration_add_monthly_rollups(cursor):
+    create_rollup_table(cursor)
+    create_rollup_triggers(cursor)
+    rebuild_monthly_rollups(cursor)
+
+# Rows moved per transaction when an activity table is encoded in place
+MIGRATION_CHUNK_ROWS = 50000
+
+def migration_encode_dimensions(cursor):
+    """Move each activity table's rows into its data table with subtype codes
+
+    Rows are copied and deleted MIGRATION_CHUNK_ROWS at a time, each chunk
+    committed, so a large table never needs a second copy's worth of space
+    or one huge transaction, and an interrupted migration picks up where it
+    stopped. Rows keep their ids and are only moved, so the derived tables
+    are left as they are; their triggers are dropped for the move and
+    recreated on the data tables.
+    """
+    conn = cursor.connection
+    for table, spec in ACTIVITY_TABLES.items():
+        if not table_exists(cursor, table):
+            # Already moved (the view is missing if it stopped just after the drop)
+            create_activity_view(cursor, table)
+            continue
+        name, row_id, subtype = table.lower(), spec['id'], spec['subtype']
+        create_dimension_table(cursor, spec)
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {spec['dimension']} ({subtype}) "
+            f"SELECT DISTINCT {subtype} FROM {table} WHERE {subtype} IS NOT NULL ORDER BY 1"
+        )
+        create_data_table(cursor, table)
+        for kind in ('totals', 'rollup'):
+            for event in ('insert', 'update', 'delete'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_{name}_{kind}_{event}")
+        # The old table's indexes would slow the deletes, and their names are
+        # taken by the data table's
+        for index, definition in INDEXES.items():
+            if definition.split()[0] == spec['data']:
+                cursor.execute(f"DROP INDEX IF EXISTS {index}")
+        conn.commit()
+        
+        while True:
+            last = cursor.execute(
+                f"SELECT MAX({row_id}) FROM (SELECT {row_id} FROM {table} ORDER BY {row_id} LIMIT ?)",
+                (MIGRATION_CHUNK_ROWS,)
+            ).fetchone()[0]
+            if last is None:
+                break
+            cursor.execute(f'''
+            INSERT INTO {spec['data']} ({row_id}, User_ID, {spec['code']}, {spec['quantity']}, Date)
+            SELECT t.{row_id}, t.User_ID, d.{spec['code']}, t.{spec['quantity']}, t.Date
+            FROM {table} t
+            LEFT JOIN {spec['dimension']} d ON d.{subtype} = t.{subtype}
+            WHERE t.{row_id} <= ?
+            ''', (last,))
+            cursor.execute(f"DELETE FROM {table} WHERE {row_id} <= ?", (last,))
+            conn.commit()
+        
+        cursor.execute(f"DROP TABLE {table}")
+        create_activity_view(cursor, table)
+        conn.commit()
+    
+    create_totals_triggers(cursor)
+    create_rollup_triggers(cursor)
+    create_indexes(cursor, ENCODED_INDEXES)
+    cursor.execute("ANALYZE")
+
+def migration_add_emission_records(cursor):
+    """Tie Emission_Record to the activity rows; the rows themselves come from the backfill
+
+    Records that predate the Category and User_ID columns (the old demo
+    data's hand-written rows) match no activity row by these rules, so they
+    are replaced by the backfilled ones.
+    """
+    cursor.execute("ALTER TABLE Emission_Record ADD COLUMN Category VARCHAR(20)")
+    cursor.execute("ALTER TABLE Emission_Record ADD COLUMN User_ID INTEGER REFERENCES User_Profile(User_ID)")
+    cursor.execute("DELETE FROM Emission_Record WHERE Category IS NULL")
+    create_record_tables(cursor)
+    create_record_triggers(cursor)
+    create_indexes(cursor, {'idx_emission_record_category_date': INDEXES['idx_emission_record_category_date']})
+    cursor.executemany(
+        "INSERT OR IGNORE INTO Emission_Record_Backfill (Category) VALUES (?)",
+        [(ACTIVITY_TABLES[table]['category'],) for table in record_tables()]
+    )
+
+def migration_index_emission_record_users(cursor):
+    create_indexes(cursor, {'idx_emission_record_user_date': INDEXES['idx_emission_record_user_date']})
+    cursor.execute("ANALYZE Emission_Record")
+
+MIGRATIONS = [
+    migration_add_indexes,
+    migration_add_emission_totals,
+    migration_add_monthly_rollups,
+    migration_encode_dimensions,
+    migration_add_emission_records,
+    migration_index_emission_record_users
+]
+
+def migrate_database(db_path=None):
+    """Apply any pending schema migrations to an existing database"""
+    conn = database.get_connection(db_path)
+    cursor = conn.cursor()
     
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+
+def create_tables(cursor):
+    """Create the base tables"""
     cursor.execute('''
-    CREATE TABLE Industrial_Activity (
-        Industry_ID INTEGER PRIMARY KEY,
-        User_ID INTEGER,
-        Activity_Type VARCHAR(100),
-        Emission_Produced FLOAT,
-        Date DATE,
-        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+    CREATE TABLE User_Profile (
+        User_ID INTEGER PRIMARY KEY,
+        Full_Name VARCHAR(100),
+        Email VARCHAR(100),
+        Location VARCHAR(100)
     )
     ''')
     
@@ -79,7 +936,10 @@ def setup_database():
         Source_ID INTEGER,
         Emission_Amount FLOAT,
         Date DATE,
-        FOREIGN KEY (Factor_ID) REFERENCES Emission_Factor(Factor_ID)
+        Category VARCHAR(20),
+        User_ID INTEGER,
+        FOREIGN KEY (Factor_ID) REFERENCES Emission_Factor(Factor_ID),
+        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
     )
     ''')
     
@@ -102,18 +962,41 @@ def setup_database():
     )
     ''')
     
-    cursor.execute('''
-    CREATE TABLE Carbon_Offset (
-        Offset_ID INTEGER PRIMARY KEY,
-        User_ID INTEGER,
-        Offset_Type VARCHAR(50),
-        Offset_Amount FLOAT,
-        Date DATE,
-        FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
-    )
-    ''')
+    # Activity tables: views over the data tables and their dimensions
+    for table in ACTIVITY_TABLES:
+        create_activity_table(cursor, table)
+
+def insert_reference_data(cursor):
+    """Insert the emission factors and sustainability programs"""
+    # Emission_Factor
+    emission_factors = [
+        (1, 'Car', 2.31),
+        (2, 'Bus', 0.89),
+        (3, 'Train', 0.41),
+        (4, 'Airplane', 8.75),
+        (5, 'Electricity', 0.45),
+        (6, 'Natural Gas', 0.20),
+        (7, 'Coal', 0.34),
+        (8, 'Manufacturing', 5.20),
+        (9, 'Construction', 4.35),
+        (10, 'Waste', 0.58)
+    ]
+    cursor.executemany('INSERT INTO Emission_Factor VALUES (?, ?, ?)', emission_factors)
+    
+    # Sustainability_Program
+    sustainability_programs = [
+        (1, 'Green Energy Initiative', 'Promoting renewable energy sources'),
+        (2, 'Zero Waste Challenge', 'Reducing waste through recycling and composting'),
+        (3, 'Carbon Footprint Reduction', 'Activities to reduce personal carbon footprint'),
+        (4, 'Sustainable Transportation', 'Promoting eco-friendly transportation methods'),
+        (5, 'Energy Efficiency Program', 'Improving energy efficiency at home and work')
+    ]
+    cursor.executemany('INSERT INTO Sustainability_Program VALUES (?, ?, ?)', sustainability_programs)
+
+def insert_demo_data(cursor):
+    """Insert the demo users and their activity records"""
+    insert_reference_data(cursor)
     
-    # Insert demo data
     # User_Profile
     users = [
         (1, 'John Doe', 'john.doe@email.com', 'New York'),
@@ -176,44 +1059,6 @@ def setup_database():
     ]
     cursor.executemany('INSERT INTO Industrial_Activity VALUES (?, ?, ?, ?, ?)', industrial_activities)
     
-    # Emission_Factor
-    emission_factors = [
-        (1, 'Car', 2.31),
-        (2, 'Bus', 0.89),
-        (3, 'Train', 0.41),
-        (4, 'Airplane', 8.75),
-        (5, 'Electricity', 0.45),
-        (6, 'Natural Gas', 0.20),
-        (7, 'Coal', 0.34),
-        (8, 'Manufacturing', 5.20),
-        (9, 'Construction', 4.35),
-        (10, 'Waste', 0.58)
-    ]
-    cursor.executemany('INSERT INTO Emission_Factor VALUES (?, ?, ?)', emission_factors)
-    
-    # Emission_Record
-    emission_records = [
-        (1, 1, 'Car', 1, 347.65, '2023-01-15'),
-        (2, 2, 'Bus', 2, 66.92, '2023-02-10'),
-        (3, 3, 'Train', 3, 82.00, '2023-01-22'),
-        (4, 5, 'Electricity', 1, 157.50, '2023-01-31'),
-        (5, 6, 'Natural Gas', 2, 40.10, '2023-01-31'),
-        (6, 8, 'Manufacturing', 1, 2600.00, '2023-01-15'),
-        (7, 9, 'Construction', 2, 3264.67, '2023-01-20'),
-        (8, 10, 'Waste', 1, 3.02, '2023-01-20')
-    ]
-    cursor.executemany('INSERT INTO Emission_Record VALUES (?, ?, ?, ?, ?, ?)', emission_records)
-    
-    # Sustainability_Program
-    sustainability_programs = [
-        (1, 'Green Energy Initiative', 'Promoting renewable energy sources'),
-        (2, 'Zero Waste Challenge', 'Reducing waste through recycling and composting'),
-        (3, 'Carbon Footprint Reduction', 'Activities to reduce personal carbon footprint'),
-        (4, 'Sustainable Transportation', 'Promoting eco-friendly transportation methods'),
-        (5, 'Energy Efficiency Program', 'Improving energy efficiency at home and work')
-    ]
-    cursor.executemany('INSERT INTO Sustainability_Program VALUES (?, ?, ?)', sustainability_programs)
-    
     # User_Program
     user_programs = [
         (1, 1, '2022-12-01'),
@@ -239,11 +1084,89 @@ def setup_database():
         (8, 3, 'Renewable Energy Credits', 110.0, '2023-02-15')
     ]
     cursor.executemany('INSERT INTO Carbon_Offset VALUES (?, ?, ?, ?, ?)', carbon_offsets)
+
+def setup_database(db_path=None, populate=None):
+    """Create a fresh database filled by populate(cursor), the demo data by default"""
+    db_path = db_path or database.get_database_path()
+    
+    # Delete the database file (and its WAL files) if it exists
+    database.close_all(db_path)
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    
+    conn = database.get_connection(db_path)
+    cursor = conn.cursor()
+    
+    # Create tables based on the schema
+    create_tables(cursor)
+    
+    # Insert the initial data
+    (populate or insert_demo_data)(cursor)
+    
+    # Trigger-maintained per-user totals
+    create_totals_table(cursor)
+    create_totals_triggers(cursor)
+    rebuild_emission_totals(cursor)
+    
+    # Trigger-maintained monthly rollups
+    create_rollup_table(cursor)
+    create_rollup_triggers(cursor)
+    rebuild_monthly_rollups(cursor)
+    
+    # Trigger-maintained emission records
+    create_record_tables(cursor)
+    create_record_triggers(cursor)
+    rebuild_emission_records(cursor)
+    
+    # Indexes and planner statistics
+    create_indexes(cursor)
+    cursor.execute("ANALYZE")
+    
+    # A fresh database already has everything the migrations would add
+    cursor.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
     
     conn.commit()
-    conn.close()
     
-    print("Database created successfully with demo data!")
+    if populate is None:
+        print("Database created successfully with demo data!")
+
+def rebuild_derived_tables(db_path=None):
+    """Recompute User_Emission_Totals, Monthly_Rollup and Emission_Record from the activity tables"""
+    conn = database.get_connection(db_path)
+    with conn:
+        cursor = conn.cursor()
+        rebuild_emission_totals(cursor)
+        rebuild_monthly_rollups(cursor)
+        rebuild_emission_records(cursor)
 
 if __name__ == "__main__":
-    setup_database() 
\ No newline at end of file
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description="Create or maintain the carbon emission database")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--migrate", action="store_true", help="apply pending migrations instead of recreating the database")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute the emission totals, monthly rollups and emission records")
+    parser.add_argument("--backfill", action="store_true", help="write the emission records of older activity rows")
+    args = parser.parse_args()
+    
+    if args.db:
+        database.set_database_path(args.db)
+    
+    if args.migrate or args.rebuild or args.backfill:
+        if args.migrate:
+            migrate_database()
+            print("Database migrated.")
+        if args.rebuild:
+            rebuild_derived_tables()
+            print("Emission totals, monthly rollups and emission records rebuilt.")
+        if args.backfill:
+            started = time.perf_counter()
+            written = backfill_emission_records(progress=lambda table, records: print(
+                f"{table}: {records:,} records ({time.perf_counter() - started:.1f} s)", flush=True
+            ))
+            print(f"Backfilled {written:,} emission records.")
+    else:
+        setup_database() 
\ No newline at end of file
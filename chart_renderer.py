@@ -0,0 +1,230 @@
+import io
+import math
+import queue
+import threading
+import time
+
+# Sources of the emissions pie, in drawing order: (summary key, label)
+PIE_SOURCES = [
+    ('transport_emissions', 'Transportation'),
+    ('energy_emissions', 'Energy'),
+    ('waste_emissions', 'Waste'),
+    ('industrial_emissions', 'Industrial')
+]
+
+# Bars of the emissions vs offset chart: (summary key, label, colour)
+OFFSET_BARS = [
+    ('total_emissions', 'Total Emissions', 'red'),
+    ('total_offset', 'Carbon Offset', 'green'),
+    ('net_emissions', 'Net Emissions', 'blue')
+]
+
+# Breakdown charts: report breakdown key -> (title, y label, text when empty)
+BREAKDOWN_CHARTS = {
+    'transport': ('Transportation by Vehicle Type', 'Distance (km)', 'No transportation data available'),
+    'energy': ('Energy by Source', 'Consumption (kWh)', 'No energy data available')
+}
+
+# zlib level of the chart PNGs: level 1 encodes in about two thirds of the
+# default's time for images a fifth larger
+PNG_COMPRESSION = 1
+
+# Width of a breakdown bar, as drawn by pandas' Series.plot(kind='bar')
+BAR_WIDTH = 0.5
+
+class BreakdownChart:
+    """A bar per subtype on one axes, its bars reused from one report to the next"""
+
+    def __init__(self, axes, title, ylabel, empty_text):
+        self.axes = axes
+        self.ylabel = ylabel
+        self.bars = []
+        axes.set_title(title)
+        self.empty = axes.text(0.5, 0.5, empty_text, ha='center', va='center', transform=axes.transAxes)
+
+    def update(self, series):
+        """Show a Series of quantities indexed by subtype"""
+        axes = self.axes
+        values = [float(value) for value in series.to_numpy()]
+        labels = [str(label) for label in series.index]
+
+        # Bars are only added when a report has more subtypes than any before
+        # it; surplus ones are hidden rather than removed, as the axes' bar
+        # containers would keep them alive anyway
+        if len(values) > len(self.bars):
+            start = len(self.bars)
+            self.bars += list(axes.bar(range(start, len(values)), values[start:], width=BAR_WIDTH, color='C0'))
+        for i, bar in enumerate(self.bars):
+            bar.set_visible(i < len(values))
+            bar.set_height(values[i] if i < len(values) else 0)
+
+        self.empty.set_visible(not values)
+        axes.set_xticks(range(len(values)), labels, rotation=90)
+        axes.set_xlabel((series.index.name or "") if values else "")
+        axes.set_ylabel(self.ylabel if values else "")
+        axes.tick_params(axis='y', left=bool(values), labelleft=bool(values))
+        axes.set_xlim(-0.5, max(len(values), 1) - 0.5)
+        axes.relim()
+        axes.autoscale_view(scalex=False)
+
+class ReportCharts:
+    """The report's four charts on one Agg figure that is kept between reports
+
+    The figure, axes and artists are created once; update() gives them a new
+    report's data (bars change height, pie wedges change angle) rather than
+    building another figure, so rendering many reports does not accumulate
+    matplotlib objects. Nothing here touches pyplot's global state or Tk, so
+    it can run on any one thread at a time.
+    """
+
+    def __init__(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.patches import Wedge
+
+        self.figure = Figure(figsize=(10, 8), dpi=100)
+        self.canvas = FigureCanvasAgg(self.figure)
+
+        # Emissions breakdown pie: a wedge, label and percentage per source,
+        # hidden while the source has no emissions
+        self.pie = self.figure.add_subplot(221)
+        self.pie.set_title('Emissions by Source')
+        self.pie.set(xlim=(-1.25, 1.25), ylim=(-1.25, 1.25), xticks=[], yticks=[], aspect='equal')
+        self.pie.set_frame_on(False)
+        self.wedges, self.wedge_labels, self.wedge_percents = [], [], []
+        for i, (_, label) in enumerate(PIE_SOURCES):
+            self.wedges.append(self.pie.add_patch(Wedge((0, 0), 1, 0, 0, facecolor=f'C{i}')))
+            self.wedge_labels.append(self.pie.text(0, 0, label, va='center'))
+            self.wedge_percents.append(self.pie.text(0, 0, "", ha='center', va='center'))
+        self.no_emissions = self.pie.text(0.5, 0.5, 'No emissions data available', ha='center', va='center',
+                                          transform=self.pie.transAxes)
+
+        # Emissions vs offset: three fixed bars with their values on top
+        self.totals = self.figure.add_subplot(222)
+        self.totals.set_title('Emissions vs Offset')
+        self.total_bars = list(self.totals.bar(
+            [label for _, label, _ in OFFSET_BARS], [0] * len(OFFSET_BARS),
+            color=[colour for _, _, colour in OFFSET_BARS]
+        ))
+        self.totals.tick_params(axis='x', rotation=15)
+        self.total_labels = [
+            self.totals.text(bar.get_x() + bar.get_width() / 2., 0, "", ha='center', va='bottom')
+            for bar in self.total_bars
+        ]
+
+        self.breakdowns = {
+            key: BreakdownChart(self.figure.add_subplot(223 + i), *BREAKDOWN_CHARTS[key])
+            for i, key in enumerate(BREAKDOWN_CHARTS)
+        }
+
+    def update(self, data):
+        """Point the charts at a report's data dictionary"""
+        summary = data['summary']
+
+        # Wedges run counter-clockwise from 0 degrees, like Axes.pie's defaults
+        emissions = [max(float(summary[key]), 0.0) for key, _ in PIE_SOURCES]
+        total = sum(emissions)
+        angle = 0.0
+        for wedge, label, percent, value in zip(self.wedges, self.wedge_labels, self.wedge_percents, emissions):
+            shown = total > 0 and value > 0
+            for artist in (wedge, label, percent):
+                artist.set_visible(shown)
+            if not shown:
+                continue
+            share = value / total
+            wedge.set_theta1(angle)
+            wedge.set_theta2(angle + 360 * share)
+            middle = math.radians(angle + 180 * share)
+            x, y = math.cos(middle), math.sin(middle)
+            label.set_position((1.1 * x, 1.1 * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            percent.set_position((0.6 * x, 0.6 * y))
+            percent.set_text(f"{100 * share:.1f}%")
+            angle += 360 * share
+        self.no_emissions.set_visible(total <= 0)
+
+        for bar, label, (key, _, _) in zip(self.total_bars, self.total_labels, OFFSET_BARS):
+            height = float(summary[key])
+            bar.set_height(height)
+            label.set_position((bar.get_x() + bar.get_width() / 2., height))
+            label.set_text(f'{height:.1f}')
+        self.totals.relim()
+        self.totals.autoscale_view()
+
+        for key, chart in self.breakdowns.items():
+            chart.update(data['breakdown'][key])
+
+        self.figure.tight_layout()
+
+    def render(self, data):
+        """Draw a report's charts and return them as a PNG image (bytes)"""
+        self.update(data)
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png', pil_kwargs={'compress_level': PNG_COMPRESSION})
+        return buffer.getvalue()
+
+class ChartRenderer:
+    """Render report charts on a background thread
+
+    The worker owns the one ReportCharts figure (and imports matplotlib on
+    its first job), so the Tk thread never draws or encodes a chart: it
+    queues a report with submit() and collects the PNG with poll() from an
+    after() loop, then only displays it. Jobs are handled in order; when
+    several are queued only the latest is drawn.
+    """
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._worker, name="chart-renderer", daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        """Queue a report's data dictionary for rendering and return the job id"""
+        with self._lock:
+            self._next_id += 1
+            job_id = self._next_id
+        self._jobs.put((job_id, data))
+        return job_id
+
+    def poll(self):
+        """Return the next finished job, or None
+
+        A result is a dict with job_id, status ('ok', 'skipped' when a later
+        job replaced it, or 'error') and elapsed seconds, plus png (bytes)
+        when ok or error (text) on failure.
+        """
+        try:
+            return self._results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _worker(self):
+        """Worker loop: render the most recent queued report"""
+        charts = None
+        while True:
+            job_id, data = self._jobs.get()
+
+            # Reports superseded while waiting are not drawn
+            while True:
+                try:
+                    newer = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                self._results.put({'job_id': job_id, 'status': 'skipped', 'elapsed': 0.0})
+                job_id, data = newer
+
+            start = time.perf_counter()
+            result = {'job_id': job_id}
+            try:
+                if charts is None:
+                    charts = ReportCharts()
+                result['png'] = charts.render(data)
+                result['status'] = 'ok'
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+            result['elapsed'] = time.perf_counter() - start
+            self._results.put(result)
@@ -0,0 +1,249 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import database
+from predefined_queries import predefined_queries
+from updated_queries import updated_queries
+
+# This entry point never imports tkinter or matplotlib, so it runs on servers
+# without a display. pandas is only needed for reports: report_data and
+# batch_reports are imported by the commands that use them, which keeps the
+# cold start of a query or an export to sqlite3 and the standard library.
+
+QUERY_SETS = {
+    'updated': updated_queries,
+    'predefined': predefined_queries
+}
+
+# Output formats: the ones bulk_import.py reads back
+EXPORT_FORMATS = ['csv', 'ndjson']
+
+# Report date range when none is given: every date
+ALL_DATES = ('0000-01-01', '9999-12-31')
+
+def find_query(name):
+    """The SQL of a named query: an exact name, or the only name containing `name`"""
+    for queries in QUERY_SETS.values():
+        if name in queries:
+            return queries[name]
+    matches = {
+        key: sql for queries in QUERY_SETS.values() for key, sql in queries.items() if name.lower() in key.lower()
+    }
+    if len(matches) == 1:
+        return next(iter(matches.values()))
+    if not matches:
+        raise LookupError(f"No query named '{name}' (see the 'list' command)")
+    raise LookupError(f"'{name}' matches several queries: " + ", ".join(sorted(matches)))
+
+def output_format(path, file_format=None):
+    """The export format given, or the one implied by the file extension (CSV by default)"""
+    if file_format:
+        return file_format
+    return 'ndjson' if path and os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl', '.json') else 'csv'
+
+def write_rows(cursor, file, file_format):
+    """Stream a cursor's rows to a file as CSV (with a header row) or NDJSON; returns the row count"""
+    columns = [description[0] for description in cursor.description]
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in cursor:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in cursor:
+            file.write(json.dumps(dict(zip(columns, row))) + "\n")
+            count += 1
+    return count
+
+def run_sql(conn, sql, output=None, file_format=None):
+    """Run every statement of `sql`, writing the rows of the last one if it returns rows
+
+    Rows go to `output` (a path) or stdout; result sets of earlier statements
+    are discarded. Changes are committed at the end. Returns (rows written,
+    rows changed).
+    """
+    from carbon_emission_db import count_view_writes, execute_counted
+    statements = database.split_statements(sql)
+    if not statements:
+        raise ValueError("The query contains no SQL statements")
+    file_format = output_format(output, file_format)
+
+    written = changed = 0
+    file = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        cursor = conn.cursor()
+        count_view_writes(cursor)
+        for i, statement in enumerate(statements):
+            rowcount = execute_counted(cursor, statement)
+            if cursor.description is None:
+                changed += max(rowcount, 0)
+            elif i == len(statements) - 1:
+                written = write_rows(cursor, file, file_format)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if output:
+            file.close()
+    return written, changed
+
+def table_exists(conn, table):
+    """Whether a table or view of that name exists"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ? COLLATE NOCASE", (table,)
+    ).fetchone() is not None
+
+def command_list(conn, args):
+    """Print the named queries"""
+    for set_name, queries in QUERY_SETS.items():
+        print(f"{set_name}:")
+        for name in queries:
+            print(f"  {name}")
+
+def command_query(conn, args):
+    """Run a named query"""
+    report_rows(args, *run_sql(conn, find_query(args.name), args.output, args.format))
+
+def command_sql(conn, args):
+    """Run ad-hoc SQL"""
+    report_rows(args, *run_sql(conn, args.sql, args.output, args.format))
+
+def command_export(conn, args):
+    """Export every row of a table"""
+    if not table_exists(conn, args.table):
+        raise LookupError(f"No table named '{args.table}'")
+    quoted = '"' + args.table.replace('"', '""') + '"'
+    report_rows(args, *run_sql(conn, f"SELECT * FROM {quoted}", args.output, args.format))
+
+def command_import(conn, args):
+    """Bulk import a CSV or NDJSON file into a category"""
+    from bulk_import import BATCH_SIZE, import_file, format_report
+    print(format_report(import_file(
+        args.file, args.category, db_path=args.db, file_format=args.format,
+        batch_size=args.batch_size or BATCH_SIZE, rejects_path=args.rejects
+    )))
+
+def command_report(conn, args):
+    """Print (or save as JSON) one user's report summary and recommendations"""
+    from archive import connection_for
+    from report_data import fetch_report_data, recommendations
+    date_from, date_to = args.date_from or ALL_DATES[0], args.date_to or ALL_DATES[1]
+    data = fetch_report_data(connection_for(date_from, date_to), args.user_id, date_from, date_to)
+    if data['user'].empty:
+        raise LookupError(f"No user with ID {args.user_id}")
+    user = data['user'].iloc[0]
+    report = {
+        'User_ID': int(user['User_ID']),
+        'Full_Name': user['Full_Name'],
+        'date_from': date_from,
+        'date_to': date_to,
+        'summary': {key: float(value) for key, value in data['summary'].items()},
+        'recommendations': recommendations(data['summary'])
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote the report of user {args.user_id} to {args.output}", file=sys.stderr)
+        return
+
+    print(f"{report['Full_Name']} (user {report['User_ID']}), {date_from} to {date_to}")
+    for key, value in report['summary'].items():
+        print(f"  {key.replace('_', ' ').capitalize():22} {value:14.2f} kg CO2")
+    print("Recommendations:")
+    for recommendation in report['recommendations']:
+        print(f"  - {recommendation}")
+
+def command_reports(conn, args):
+    """Write every user's report summary and recommendations to CSV or JSON"""
+    from batch_reports import generate_batch_reports, write_reports
+    reports = generate_batch_reports(args.db, args.date_from, args.date_to)
+    write_reports(reports, args.output, args.format)
+    print(f"Wrote {len(reports):,} reports to {args.output}", file=sys.stderr)
+
+def report_rows(args, written, changed):
+    """Note the rows written or changed on stderr, so stdout only holds the data"""
+    if args.output:
+        print(f"Wrote {written:,} rows to {args.output}", file=sys.stderr)
+    elif changed:
+        print(f"{changed:,} rows changed", file=sys.stderr)
+
+def build_parser():
+    """The argument parser with one subcommand per command_* function"""
+    parser = argparse.ArgumentParser(
+        description="Run queries, reports, imports and exports without the GUI"
+    )
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("list", help="list the named queries")
+    command.set_defaults(run=command_list)
+
+    for name, run, target, target_help in [
+        ("query", command_query, "name", "query name from updated_queries.py or predefined_queries.py "
+                                          "(or a unique part of it)"),
+        ("sql", command_sql, "sql", "SQL to run; several statements may be separated by ';'"),
+        ("export", command_export, "table", "table or view to export")
+    ]:
+        command = commands.add_parser(name, help=run.__doc__[0].lower() + run.__doc__[1:])
+        command.add_argument(target, help=target_help)
+        command.add_argument("-o", "--output", help="file to write (default: stdout)")
+        command.add_argument("--format", choices=EXPORT_FORMATS, help="output format (default: from the extension, else csv)")
+        command.add_argument("--archive", action="store_true", help="include the rows moved to archive files by archive.py")
+        command.set_defaults(run=run)
+
+    command = commands.add_parser("import", help="bulk import a CSV or NDJSON file")
+    command.add_argument("file", help="CSV file with a header row, or NDJSON file with one object per line")
+    command.add_argument("--category", required=True, help="category or table name, e.g. Transportation")
+    command.add_argument("--format", choices=EXPORT_FORMATS, help="file format (default: from the extension)")
+    command.add_argument("--batch-size", type=int, help="rows per transaction (default: bulk_import.BATCH_SIZE)")
+    command.add_argument("--rejects", help="write rejected rows to this CSV file")
+    command.set_defaults(run=command_import)
+
+    command = commands.add_parser("report", help="show one user's report summary and recommendations")
+    command.add_argument("user_id", type=int, help="user ID")
+    command.add_argument("-o", "--output", help="write the report to this JSON file")
+    command.set_defaults(run=command_report)
+
+    command = commands.add_parser("reports", help="write every user's report summary to CSV or JSON")
+    command.add_argument("output", help="CSV or JSON file to write")
+    command.add_argument("--format", choices=['csv', 'json'], help="output format (default: from the extension)")
+    command.set_defaults(run=command_reports)
+
+    for command in (commands.choices["report"], commands.choices["reports"]):
+        command.add_argument("--from", dest="date_from", help="first report date (default: all dates)")
+        command.add_argument("--to", dest="date_to", help="last report date (default: all dates)")
+    return parser
+
+def main(argv=None):
+    """Run one command; returns the exit status"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.db:
+        database.set_database_path(args.db)
+    if not os.path.exists(database.get_database_path()):
+        parser.error(f"{database.get_database_path()} does not exist; create it with carbon_emission_db.py")
+
+    # SQL given on the command line may call emission() and emission_factor()
+    if args.command in ('query', 'sql', 'export'):
+        from emission_engine import register_functions
+        database.on_connect(register_functions)
+
+    try:
+        conn = database.get_connection()
+        if getattr(args, 'archive', False):
+            from archive import connection_for
+            conn = connection_for()
+        args.run(conn, args)
+    except (LookupError, ValueError, OSError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
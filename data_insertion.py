@@ -1,7 +1,11 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
+from tkinter import ttk, messagebox, filedialog
+import threading
+import queue
+import database
 from datetime import datetime
+from validation import CATEGORIES, VOCABULARIES, ValidationError, validate_record, insert_sql
+from bulk_import import import_file, format_report
 
 class DataInsertionFrame(ttk.Frame):
     def __init__(self, parent):
@@ -34,6 +38,27 @@ class DataInsertionFrame(ttk.Frame):
         self.category_combo.pack(padx=10, pady=5)
         self.category_combo.bind("<<ComboboxSelected>>", self.on_category_select)
         
+        # Bulk import of a CSV/NDJSON file into the selected category
+        import_frame = ttk.Frame(category_frame)
+        import_frame.pack(padx=10, pady=(0, 5))
+        
+        self.import_button = ttk.Button(import_frame, text="Import File...", command=self.import_data_file)
+        self.import_button.pack(side=tk.LEFT)
+        
+        # Batch mode stages validated rows in a pending list instead of
+        # writing them one by one
+        self.batch_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            import_frame, 
+            text="Batch mode", 
+            variable=self.batch_mode, 
+            command=self.update_batch_view
+        ).pack(side=tk.LEFT, padx=10)
+        
+        self.import_status = ttk.Label(import_frame, text="")
+        self.import_status.pack(side=tk.LEFT, padx=10)
+        self.import_results = queue.Queue()
+        
         # Form frame (will be populated dynamically)
         self.form_frame = ttk.LabelFrame(self, text="Data Entry Form")
         self.form_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -48,6 +73,12 @@ class DataInsertionFrame(ttk.Frame):
         
         # Form elements will be created dynamically based on selected category
         self.form_elements = {}
+        self.submit_button = None
+        
+        # Pending rows of batch mode, per category: dicts with the validated
+        # record and the error of its last failed commit, if any
+        self.pending = {category: [] for category in categories}
+        self.create_pending_frame()
         
     def on_category_select(self, event=None):
         # Clear the form frame
@@ -56,6 +87,7 @@ class DataInsertionFrame(ttk.Frame):
         
         # Reset form elements dictionary
         self.form_elements = {}
+        self.submit_button = None
         
         # Get selected category
         category = self.category_var.get()
@@ -73,6 +105,8 @@ class DataInsertionFrame(ttk.Frame):
             self.create_industrial_form()
         elif category == "Carbon Offset":
             self.create_offset_form()
+        
+        self.update_batch_view()
     
     def create_user_form(self):
         # Create form for User Profile
@@ -91,8 +125,8 @@ class DataInsertionFrame(ttk.Frame):
         location_entry.grid(row=2, column=1, padx=5, pady=5)
         self.form_elements["Location"] = location_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_user_data)
-        submit_btn.grid(row=3, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_user_data)
+        self.submit_button.grid(row=3, column=0, columnspan=2, pady=10)
     
     def create_transportation_form(self):
         # Get user IDs for dropdown
@@ -104,7 +138,7 @@ class DataInsertionFrame(ttk.Frame):
         self.form_elements["User_ID"] = user_combo
         
         ttk.Label(self.form_frame, text="Vehicle Type:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        vehicle_types = ["Car", "Bus", "Train", "Airplane", "Bicycle", "Electric Car", "Motorcycle", "Walking"]
+        vehicle_types = VOCABULARIES['Vehicle_Type']
         vehicle_combo = ttk.Combobox(self.form_frame, values=vehicle_types, width=28)
         vehicle_combo.grid(row=1, column=1, padx=5, pady=5)
         self.form_elements["Vehicle_Type"] = vehicle_combo
@@ -120,8 +154,8 @@ class DataInsertionFrame(ttk.Frame):
         date_entry.grid(row=3, column=1, padx=5, pady=5)
         self.form_elements["Date"] = date_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_transportation_data)
-        submit_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_transportation_data)
+        self.submit_button.grid(row=4, column=0, columnspan=2, pady=10)
     
     def create_energy_form(self):
         # Get user IDs for dropdown
@@ -133,7 +167,7 @@ class DataInsertionFrame(ttk.Frame):
         self.form_elements["User_ID"] = user_combo
         
         ttk.Label(self.form_frame, text="Energy Source:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        energy_sources = ["Electricity", "Natural Gas", "Solar", "Wind", "Coal", "Biomass", "Geothermal"]
+        energy_sources = VOCABULARIES['Energy_Source']
         energy_combo = ttk.Combobox(self.form_frame, values=energy_sources, width=28)
         energy_combo.grid(row=1, column=1, padx=5, pady=5)
         self.form_elements["Energy_Source"] = energy_combo
@@ -149,8 +183,8 @@ class DataInsertionFrame(ttk.Frame):
         date_entry.grid(row=3, column=1, padx=5, pady=5)
         self.form_elements["Date"] = date_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_energy_data)
-        submit_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_energy_data)
+        self.submit_button.grid(row=4, column=0, columnspan=2, pady=10)
     
     def create_waste_form(self):
         # Get user IDs for dropdown
@@ -162,7 +196,7 @@ class DataInsertionFrame(ttk.Frame):
         self.form_elements["User_ID"] = user_combo
         
         ttk.Label(self.form_frame, text="Waste Type:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        waste_types = ["Plastic", "Paper", "Glass", "Metal", "Organic", "Electronic", "Hazardous"]
+        waste_types = VOCABULARIES['Waste_Type']
         waste_combo = ttk.Combobox(self.form_frame, values=waste_types, width=28)
         waste_combo.grid(row=1, column=1, padx=5, pady=5)
         self.form_elements["Waste_Type"] = waste_combo
@@ -178,8 +212,8 @@ class DataInsertionFrame(ttk.Frame):
         date_entry.grid(row=3, column=1, padx=5, pady=5)
         self.form_elements["Date"] = date_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_waste_data)
-        submit_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_waste_data)
+        self.submit_button.grid(row=4, column=0, columnspan=2, pady=10)
     
     def create_industrial_form(self):
         # Get user IDs for dropdown
@@ -191,8 +225,7 @@ class DataInsertionFrame(ttk.Frame):
         self.form_elements["User_ID"] = user_combo
         
         ttk.Label(self.form_frame, text="Activity Type:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        activity_types = ["Manufacturing", "Construction", "Chemical Processing", "Food Processing", 
-                         "Textile Production", "Mining", "Agriculture"]
+        activity_types = VOCABULARIES['Activity_Type']
         activity_combo = ttk.Combobox(self.form_frame, values=activity_types, width=28)
         activity_combo.grid(row=1, column=1, padx=5, pady=5)
         self.form_elements["Activity_Type"] = activity_combo
@@ -208,8 +241,8 @@ class DataInsertionFrame(ttk.Frame):
         date_entry.grid(row=3, column=1, padx=5, pady=5)
         self.form_elements["Date"] = date_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_industrial_data)
-        submit_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_industrial_data)
+        self.submit_button.grid(row=4, column=0, columnspan=2, pady=10)
     
     def create_offset_form(self):
         # Get user IDs for dropdown
@@ -221,8 +254,7 @@ class DataInsertionFrame(ttk.Frame):
         self.form_elements["User_ID"] = user_combo
         
         ttk.Label(self.form_frame, text="Offset Type:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        offset_types = ["Tree Planting", "Renewable Energy Credits", "Methane Capture", 
-                        "Carbon Sequestration", "Energy Efficiency"]
+        offset_types = VOCABULARIES['Offset_Type']
         offset_combo = ttk.Combobox(self.form_frame, values=offset_types, width=28)
         offset_combo.grid(row=1, column=1, padx=5, pady=5)
         self.form_elements["Offset_Type"] = offset_combo
@@ -238,17 +270,135 @@ class DataInsertionFrame(ttk.Frame):
         date_entry.grid(row=3, column=1, padx=5, pady=5)
         self.form_elements["Date"] = date_entry
         
-        submit_btn = ttk.Button(self.form_frame, text="Submit", command=self.insert_offset_data)
-        submit_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.submit_button = ttk.Button(self.form_frame, text="Submit", command=self.insert_offset_data)
+        self.submit_button.grid(row=4, column=0, columnspan=2, pady=10)
+    
+    def create_pending_frame(self):
+        """Create the pending rows list of batch mode (only shown in batch mode)"""
+        self.pending_frame = ttk.LabelFrame(self, text="Pending Rows")
+        
+        tree_frame = ttk.Frame(self.pending_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.pending_tree = ttk.Treeview(tree_frame, show="headings", height=6, yscrollcommand=vsb.set)
+        vsb.config(command=self.pending_tree.yview)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.pending_tree.pack(fill=tk.BOTH, expand=True)
+        self.pending_tree.bind("<Double-1>", self.edit_pending_row)
+        
+        button_frame = ttk.Frame(self.pending_frame)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Button(button_frame, text="Commit Batch", command=self.commit_batch).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Edit Selected", command=self.edit_pending_row).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Remove Selected", command=self.remove_pending_rows).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Clear", command=self.clear_pending).pack(side=tk.LEFT, padx=5)
+        
+        self.batch_status = ttk.Label(button_frame, text="")
+        self.batch_status.pack(side=tk.LEFT, padx=10)
+    
+    def update_batch_view(self):
+        """Show or hide the pending list and relabel the Submit button"""
+        batch = self.batch_mode.get()
+        if self.submit_button is not None:
+            self.submit_button.config(text="Add to Batch" if batch else "Submit")
+        
+        if batch:
+            self.pending_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+            self.refresh_pending()
+        else:
+            self.pending_frame.pack_forget()
+    
+    def refresh_pending(self):
+        """Show the pending rows of the selected category"""
+        category = self.category_var.get()
+        columns = (CATEGORIES[category]['columns'] if category else []) + ["Status"]
+        
+        self.pending_tree.delete(*self.pending_tree.get_children())
+        self.pending_tree["columns"] = columns
+        for col in columns:
+            self.pending_tree.column(col, anchor=tk.W, width=120)
+            self.pending_tree.heading(col, text=col, anchor=tk.W)
+        
+        rows = self.pending.get(category, [])
+        for i, row in enumerate(rows):
+            self.pending_tree.insert("", tk.END, iid=str(i), values=list(row['record']) + [row['error'] or "Pending"])
+        
+        failed = sum(1 for row in rows if row['error'])
+        self.batch_status.config(text=f"{len(rows)} rows pending" + (f", {failed} failed" if failed else ""))
+    
+    def edit_pending_row(self, event=None):
+        """Move the selected pending row back into the form for editing"""
+        selection = self.pending_tree.selection()
+        if not selection:
+            return
+        
+        category = self.category_var.get()
+        row = self.pending[category].pop(int(selection[0]))
+        for column, value in zip(CATEGORIES[category]['columns'], row['record']):
+            widget = self.form_elements[column]
+            if column == "User_ID":
+                # The user dropdown shows "id - name"
+                matches = [v for v in widget["values"] if str(v).startswith(f"{value} - ")]
+                widget.set(matches[0] if matches else value)
+            else:
+                widget.delete(0, tk.END)
+                widget.insert(0, value)
+        self.refresh_pending()
+    
+    def remove_pending_rows(self):
+        """Drop the selected rows from the pending list"""
+        category = self.category_var.get()
+        for iid in sorted(self.pending_tree.selection(), key=int, reverse=True):
+            del self.pending[category][int(iid)]
+        self.refresh_pending()
+    
+    def clear_pending(self):
+        """Drop every pending row of the selected category"""
+        self.pending[self.category_var.get()] = []
+        self.refresh_pending()
+    
+    def commit_batch(self):
+        """Write the pending rows with one executemany in a single transaction"""
+        category = self.category_var.get()
+        rows = self.pending.get(category)
+        if not rows:
+            self.batch_status.config(text="No pending rows to commit")
+            return
+        
+        try:
+            conn = database.get_connection()
+            failures = dict(database.insert_rows(conn, insert_sql(category), [row['record'] for row in rows]))
+            if len(failures) < len(rows):
+                database.record_statement_writes(insert_sql(category), user_ids=self.written_users(
+                    category, [row['record'] for i, row in enumerate(rows) if i not in failures]
+                ))
+        except Exception as e:
+            self.batch_status.config(text=f"Commit failed: {str(e)}")
+            return
+        
+        # Rows that failed stay in the list with their error; the rest are committed
+        self.pending[category] = [dict(row, error=failures[i]) for i, row in enumerate(rows) if i in failures]
+        self.refresh_pending()
+        message = f"Committed {len(rows) - len(failures)} rows"
+        if failures:
+            message += f", {len(failures)} failed (kept in the list)"
+        self.batch_status.config(text=message)
+    
+    def written_users(self, category, records):
+        """The users whose rows a category's records write (None if the records have no User_ID)"""
+        columns = CATEGORIES[category]['columns']
+        if 'User_ID' not in columns:
+            return None
+        position = columns.index('User_ID')
+        return {record[position] for record in records}
     
     def get_user_ids(self):
         """Get user IDs and names for dropdown"""
         try:
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT User_ID, Full_Name FROM User_Profile")
-            users = cursor.fetchall()
-            conn.close()
+            conn = database.get_connection()
+            users = conn.execute("SELECT User_ID, Full_Name FROM User_Profile").fetchall()
             return [f"{user[0]} - {user[1]}" for user in users]
         except Exception as e:
             messagebox.showerror("Database Error", f"Error fetching users: {str(e)}")
@@ -263,251 +413,134 @@ class DataInsertionFrame(ttk.Frame):
         except:
             return None
     
-    def insert_user_data(self):
-        """Insert new user into database"""
+    def import_data_file(self):
+        """Bulk import a CSV or NDJSON file into the selected category"""
+        category = self.category_var.get()
+        if not category:
+            messagebox.showwarning("Import", "Please select a category to import into")
+            return
+        
+        path = filedialog.askopenfilename(
+            title=f"Import {category} Data",
+            filetypes=[("CSV files", "*.csv"), ("NDJSON files", "*.ndjson *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        # The import runs on a worker thread with its own connection; progress
+        # comes back through import_results
+        self.import_button.config(state=tk.DISABLED)
+        self.import_status.config(text=f"Importing {category}...")
+        threading.Thread(target=self.run_import, args=(path, category), daemon=True).start()
+        self.after(100, self.poll_import)
+    
+    def run_import(self, path, category):
+        """Worker thread: import the file and report back to the GUI"""
         try:
-            # Validate form
-            full_name = self.form_elements["Full_Name"].get().strip()
-            email = self.form_elements["Email"].get().strip()
-            location = self.form_elements["Location"].get().strip()
-            
-            if not full_name or not email or not location:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
-                return
-            
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO User_Profile (Full_Name, Email, Location) VALUES (?, ?, ?)", 
-                (full_name, email, location)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "User data added successfully")
-            
-            # Clear form
-            for entry in self.form_elements.values():
-                entry.delete(0, tk.END)
-                
+            report = import_file(path, category, progress=lambda r: self.import_results.put(('progress', r)))
+            self.import_results.put(('done', report))
         except Exception as e:
-            messagebox.showerror("Error", f"Error inserting data: {str(e)}")
+            self.import_results.put(('error', str(e)))
+        finally:
+            database.close_connection()
     
-    def insert_transportation_data(self):
-        """Insert transportation data into database"""
-        try:
-            # Validate form
-            user_string = self.form_elements["User_ID"].get()
-            user_id = self.extract_user_id(user_string)
-            
-            vehicle_type = self.form_elements["Vehicle_Type"].get().strip()
-            distance_str = self.form_elements["Distance_KM"].get().strip()
-            date = self.form_elements["Date"].get().strip()
-            
-            if not user_id or not vehicle_type or not distance_str or not date:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
-                return
-            
+    def poll_import(self):
+        """Show import progress, and the summary once it has finished"""
+        while True:
             try:
-                distance = float(distance_str)
-            except ValueError:
-                messagebox.showwarning("Validation Error", "Distance must be a number")
+                kind, result = self.import_results.get_nowait()
+            except queue.Empty:
+                self.after(100, self.poll_import)
                 return
             
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO Transportation (User_ID, Vehicle_Type, Distance_KM, Date) VALUES (?, ?, ?, ?)", 
-                (user_id, vehicle_type, distance, date)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "Transportation data added successfully")
-            
-            # Clear form (except user and date)
-            self.form_elements["Vehicle_Type"].delete(0, tk.END)
-            self.form_elements["Distance_KM"].delete(0, tk.END)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error inserting data: {str(e)}")
+            if kind == 'progress':
+                self.import_status.config(
+                    text=f"{result['rows_inserted']:,} rows imported ({result['rows_per_sec']:,.0f} rows/sec)"
+                )
+                continue
+            
+            self.import_button.config(state=tk.NORMAL)
+            if kind == 'error':
+                self.import_status.config(text="Import failed")
+                messagebox.showerror("Import Error", f"Error importing file: {result}")
+            else:
+                self.import_status.config(text=f"{result['rows_inserted']:,} rows imported")
+                messagebox.showinfo("Import Complete", format_report(result))
+                # Reload the form so new users appear in the user lists
+                self.on_category_select()
+            return
     
-    def insert_energy_data(self):
-        """Insert energy consumption data into database"""
+    def get_form_record(self, category):
+        """Validate the form fields of a category; return the record, or None after a warning"""
+        values = []
+        for column in CATEGORIES[category]['columns']:
+            value = self.form_elements[column].get()
+            if column == "User_ID":
+                value = self.extract_user_id(value)
+            values.append(value)
+        
+        try:
+            return validate_record(category, values)
+        except ValidationError as e:
+            # Batch mode reports problems inline rather than with a dialog
+            if self.batch_mode.get():
+                self.batch_status.config(text=f"Not added: {str(e)}")
+            else:
+                messagebox.showwarning("Validation Error", str(e))
+            return None
+    
+    def save_record(self, category, success_message):
+        """Insert the form's record, or stage it in the pending list in batch mode"""
         try:
             # Validate form
-            user_string = self.form_elements["User_ID"].get()
-            user_id = self.extract_user_id(user_string)
-            
-            energy_source = self.form_elements["Energy_Source"].get().strip()
-            consumption_str = self.form_elements["Consumption_KWH"].get().strip()
-            date = self.form_elements["Date"].get().strip()
-            
-            if not user_id or not energy_source or not consumption_str or not date:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
+            record = self.get_form_record(category)
+            if record is None:
                 return
             
-            try:
-                consumption = float(consumption_str)
-            except ValueError:
-                messagebox.showwarning("Validation Error", "Consumption must be a number")
-                return
-            
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO Energy_Consumption (User_ID, Energy_Source, Consumption_KWH, Date) VALUES (?, ?, ?, ?)", 
-                (user_id, energy_source, consumption, date)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "Energy consumption data added successfully")
+            if self.batch_mode.get():
+                self.pending[category].append({'record': record, 'error': None})
+                self.refresh_pending()
+            else:
+                # Insert data
+                conn = database.get_connection()
+                with conn:
+                    cursor = conn.execute(insert_sql(category), record)
+                
+                # A new profile's user is the new row itself
+                user_ids = self.written_users(category, [record])
+                database.record_statement_writes(insert_sql(category), user_ids=user_ids or [cursor.lastrowid])
+                
+                # Show success message
+                messagebox.showinfo("Success", success_message)
             
             # Clear form (except user and date)
-            self.form_elements["Energy_Source"].delete(0, tk.END)
-            self.form_elements["Consumption_KWH"].delete(0, tk.END)
+            for column, widget in self.form_elements.items():
+                if column not in ("User_ID", "Date"):
+                    widget.delete(0, tk.END)
                 
         except Exception as e:
             messagebox.showerror("Error", f"Error inserting data: {str(e)}")
     
+    def insert_user_data(self):
+        """Insert new user into database"""
+        self.save_record("User Profile", "User data added successfully")
+    
+    def insert_transportation_data(self):
+        """Insert transportation data into database"""
+        self.save_record("Transportation", "Transportation data added successfully")
+    
+    def insert_energy_data(self):
+        """Insert energy consumption data into database"""
+        self.save_record("Energy Consumption", "Energy consumption data added successfully")
+    
     def insert_waste_data(self):
         """Insert waste management data into database"""
-        try:
-            # Validate form
-            user_string = self.form_elements["User_ID"].get()
-            user_id = self.extract_user_id(user_string)
-            
-            waste_type = self.form_elements["Waste_Type"].get().strip()
-            weight_str = self.form_elements["Waste_Weight_KG"].get().strip()
-            date = self.form_elements["Date"].get().strip()
-            
-            if not user_id or not waste_type or not weight_str or not date:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
-                return
-            
-            try:
-                weight = float(weight_str)
-            except ValueError:
-                messagebox.showwarning("Validation Error", "Weight must be a number")
-                return
-            
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO Waste_Management (User_ID, Waste_Type, Waste_Weight_KG, Date) VALUES (?, ?, ?, ?)", 
-                (user_id, waste_type, weight, date)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "Waste management data added successfully")
-            
-            # Clear form (except user and date)
-            self.form_elements["Waste_Type"].delete(0, tk.END)
-            self.form_elements["Waste_Weight_KG"].delete(0, tk.END)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error inserting data: {str(e)}")
+        self.save_record("Waste Management", "Waste management data added successfully")
     
     def insert_industrial_data(self):
         """Insert industrial activity data into database"""
-        try:
-            # Validate form
-            user_string = self.form_elements["User_ID"].get()
-            user_id = self.extract_user_id(user_string)
-            
-            activity_type = self.form_elements["Activity_Type"].get().strip()
-            emission_str = self.form_elements["Emission_Produced"].get().strip()
-            date = self.form_elements["Date"].get().strip()
-            
-            if not user_id or not activity_type or not emission_str or not date:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
-                return
-            
-            try:
-                emission = float(emission_str)
-            except ValueError:
-                messagebox.showwarning("Validation Error", "Emission must be a number")
-                return
-            
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO Industrial_Activity (User_ID, Activity_Type, Emission_Produced, Date) VALUES (?, ?, ?, ?)", 
-                (user_id, activity_type, emission, date)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "Industrial activity data added successfully")
-            
-            # Clear form (except user and date)
-            self.form_elements["Activity_Type"].delete(0, tk.END)
-            self.form_elements["Emission_Produced"].delete(0, tk.END)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error inserting data: {str(e)}")
+        self.save_record("Industrial Activity", "Industrial activity data added successfully")
     
     def insert_offset_data(self):
         """Insert carbon offset data into database"""
-        try:
-            # Validate form
-            user_string = self.form_elements["User_ID"].get()
-            user_id = self.extract_user_id(user_string)
-            
-            offset_type = self.form_elements["Offset_Type"].get().strip()
-            amount_str = self.form_elements["Offset_Amount"].get().strip()
-            date = self.form_elements["Date"].get().strip()
-            
-            if not user_id or not offset_type or not amount_str or not date:
-                messagebox.showwarning("Validation Error", "Please fill in all fields")
-                return
-            
-            try:
-                amount = float(amount_str)
-            except ValueError:
-                messagebox.showwarning("Validation Error", "Offset amount must be a number")
-                return
-            
-            # Insert data
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO Carbon_Offset (User_ID, Offset_Type, Offset_Amount, Date) VALUES (?, ?, ?, ?)", 
-                (user_id, offset_type, amount, date)
-            )
-            
-            conn.commit()
-            conn.close()
-            
-            # Show success message
-            messagebox.showinfo("Success", "Carbon offset data added successfully")
-            
-            # Clear form (except user and date)
-            self.form_elements["Offset_Type"].delete(0, tk.END)
-            self.form_elements["Offset_Amount"].delete(0, tk.END)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error inserting data: {str(e)}") 
\ No newline at end of file
+        self.save_record("Carbon Offset", "Carbon offset data added successfully") 
\ No newline at end of file
@@ -0,0 +1,264 @@
+import sqlite3
+import os
+import threading
+
+# Database file used when no path is passed explicitly. It can be changed with
+# the CARBON_EMISSION_DB environment variable or set_database_path().
+DEFAULT_DB_FILE = 'carbon_emission.db'
+_db_path = os.environ.get('CARBON_EMISSION_DB', DEFAULT_DB_FILE)
+
+# Pragmas applied to every connection:
+# - WAL lets the GUI read while another connection writes. The price is that
+#   a statement left open keeps its read snapshot: a checkpoint cannot move
+#   past it, so the -wal file grows with every commit until it is closed.
+#   Long-lived cursors must be closed when idle (QueryRunner closes its
+#   result stream after STREAM_IDLE_SECONDS and re-reads later pages).
+# - synchronous=NORMAL is safe with WAL and avoids an fsync per commit
+# - cache_size (negative = KiB) and mmap_size keep hot pages in memory
+# - busy_timeout waits for a competing writer instead of failing immediately
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY'
+}
+
+# Number of prepared statements each connection keeps compiled
+STATEMENT_CACHE_SIZE = 256
+
+# Functions called as hook(conn, db_path) on every connection opened after they
+# were added with on_connect(), e.g. to register SQL functions. This module
+# knows nothing of them: the modules running user-written SQL add
+# emission_engine.register_functions.
+_connect_hooks = []
+
+# One pooled connection per (thread, database file, name). _pooled maps id(conn) to
+# (path, conn) for every live pooled connection so close_all() can reach the
+# connections of other threads, which then reconnect on their next use.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pooled = {}
+
+# Per database file: an uncached connection used to see which tables a
+# statement reads and writes (the authorizer only runs when a statement is
+# compiled, so a statement cache would hide repeated statements from it)
+_probes = {}
+
+# In-process write counters per database file: table name (lower-cased) ->
+# number of writes recorded. '*' counts writes that may touch any table, such
+# as schema changes, and ('user', id) counts writes to a user's rows, with
+# ('user', None) for writes whose users are not known. Caches compare these
+# to know whether a result is stale.
+_write_lock = threading.Lock()
+_write_counts = {}
+
+# Number of writes recorded to any database file: cheap enough to poll per row
+# (without the lock) to notice that something may have changed
+write_generation = 0
+
+def split_statements(sql):
+    """Split a block of SQL into individual statements, dropping whole-line comments"""
+    statements = []
+    buffer = ''
+    chunks = sql.split(';')
+    for i, chunk in enumerate(chunks):
+        buffer += chunk
+        # A ';' inside a string literal or trigger body does not end the statement
+        if i < len(chunks) - 1 and not sqlite3.complete_statement(buffer + ';'):
+            buffer += ';'
+            continue
+        code_lines = [line for line in buffer.splitlines() if line.strip() and not line.strip().startswith('--')]
+        if code_lines:
+            statements.append('\n'.join(code_lines))
+        buffer = ''
+    return statements
+
+def get_database_path():
+    """Get the path of the default database file"""
+    return _db_path
+
+def set_database_path(path):
+    """Change the default database file, closing connections to the old one"""
+    global _db_path
+    close_all()
+    _db_path = path
+
+def _resolve(db_path):
+    """Normalise a database path so each file gets one pool entry"""
+    path = db_path or _db_path
+    return path if path == ':memory:' else os.path.abspath(path)
+
+def database_file(db_path=None):
+    """Absolute path of a database file (the default one if db_path is None)"""
+    return _resolve(db_path)
+
+def connect(db_path=None, cached_statements=STATEMENT_CACHE_SIZE):
+    """Open a new, unpooled connection with the standard pragmas and the on_connect() hooks"""
+    conn = sqlite3.connect(
+        _resolve(db_path),
+        cached_statements=cached_statements,
+        check_same_thread=False
+    )
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    for hook in _connect_hooks:
+        hook(conn, db_path)
+    return conn
+
+def on_connect(hook):
+    """Call hook(conn, db_path) on every connection opened from now on (once, however often added)"""
+    if hook not in _connect_hooks:
+        _connect_hooks.append(hook)
+
+def get_connection(db_path=None, name=None):
+    """Get this thread's pooled connection to the database
+
+    The connection stays open for the life of the thread, so callers must not
+    close it. Use `with conn:` around writes to commit or roll back. A `name`
+    gives a second connection to the same file, for state that must not leak
+    into the default one (archive.py's attached files and TEMP views).
+    """
+    path = _resolve(db_path)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    key = path if name is None else (path, name)
+    conn = connections.get(key)
+    if conn is None or id(conn) not in _pooled:
+        conn = connect(path)
+        connections[key] = conn
+        with _pool_lock:
+            _pooled[id(conn)] = (path, conn)
+    return conn
+
+def statement_access(sql, db_path=None):
+    """The tables a statement reads and writes, without running it
+
+    The statement is compiled under EXPLAIN with an authorizer that records
+    every table read or written, including reads through views and writes
+    made by triggers. Returns a dict with reads and writes (sets of table
+    names), schema (True if the statement changes the schema) and functions
+    (the SQL functions it calls, lower-cased). Raises sqlite3.Error if the
+    statement does not compile.
+    """
+    access = {'reads': set(), 'writes': set(), 'schema': False, 'functions': set()}
+
+    def authorizer(action, arg1, arg2, db_name, trigger):
+        if action == sqlite3.SQLITE_READ:
+            access['reads'].add(arg1)
+        elif action in (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE):
+            # sqlite_master / sqlite_temp_master writes come with schema changes
+            if not arg1.startswith('sqlite_'):
+                access['writes'].add(arg1)
+        elif action == sqlite3.SQLITE_FUNCTION:
+            access['functions'].add(arg2.lower())
+        elif action not in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_RECURSIVE, sqlite3.SQLITE_TRANSACTION,
+                            sqlite3.SQLITE_SAVEPOINT, sqlite3.SQLITE_PRAGMA, sqlite3.SQLITE_ANALYZE):
+            access['schema'] = True
+        return sqlite3.SQLITE_OK
+
+    path = _resolve(db_path)
+    with _pool_lock:
+        probe = _probes.get(path)
+        if probe is None or id(probe) not in _pooled:
+            probe = _probes[path] = connect(path, cached_statements=0)
+            _pooled[id(probe)] = (path, probe)
+        probe.set_authorizer(authorizer)
+        try:
+            probe.execute("EXPLAIN " + sql).fetchone()
+        except sqlite3.ProgrammingError:
+            # Parameters are not bound; the statement has been compiled by then
+            pass
+        finally:
+            probe.set_authorizer(None)
+    return access
+
+def record_writes(tables, db_path=None, user_ids=None):
+    """Count a committed write to each of the tables (None: possibly to any table)
+
+    user_ids are the users whose rows were written, when the writer knows
+    them; None means the write may concern any user.
+    """
+    global write_generation
+    path = _resolve(db_path)
+    with _write_lock:
+        write_generation += 1
+        counts = _write_counts.setdefault(path, {})
+        if tables is None:
+            keys = ['*', ('user', None)]
+        elif not tables:
+            keys = []
+        else:
+            keys = [table.lower() for table in tables]
+            keys += [('user', None)] if user_ids is None else [('user', user_id) for user_id in set(user_ids)]
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+
+def record_statement_writes(sql, db_path=None, user_ids=None):
+    """Record a committed write by a statement, to every table it (or its triggers) writes"""
+    try:
+        access = statement_access(sql, db_path)
+    except sqlite3.Error:
+        access = {'writes': None, 'schema': True}
+    record_writes(None if access['schema'] else access['writes'], db_path, user_ids)
+
+def write_versions(tables, db_path=None):
+    """The write counters of the tables, plus the any-table counter, as a tuple"""
+    with _write_lock:
+        counts = _write_counts.get(_resolve(db_path), {})
+        return tuple(counts.get(table.lower(), 0) for table in ['*'] + sorted(tables))
+
+def user_write_versions(user_id, db_path=None):
+    """The write counters that concern one user's rows, as a tuple"""
+    with _write_lock:
+        counts = _write_counts.get(_resolve(db_path), {})
+        return tuple(counts.get(key, 0) for key in ('*', ('user', None), ('user', user_id)))
+
+def insert_rows(conn, sql, rows):
+    """Insert rows with one executemany in a single transaction
+
+    If the batch fails it is retried row by row in the same transaction, each
+    row inside its own savepoint, so one bad row does not roll back the good
+    ones. Returns (index, error message) for every row that failed.
+    """
+    try:
+        with conn:
+            conn.executemany(sql, rows)
+        return []
+    except sqlite3.Error:
+        pass
+
+    failures = []
+    with conn:
+        conn.execute("BEGIN")
+        for i, row in enumerate(rows):
+            conn.execute("SAVEPOINT insert_row")
+            try:
+                conn.execute(sql, row)
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO insert_row")
+                failures.append((i, str(e)))
+            conn.execute("RELEASE insert_row")
+    return failures
+
+def close_connection(db_path=None):
+    """Close this thread's pooled connection (e.g. when a worker thread exits)"""
+    path = _resolve(db_path)
+    conn = getattr(_local, 'connections', {}).pop(path, None)
+    if conn is not None:
+        with _pool_lock:
+            _pooled.pop(id(conn), None)
+        conn.close()
+
+def close_all(db_path=None):
+    """Close every pooled connection (to one database file, or to all of them)"""
+    path = _resolve(db_path) if db_path else None
+    with _pool_lock:
+        closing = [key for key, (p, _) in _pooled.items() if path is None or p == path]
+        connections = [_pooled.pop(key)[1] for key in closing]
+
+    for conn in connections:
+        conn.close()
@@ -0,0 +1,87 @@
+import tkinter as tk
+from tkinter import ttk
+from result_grid import ResultGrid
+
+# Wait after the last keystroke in the filter box before filtering, in ms
+FILTER_DELAY_MS = 300
+
+class DetailsTable(ttk.Frame):
+    """One category's rows in the report's Details tab
+
+    A filter box above a ResultGrid whose headings sort the table (a second
+    click reverses the order). The rows come from a report_data.DetailsSource
+    and are inserted a page at a time as the user scrolls, so a category with
+    years of hourly readings costs no more to show than one with a dozen rows.
+    """
+
+    def __init__(self, parent, source):
+        super().__init__(parent)
+        self.source = source
+        self.filter_job = None
+
+        # Filter box and row count
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter (type or date):").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter_change)
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=25).pack(side=tk.LEFT, padx=5)
+        self.count_label = ttk.Label(filter_frame, text="")
+        self.count_label.pack(side=tk.RIGHT)
+
+        self.grid = ResultGrid(self, request_rows=self.request_rows)
+        self.grid.pack(fill=tk.BOTH, expand=True)
+        self.show()
+
+    def show(self):
+        """Show the first page of the rows in the source's current order"""
+        source, grid = self.source, self.grid
+        rows = source.page(0, grid.page_size)
+        grid.show(source.columns, rows, len(rows) >= source.count)
+        grid.set_total(source.count)
+
+        # Set column headings and formats
+        for col in source.columns:
+            text = col.replace('_', ' ')
+            if col == source.sort:
+                text += " ▼" if source.descending else " ▲"
+            grid.tree.heading(col, text=text, command=lambda col=col: self.sort_by(col))
+
+            # Adjust column width based on content
+            if 'Date' in col:
+                grid.tree.column(col, width=100, anchor='center')
+            elif 'ID' in col:
+                grid.tree.column(col, width=80, anchor='center')
+            elif any(x in col for x in ['Amount', 'KWH', 'KM', 'KG']):
+                grid.tree.column(col, width=120, anchor='e')
+            else:
+                grid.tree.column(col, width=150, anchor='w')
+
+        self.count_label.config(text=f"{source.count:,} of {len(source.frame):,} rows")
+
+    def request_rows(self, offset, limit):
+        """ResultGrid callback: hand it the next page once the scroll event is done"""
+        def add_page():
+            # The report may have been replaced in the meantime
+            if not self.winfo_exists():
+                return
+            self.grid.add_rows(offset, self.source.page(offset, limit), offset + limit >= self.source.count)
+        self.after_idle(add_page)
+
+    def sort_by(self, col):
+        """Sort by a column, or reverse the order if it already is the sort column"""
+        descending = col == self.source.sort and not self.source.descending
+        self.source.set_order(col, descending, self.source.text)
+        self.show()
+
+    def on_filter_change(self, *args):
+        """Filter once typing pauses"""
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """Keep the rows whose type or date contains the filter text"""
+        self.filter_job = None
+        self.source.set_order(self.source.sort, self.source.descending, self.filter_var.get().strip())
+        self.show()
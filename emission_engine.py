@@ -0,0 +1,237 @@
+import threading
+import database
+from carbon_emission_db import ACTIVITY_TABLES
+
+# numpy is imported by the functions that take columns, so registering the
+# SQL functions on every new connection does not load it
+
+# Category codes of the engine, in ACTIVITY_TABLES order: 0 is Transport
+CATEGORIES = [spec['category'] for spec in ACTIVITY_TABLES.values()]
+CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+
+# How each category's quantity becomes an emission: multiplied by the
+# Emission_Factor of the row's subtype (SUBTYPE_FACTOR), by that of a fixed
+# source type, or not at all (None) when the quantity already is the emission.
+# This is what ACTIVITY_TABLES' 'emission' SQL computes in the triggers.
+SUBTYPE_FACTOR = object()
+FACTOR_SOURCES = {
+    'Transport': SUBTYPE_FACTOR,
+    'Energy': SUBTYPE_FACTOR,
+    'Waste': 'Waste',
+    'Industrial': None,
+    'Offset': None
+}
+
+# SQL functions added by register_functions, which the modules running
+# user-written SQL pass to database.on_connect(), and the table their results
+# depend on
+SQL_FUNCTIONS = {'emission_factor': 2, 'emission': 3}
+FACTOR_TABLE = 'Emission_Factor'
+
+# Dimension table of each category's subtype codes, in CATEGORIES order
+DIMENSIONS = [(spec['dimension'], spec['code'], spec['subtype']) for spec in ACTIVITY_TABLES.values()]
+
+class EmissionFactors:
+    """A snapshot of Emission_Factor as a lookup array
+
+    The array has one slot per source type, then a factor of 1.0 for
+    categories used as they are and NaN for source types with no factor (the
+    NULL of the SQL's LEFT JOIN). Emissions of many rows are their quantities
+    times the array indexed by each row's slot, in one numpy operation.
+
+    `names` holds each category's subtype names indexed by their dimension
+    code (None at 0, which stands for a NULL code), so rows read with codes
+    are decoded by indexing arrays too.
+    """
+
+    def __init__(self, factors, names=None):
+        self.factors = dict(factors)
+        self.names = names or [[None] for _ in CATEGORIES]
+        self.slots = {source: slot for slot, source in enumerate(self.factors)}
+        self.identity = len(self.factors)
+        self.missing = self.identity + 1
+        self.values = list(self.factors.values()) + [1.0, float('nan')]
+
+        # Slot of every row of a category, or -1 if it depends on the subtype
+        self.category_slots = []
+        for category in CATEGORIES:
+            source = FACTOR_SOURCES[category]
+            if source is SUBTYPE_FACTOR:
+                self.category_slots.append(-1)
+            elif source is None:
+                self.category_slots.append(self.identity)
+            else:
+                self.category_slots.append(self.slots.get(source, self.missing))
+        self._arrays = None
+        self._code_arrays = None
+
+    def arrays(self):
+        """(lookup, category_slots) as numpy arrays"""
+        if self._arrays is None:
+            import numpy as np
+            self._arrays = (np.array(self.values, dtype=float), np.array(self.category_slots, dtype=np.intp))
+        return self._arrays
+
+    def row_slots(self, categories, subtypes):
+        """The lookup slot of each row, from category codes and subtypes (arrays or lists)"""
+        import numpy as np
+        _, category_slots = self.arrays()
+        slots = category_slots[np.asarray(categories, dtype=np.intp)]
+        by_subtype = slots < 0
+        if by_subtype.any():
+            get, missing = self.slots.get, self.missing
+            subtypes = np.asarray(subtypes, dtype=object)[by_subtype]
+            slots[by_subtype] = np.fromiter((get(s, missing) for s in subtypes), dtype=np.intp,
+                                            count=len(subtypes))
+        return slots
+
+    def code_arrays(self):
+        """(offsets, counts, names, slots): every category's codes laid end to end
+
+        Code c of category k is at offsets[k] + c in names and slots, for
+        c < counts[k].
+        """
+        if self._code_arrays is None:
+            import numpy as np
+            counts = np.array([len(names) for names in self.names], dtype=np.intp)
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+            names, slots = [], []
+            for category_slot, category_names in zip(self.category_slots, self.names):
+                names += category_names
+                if category_slot >= 0:
+                    slots += [category_slot] * len(category_names)
+                else:
+                    get, missing = self.slots.get, self.missing
+                    slots += [missing if name is None else get(name, missing) for name in category_names]
+            self._code_arrays = (offsets, counts, np.array(names, dtype=object), np.array(slots, dtype=np.intp))
+        return self._code_arrays
+
+    def covers(self, categories, codes):
+        """Whether every (category, code) pair is known to this snapshot"""
+        import numpy as np
+        _, counts, _, _ = self.code_arrays()
+        codes = np.asarray(codes, dtype=np.intp)
+        return bool(((codes >= 0) & (codes < counts[np.asarray(categories, dtype=np.intp)])).all())
+
+    def decode(self, categories, codes):
+        """(subtype names, factors) of rows given by category and subtype code (0 for NULL)"""
+        import numpy as np
+        lookup, _ = self.arrays()
+        offsets, _, names, slots = self.code_arrays()
+        positions = offsets[np.asarray(categories, dtype=np.intp)] + np.asarray(codes, dtype=np.intp)
+        return names[positions], lookup[slots[positions]]
+
+    def emission_sql(self, category, code, quantity):
+        """SQL of a row's emission from its subtype code and quantity columns, factors inlined
+
+        A CASE over the codes stands in for the joins on the dimension table
+        and Emission_Factor; codes without a factor give NULL, as the LEFT
+        JOIN does. The SQL is only valid for this snapshot.
+        """
+        source = FACTOR_SOURCES[category]
+        if source is None:
+            return quantity
+        if source is not SUBTYPE_FACTOR:
+            factor = self.factors.get(source)
+            return "NULL" if factor is None else f"{quantity} * {float(factor)!r}"
+        cases = [
+            f"WHEN {subtype_code} THEN {float(self.factors[name])!r}"
+            for subtype_code, name in enumerate(self.names[CATEGORY_CODES[category]])
+            if subtype_code and self.factors.get(name) is not None
+        ]
+        return f"{quantity} * CASE {code} {' '.join(cases)} END" if cases else "NULL"
+
+    def row_factors(self, categories, subtypes):
+        """Emission factor of each row (1.0 where the quantity is the emission, NaN if unknown)"""
+        lookup, _ = self.arrays()
+        return lookup[self.row_slots(categories, subtypes)]
+
+    def emissions(self, categories, subtypes, quantities):
+        """Emission of each row: its quantity times its factor, NaN where either is missing"""
+        import numpy as np
+        return np.asarray(quantities, dtype=float) * self.row_factors(categories, subtypes)
+
+    def factor(self, category, subtype):
+        """The factor of one row by category name, or None"""
+        source = FACTOR_SOURCES[category]
+        if source is None:
+            return 1.0
+        return self.factors.get(subtype if source is SUBTYPE_FACTOR else source)
+
+    def emission(self, category, subtype, quantity):
+        """The emission of one row by category name, or None"""
+        factor = self.factor(category, subtype)
+        return None if factor is None or quantity is None else quantity * factor
+
+# Snapshots per database file: path -> (write counters of Emission_Factor and
+# the dimension tables, id of the connection that loaded it, its data_version
+# then, factors)
+_lock = threading.Lock()
+_snapshots = {}
+
+def load_factors(conn):
+    """Read the factors and subtype names of a database
+
+    Emission_Factor maps Source_Type to Emission_Per_Unit (the first row wins
+    on duplicates); the dimension tables give each category's subtype names
+    by code (none in a database not yet migrated to them).
+    """
+    factors = {}
+    for source, factor in conn.execute(f"SELECT Source_Type, Emission_Per_Unit FROM {FACTOR_TABLE} ORDER BY rowid"):
+        factors.setdefault(source, factor)
+
+    tables = {name.lower() for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    names = []
+    for dimension, code, subtype in DIMENSIONS:
+        rows = []
+        if dimension.lower() in tables:
+            rows = conn.execute(f"SELECT {code}, {subtype} FROM {dimension}").fetchall()
+        category_names = [None] * (max((row[0] for row in rows), default=0) + 1)
+        for row_code, name in rows:
+            if row_code > 0:
+                category_names[row_code] = name
+        names.append(category_names)
+    return EmissionFactors(factors, names)
+
+def get_factors(conn, db_path=None, reload=False):
+    """The current factors of the database `conn` is open on
+
+    The snapshot is read again when Emission_Factor or a dimension table has
+    been written in this process, when PRAGMA data_version shows another
+    connection committed, or when asked to (`reload`).
+    """
+    path = database.database_file(db_path)
+    versions = database.write_versions([FACTOR_TABLE] + [dimension for dimension, _, _ in DIMENSIONS], path)
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _lock:
+        snapshot = _snapshots.get(path)
+        if not reload and snapshot is not None and snapshot[:3] == (versions, id(conn), data_version):
+            return snapshot[3]
+    factors = load_factors(conn)
+    with _lock:
+        _snapshots[path] = (versions, id(conn), data_version, factors)
+    return factors
+
+def register_functions(conn, db_path=None):
+    """Register emission_factor(category, subtype) and emission(category, subtype, quantity)
+
+    Categories are named as in ACTIVITY_TABLES ('Transport', 'Energy', ...).
+    The factors are read again after any write recorded in this process; a
+    change committed by another process is seen once get_factors() runs
+    again on the connection, e.g. for the next report. A LEFT JOIN on
+    Emission_Factor is about three times faster per row in a full scan, so
+    the queries shipped with the app keep their joins.
+    """
+    path = database.database_file(db_path)
+    seen = {'generation': None}
+
+    def current():
+        if seen['generation'] != database.write_generation or path not in _snapshots:
+            seen['generation'] = database.write_generation
+            return get_factors(conn, path)
+        return _snapshots[path][3]
+
+    conn.create_function('emission_factor', 2, lambda category, subtype: current().factor(category, subtype))
+    conn.create_function(
+        'emission', 3, lambda category, subtype, quantity: current().emission(category, subtype, quantity)
+    )
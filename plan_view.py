@@ -0,0 +1,68 @@
+import tkinter as tk
+from tkinter import ttk, scrolledtext
+from query_inspector import FULL_SCAN, TEMP_B_TREE, AUTOMATIC_INDEX, format_timings
+
+# Background colour of the plan rows each warning highlights
+WARNING_COLOURS = {
+    FULL_SCAN: '#f8d0d0',
+    TEMP_B_TREE: '#fbe7b5',
+    AUTOMATIC_INDEX: '#f9d8b0'
+}
+
+class PlanWindow(tk.Toplevel):
+    """Window showing inspect_query's result: the plan tree, timings and index suggestions"""
+
+    def __init__(self, parent, name, statements):
+        super().__init__(parent)
+        self.title(f"Query Plan - {name}")
+        self.geometry("900x500")
+
+        # Plan tree, one branch per statement when the query has several
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.tree = ttk.Treeview(tree_frame, columns=("warning",), yscrollcommand=vsb.set)
+        vsb.config(command=self.tree.yview)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.tree.heading("#0", text="Plan step", anchor=tk.W)
+        self.tree.heading("warning", text="Warning", anchor=tk.W)
+        self.tree.column("#0", width=650)
+        self.tree.column("warning", width=200, stretch=False)
+        for warning, colour in WARNING_COLOURS.items():
+            self.tree.tag_configure(warning, background=colour)
+
+        for i, statement in enumerate(statements, start=1):
+            self.add_statement(i, statement, several=len(statements) > 1)
+
+        # Suggested indexes, selectable so they can be copied into the query box
+        suggestions = [s for statement in statements for s in statement['suggestions']]
+        ttk.Label(self, text="Suggested indexes" if suggestions else "No index suggestions").pack(
+            anchor=tk.W, padx=5
+        )
+        if suggestions:
+            text = scrolledtext.ScrolledText(self, height=min(len(suggestions), 6) + 1)
+            text.insert("1.0", ";\n".join(suggestions) + ";")
+            text.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Button(self, text="Close", command=self.destroy).pack(side=tk.RIGHT, padx=5, pady=5)
+
+    def add_statement(self, number, statement, several):
+        """Add one statement's timings and plan nodes to the tree"""
+        parent = ""
+        if several:
+            parent = self.tree.insert("", tk.END, text=f"Statement {number}: {format_timings(statement)}", open=True)
+        else:
+            self.tree.insert("", tk.END, text=format_timings(statement))
+
+        # Plan rows reference their parent by id; 0 is the statement itself
+        items = {0: parent}
+        for node in statement['plan']:
+            items[node['id']] = self.tree.insert(
+                items.get(node['parent'], parent), tk.END,
+                text=node['detail'],
+                values=(node['warning'] or "",),
+                tags=(node['warning'],) if node['warning'] else (),
+                open=True
+            )
@@ -22,22 +22,23 @@ predefined_queries = {
     "Total Emissions By User": """
     SELECT up.User_ID, up.Full_Name, SUM(er.Emission_Amount) as Total_Emissions
     FROM User_Profile up
-    LEFT JOIN Emission_Record er ON er.Source_ID = up.User_ID
+    LEFT JOIN Emission_Record er ON er.User_ID = up.User_ID
     GROUP BY up.User_ID
     ORDER BY Total_Emissions DESC
     """,
     
     "Monthly Energy Consumption": """
-    SELECT strftime('%Y-%m', ec.Date) as Month, SUM(ec.Consumption_KWH) as Total_KWH
-    FROM Energy_Consumption ec
-    GROUP BY Month
+    SELECT mr.Month, SUM(mr.Quantity) as Total_KWH
+    FROM Monthly_Rollup mr
+    WHERE mr.Category = 'Energy'
+    GROUP BY mr.Month
     ORDER BY Month
     """,
     
     "Users with Highest Carbon Footprint": """
     SELECT up.User_ID, up.Full_Name, SUM(er.Emission_Amount) as Carbon_Footprint
     FROM User_Profile up
-    JOIN Emission_Record er ON er.Source_ID = up.User_ID
+    JOIN Emission_Record er ON er.User_ID = up.User_ID
     GROUP BY up.User_ID
     ORDER BY Carbon_Footprint DESC
     LIMIT 5
@@ -82,17 +83,18 @@ predefined_queries = {
     
     "Transportation vs Energy Consumption": """
     SELECT up.User_ID, up.Full_Name, 
-           SUM(CASE WHEN er.Source_Type IN ('Car', 'Bus', 'Train', 'Airplane') THEN er.Emission_Amount ELSE 0 END) as Transport_Emission,
-           SUM(CASE WHEN er.Source_Type IN ('Electricity', 'Natural Gas', 'Coal') THEN er.Emission_Amount ELSE 0 END) as Energy_Emission
+           SUM(CASE WHEN er.Category = 'Transport' THEN er.Emission_Amount ELSE 0 END) as Transport_Emission,
+           SUM(CASE WHEN er.Category = 'Energy' THEN er.Emission_Amount ELSE 0 END) as Energy_Emission
     FROM User_Profile up
-    LEFT JOIN Emission_Record er ON er.Source_ID = up.User_ID
+    LEFT JOIN Emission_Record er ON er.User_ID = up.User_ID
     GROUP BY up.User_ID
     """,
     
     "Emission Reduction Over Time": """
-    SELECT strftime('%Y-%m', er.Date) as Month, SUM(er.Emission_Amount) as Total_Emission
-    FROM Emission_Record er
-    GROUP BY Month
+    SELECT mr.Month, SUM(mr.Emissions) as Total_Emission
+    FROM Monthly_Rollup mr
+    WHERE mr.Category <> 'Offset'
+    GROUP BY mr.Month
     ORDER BY Month
     """,
     
@@ -122,33 +124,42 @@ predefined_queries = {
     
     "Most Eco-Friendly User": """
     SELECT up.User_ID, up.Full_Name, 
-           COUNT(DISTINCT usp.Program_ID) as Program_Count,
-           SUM(co.Offset_Amount) as Total_Offset,
-           SUM(er.Emission_Amount) as Total_Emission
+           (SELECT COUNT(DISTINCT usp.Program_ID) FROM User_Program usp WHERE usp.User_ID = up.User_ID) as Program_Count,
+           (SELECT SUM(co.Offset_Amount) FROM Carbon_Offset co WHERE co.User_ID = up.User_ID) as Total_Offset,
+           (SELECT SUM(er.Emission_Amount) FROM Emission_Record er WHERE er.User_ID = up.User_ID) as Total_Emission
     FROM User_Profile up
-    LEFT JOIN User_Program usp ON up.User_ID = usp.User_ID
-    LEFT JOIN Carbon_Offset co ON up.User_ID = co.User_ID
-    LEFT JOIN Emission_Record er ON er.Source_ID = up.User_ID
-    GROUP BY up.User_ID
     ORDER BY (Program_Count + Total_Offset - Total_Emission) DESC
     LIMIT 1
     """,
     
     "Program Effectiveness": """
+    WITH Enrollment_Emissions AS (
+        SELECT usp.Program_ID,
+               SUM(er.Date < usp.Enrollment_Date) as Before_Count,
+               TOTAL(CASE WHEN er.Date < usp.Enrollment_Date THEN er.Emission_Amount END) as Before_Total,
+               SUM(er.Date > usp.Enrollment_Date) as After_Count,
+               TOTAL(CASE WHEN er.Date > usp.Enrollment_Date THEN er.Emission_Amount END) as After_Total
+        FROM User_Program usp
+        JOIN Emission_Record er ON er.User_ID = usp.User_ID
+        GROUP BY usp.User_ID, usp.Program_ID
+    )
+    -- The average over every (before, after) pair of a user's records,
+    -- without joining each record before enrollment to each one after
     SELECT sp.Program_ID, sp.Program_Name,
-           AVG(er1.Emission_Amount - er2.Emission_Amount) as Average_Reduction
-    FROM User_Program usp
-    JOIN Sustainability_Program sp ON usp.Program_ID = sp.Program_ID
-    JOIN Emission_Record er1 ON er1.Source_ID = usp.User_ID AND er1.Date < usp.Enrollment_Date
-    JOIN Emission_Record er2 ON er2.Source_ID = usp.User_ID AND er2.Date > usp.Enrollment_Date
+           SUM(ee.After_Count * ee.Before_Total - ee.Before_Count * ee.After_Total)
+               / SUM(ee.Before_Count * ee.After_Count) as Average_Reduction
+    FROM Enrollment_Emissions ee
+    JOIN Sustainability_Program sp ON ee.Program_ID = sp.Program_ID
     GROUP BY sp.Program_ID
+    HAVING SUM(ee.Before_Count * ee.After_Count) > 0
     ORDER BY Average_Reduction DESC
     """,
     
     "Waste Reduction by Month": """
-    SELECT strftime('%Y-%m', wm.Date) as Month, SUM(wm.Waste_Weight_KG) as Total_Waste
-    FROM Waste_Management wm
-    GROUP BY Month
+    SELECT mr.Month, SUM(mr.Quantity) as Total_Waste
+    FROM Monthly_Rollup mr
+    WHERE mr.Category = 'Waste'
+    GROUP BY mr.Month
     ORDER BY Month
     """,
     
@@ -0,0 +1,250 @@
+import argparse
+import re
+import time
+import database
+from database import split_statements
+
+# Plan steps worth a look, matched against the detail text of each plan row:
+# a SCAN without an index reads the whole table, a temp b-tree sorts rows for
+# GROUP BY / ORDER BY / DISTINCT, and an automatic index is built by SQLite
+# for this one query because no suitable index exists.
+FULL_SCAN = 'full table scan'
+TEMP_B_TREE = 'temp b-tree'
+AUTOMATIC_INDEX = 'automatic index'
+
+# Words that can follow a table name in FROM / JOIN without being its alias
+_NOT_ALIASES = {
+    'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'FULL', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'ON', 'USING',
+    'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT', 'WINDOW', 'SET', 'VALUES',
+    'INDEXED', 'NOT', 'AS', 'SELECT'
+}
+_TABLE_REF = re.compile(r'(?:\bFROM|\bJOIN|,)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', re.IGNORECASE)
+_PLAN_TARGET = re.compile(r'^(?:SCAN|SEARCH)\s+(\S+)')
+_INDEX_TERMS = re.compile(r'\(([^()]*)\)\s*$')
+_COMPARISON = r'\s*(=|==|<>|!=|<=|>=|<|>|\bIN\b|\bBETWEEN\b|\bLIKE\b|\bIS\b)'
+
+def classify(detail, aliases):
+    """The warning for one plan row's detail text, or None
+
+    `aliases` maps the lower-cased table names and aliases to the tables;
+    scans of anything else (views, subqueries, CTEs) are not full table scans.
+    """
+    if 'AUTOMATIC' in detail:
+        return AUTOMATIC_INDEX
+    if detail.startswith('USE TEMP B-TREE'):
+        return TEMP_B_TREE
+    target = _PLAN_TARGET.match(detail)
+    if detail.startswith('SCAN ') and ' INDEX' not in detail and target and target.group(1).lower() in aliases:
+        return FULL_SCAN
+    return None
+
+def query_plan(conn, statement):
+    """EXPLAIN QUERY PLAN of one statement as a list of nodes
+
+    Each node is a dict with id, parent (0 at the top level), depth, detail
+    and warning (one of the constants above, or None).
+    """
+    # Tables read through a view appear in the plan under their own names
+    aliases = dict(table_names(conn), **table_aliases(conn, statement))
+    depth = {0: -1}
+    nodes = []
+    for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + statement):
+        depth[node_id] = depth.get(parent, -1) + 1
+        nodes.append({
+            'id': node_id,
+            'parent': parent,
+            'depth': depth[node_id],
+            'detail': detail,
+            'warning': classify(detail, aliases)
+        })
+    return nodes
+
+def time_statement(conn, statement):
+    """Run one statement and time its prepare, step and fetch phases separately
+
+    sqlite3 does not expose statement preparation on its own, so prepare is
+    the time to compile the statement under EXPLAIN (which compiles it without
+    running it). Step is the time to the first row, less prepare: sorting and
+    grouping all happen here. Fetch is the time to step through the remaining
+    rows, which are counted but not kept.
+    """
+    start = time.perf_counter()
+    conn.execute("EXPLAIN " + statement).fetchone()
+    prepare = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cursor = conn.execute(statement)
+    first = cursor.fetchone() if cursor.description is not None else None
+    step = max(time.perf_counter() - start - prepare, 0.0)
+
+    start = time.perf_counter()
+    rows = 0
+    if first is not None:
+        rows = 1 + sum(1 for _ in cursor)
+    fetch = time.perf_counter() - start
+
+    return {'prepare': prepare, 'step': step, 'fetch': fetch, 'rows': rows if cursor.description else max(cursor.rowcount, 0)}
+
+def table_names(conn):
+    """Map the lower-cased name of every table in the database to its name"""
+    return {name.lower(): name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def table_aliases(conn, statement):
+    """Map every alias and name used for a table in the statement to the table's name"""
+    tables = table_names(conn)
+    aliases = {}
+    for name, alias in _TABLE_REF.findall(statement):
+        table = tables.get(name.lower())
+        if table is None:
+            continue
+        aliases[table.lower()] = table
+        if alias and alias.upper() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table
+    return aliases
+
+def table_columns(conn, table):
+    """Column names of a table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def indexed_prefixes(conn, table):
+    """The leading column of every index on a table (and the rowid alias), lower-cased"""
+    prefixes = {
+        row[1].lower() for row in conn.execute(f"PRAGMA table_info({table})") if row[5] == 1
+    }
+    for index in conn.execute(f"PRAGMA index_list({table})"):
+        columns = conn.execute(f"PRAGMA index_info({index[1]})").fetchall()
+        if columns and columns[0][2] is not None:
+            prefixes.add(columns[0][2].lower())
+    return prefixes
+
+def filter_columns(statement, table, names, columns, unique):
+    """Columns of a table compared in the statement, equality comparisons first
+
+    A column counts when it is qualified with one of the table's names or
+    aliases, or unqualified and found in no other table of the statement.
+    """
+    by_name = {column.lower(): column for column in columns}
+    equality, ranges = [], []
+    qualifier = '|'.join(re.escape(name) for name in names)
+    patterns = [
+        re.compile(rf'\b(?:{qualifier})\.(\w+){_COMPARISON}', re.IGNORECASE),
+        re.compile(rf'(=|<>|!=|<=|>=|<|>)\s*(?:{qualifier})\.(\w+)\b', re.IGNORECASE),
+        re.compile(rf'(?<![.\w])(\w+){_COMPARISON}', re.IGNORECASE)
+    ]
+    for i, pattern in enumerate(patterns):
+        for match in pattern.finditer(statement):
+            name, operator = (match.group(2), match.group(1)) if i == 1 else (match.group(1), match.group(2))
+            column = by_name.get(name.lower())
+            if column is None or (i == 2 and column.lower() not in unique):
+                continue
+            target = equality if operator.strip() in ('=', '==') or operator.upper() in ('IN', 'IS') else ranges
+            if column not in equality and column not in ranges:
+                target.append(column)
+    return equality + ranges
+
+def suggest_indexes(conn, statement, plan):
+    """CREATE INDEX statements that could remove the plan's scans and automatic indexes
+
+    Suggestions are heuristics read from the plan and the statement text:
+    an automatic index becomes a permanent one on the same columns, and a
+    full scan of a table that the statement filters or joins on gets an index
+    on the compared columns (equalities first). Columns that already lead an
+    index are skipped. Check each suggestion with EXPLAIN before creating it.
+    """
+    aliases = table_aliases(conn, statement)
+    tables = set(aliases.values())
+    columns = {table: table_columns(conn, table) for table in tables}
+
+    # Columns found in exactly one table of the statement can be matched unqualified
+    seen = {}
+    for names in columns.values():
+        for column in names:
+            seen[column.lower()] = seen.get(column.lower(), 0) + 1
+    unique = {column for column, count in seen.items() if count == 1}
+
+    suggestions = []
+    for node in plan:
+        if node['warning'] not in (FULL_SCAN, AUTOMATIC_INDEX):
+            continue
+        target = _PLAN_TARGET.match(node['detail'])
+        table = aliases.get(target.group(1).lower()) if target else None
+        if table is None:
+            continue
+
+        if node['warning'] == AUTOMATIC_INDEX:
+            terms = _INDEX_TERMS.search(node['detail'])
+            wanted = [term.split('=')[0].split('>')[0].split('<')[0].strip()
+                      for term in terms.group(1).split(' AND ')] if terms else []
+        else:
+            names = [name for name, aliased in aliases.items() if aliased == table]
+            table_unique = {column.lower() for column in columns[table]} & unique
+            wanted = filter_columns(statement, table, names, columns[table], table_unique)
+
+        wanted = [column for column in wanted if column]
+        if not wanted or wanted[0].lower() in indexed_prefixes(conn, table):
+            continue
+        name = f"idx_{table.lower()}_{'_'.join(column.lower() for column in wanted)}"
+        sql = f"CREATE INDEX {name} ON {table} ({', '.join(wanted)})"
+        if sql not in suggestions:
+            suggestions.append(sql)
+    return suggestions
+
+def inspect_query(conn, query):
+    """Plan, time and suggest indexes for every statement of a query
+
+    The statements run inside a transaction that is rolled back afterwards,
+    so inspecting an INSERT or a CREATE VIEW leaves the database unchanged.
+    Returns one dict per statement with sql, plan, warnings, suggestions and
+    the prepare/step/fetch timings in seconds.
+    """
+    statements = split_statements(query)
+    if not statements:
+        raise ValueError("The query contains no SQL statements")
+
+    results = []
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    try:
+        for statement in statements:
+            plan = query_plan(conn, statement)
+            result = {
+                'sql': statement,
+                'plan': plan,
+                'warnings': [node for node in plan if node['warning']],
+                'suggestions': suggest_indexes(conn, statement, plan)
+            }
+            result.update(time_statement(conn, statement))
+            results.append(result)
+    finally:
+        conn.rollback()
+    return results
+
+def format_timings(result):
+    """One-line summary of a statement's prepare/step/fetch timings"""
+    return (
+        f"prepare {result['prepare'] * 1000:.2f} ms, step {result['step'] * 1000:.2f} ms, "
+        f"fetch {result['fetch'] * 1000:.2f} ms, {result['rows']} rows"
+    )
+
+def format_inspection(results):
+    """Plain-text rendering of inspect_query's result"""
+    lines = []
+    for i, result in enumerate(results, start=1):
+        if len(results) > 1:
+            lines.append(f"-- statement {i}")
+        lines.append(format_timings(result))
+        for node in result['plan']:
+            flag = f"   <-- {node['warning']}" if node['warning'] else ""
+            lines.append("  " * (node['depth'] + 1) + node['detail'] + flag)
+        for suggestion in result['suggestions']:
+            lines.append(f"  suggested: {suggestion};")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the plan, timings and index suggestions for a query")
+    parser.add_argument("query", help="SQL to inspect (it is run inside a transaction that is rolled back)")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    args = parser.parse_args()
+
+    print(format_inspection(inspect_query(database.get_connection(args.db), args.query)))
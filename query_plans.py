@@ -0,0 +1,93 @@
+import sqlite3
+import argparse
+import os
+import database
+from database import split_statements
+from updated_queries import updated_queries
+from carbon_emission_db import setup_database, create_indexes, drop_indexes
+
+def explain_query_plan(conn, statement):
+    """Return the EXPLAIN QUERY PLAN rows as an indented list of strings"""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+
+    # Each row is (id, parent, notused, detail); indent children under their parent
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+def collect_plans(conn):
+    """Get the plan of every statement in updated_queries"""
+    plans = {}
+    for name, query in updated_queries.items():
+        query_plans = []
+        for statement in split_statements(query):
+            # DDL (e.g. the Carbon_Footprint_View definition) is executed so that
+            # later queries reading the view can be planned
+            if statement.lstrip().upper().startswith(('CREATE', 'DROP')):
+                conn.execute(statement)
+                continue
+            try:
+                query_plans.append(explain_query_plan(conn, statement))
+            except sqlite3.Error as e:
+                query_plans.append([f"ERROR: {e}"])
+        plans[name] = query_plans
+    return plans
+
+def compare_plans(db_path=None):
+    """Compare the plans of updated_queries without and with the secondary indexes"""
+    if not os.path.exists(db_path or database.get_database_path()):
+        setup_database(db_path)
+
+    # Work on in-memory copies so the real database is never modified
+    source = database.get_connection(db_path)
+    before_conn = sqlite3.connect(':memory:')
+    after_conn = sqlite3.connect(':memory:')
+    source.backup(before_conn)
+    source.backup(after_conn)
+
+    drop_indexes(before_conn.cursor())
+    create_indexes(after_conn.cursor())
+    after_conn.execute("ANALYZE")
+
+    before = collect_plans(before_conn)
+    after = collect_plans(after_conn)
+
+    before_conn.close()
+    after_conn.close()
+
+    return [(name, before[name], after[name]) for name in updated_queries]
+
+def print_report(results, changed_only=False):
+    """Print the before/after plans side by side, query by query"""
+    changed = 0
+    for name, before, after in results:
+        is_changed = before != after
+        changed += is_changed
+        if changed_only and not is_changed:
+            continue
+
+        print("=" * 80)
+        print(f"{name} [{'CHANGED' if is_changed else 'unchanged'}]")
+        for i, (plan_before, plan_after) in enumerate(zip(before, after), start=1):
+            if len(before) > 1:
+                print(f"-- statement {i}")
+            print("  before:")
+            for line in plan_before:
+                print("    " + line)
+            print("  after:")
+            for line in plan_after:
+                print("    " + line)
+
+    print("=" * 80)
+    print(f"{changed} of {len(results)} queries have a different plan with the indexes")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare EXPLAIN QUERY PLAN of updated_queries before/after indexing")
+    parser.add_argument("--db", help="database file to analyse (created if missing)")
+    parser.add_argument("--changed-only", action="store_true", help="only print queries whose plan changes")
+    args = parser.parse_args()
+
+    print_report(compare_plans(args.db), args.changed_only)
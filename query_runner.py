@@ -0,0 +1,344 @@
+import sqlite3
+import threading
+import queue
+import time
+import database
+from archive import archived_years, connection_for
+from carbon_emission_db import count_view_writes, execute_counted
+from database import split_statements
+from emission_engine import register_functions
+from query_inspector import inspect_query
+from result_cache import ResultCache, rows_size
+
+# Queries typed in the GUI may call emission() and emission_factor()
+database.on_connect(register_functions)
+
+# Rows fetched per page of a streamed result
+PAGE_SIZE = 500
+
+# Seconds a result stream may sit unread before it is closed. Its open
+# SELECT holds a read snapshot, which stops WAL checkpoints from completing
+# while the result is on screen; later pages are re-read with LIMIT/OFFSET.
+STREAM_IDLE_SECONDS = 5
+
+class QueryRunner:
+    """Run SQL on background worker threads
+
+    The query worker owns its own pooled connection, so the Tk main thread never
+    blocks on the database. A query's result set is streamed: the first page is
+    returned with the query result, and the cursor stays open so later pages
+    can be fetched on demand with fetch_rows(): pages at the stream position
+    come straight from the cursor, and rows the caller has already dropped, or
+    asks for once the stream was closed for sitting idle, are re-read with
+    LIMIT/OFFSET. The total row count is computed separately on a
+    second worker so it never delays the first page.
+
+    A query submitted with archives=True reads through archive.connection_for(),
+    so it also sees the activity rows moved to the per-year archive files;
+    otherwise its result lists the archived years it did not read.
+
+    Results of read-only queries are kept in a ResultCache and served from it
+    until a table they read is written. A result is cached only if it can be
+    read in full within the cache's entry size limit; the rows read while
+    trying are kept for fetch_rows() either way.
+
+    Finished jobs are collected with poll(), which the GUI calls from a Tk
+    after() loop. cancel() interrupts whatever the workers are running.
+    """
+
+    def __init__(self, db_path=None, page_size=PAGE_SIZE, cache=None):
+        self.db_path = db_path
+        self.page_size = page_size
+        self.cache = ResultCache(db_path) if cache is None else cache
+        self._jobs = queue.Queue()
+        self._count_jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._conn = None
+        self._count_conn = None
+        self._archive_conn = None
+        self._archive_count_conn = None
+        self._running = None
+        self._counting = None
+        self._next_id = 0
+        self._latest_query = None
+        self._counting_writes = set()
+        self._lock = threading.Lock()
+
+        # Latest query's result statement, (job_id, statement, archives), its open
+        # result stream, (job_id, cursor, position), and the rows of it held in
+        # memory, (job_id, rows, complete)
+        self._statement = None
+        self._stream = None
+        self._rows = None
+
+        self._thread = threading.Thread(target=self._worker, name="query-runner", daemon=True)
+        self._thread.start()
+        self._count_thread = threading.Thread(target=self._count_worker, name="query-counter", daemon=True)
+        self._count_thread.start()
+
+    def submit(self, query, name, archives=False):
+        """Queue a query and return its job id; with archives, it reads the archive files too"""
+        with self._lock:
+            self._next_id += 1
+            job_id = self._latest_query = self._next_id
+            # A count still running for an older query is no longer needed
+            if self._counting is not None and self._count_conn is not None:
+                self._count_conn.interrupt()
+        self._jobs.put(('query', job_id, (query, archives), name))
+        return job_id
+
+    def explain(self, query, name, archives=False):
+        """Queue a query to be planned and timed with inspect_query; return the job id"""
+        with self._lock:
+            self._next_id += 1
+            job_id = self._next_id
+        self._jobs.put(('explain', job_id, (query, archives), name))
+        return job_id
+
+    def fetch_rows(self, job_id, offset, limit):
+        """Queue a fetch of rows [offset, offset + limit) of a query's result"""
+        self._jobs.put(('rows', job_id, (offset, limit), None))
+
+    def cancel(self):
+        """Interrupt the running query and row count, if any"""
+        with self._lock:
+            if self._running is not None:
+                for conn in (self._conn, self._archive_conn):
+                    if conn is not None:
+                        conn.interrupt()
+            if self._counting is not None:
+                for conn in (self._count_conn, self._archive_count_conn):
+                    if conn is not None:
+                        conn.interrupt()
+
+    def is_running(self):
+        """Whether the worker is executing a job"""
+        return self._running is not None
+
+    def poll(self):
+        """Return the next finished job result, or None
+
+        Every result is a dict with kind ('query', 'explain', 'rows' or 'count'), job_id,
+        status ('ok', 'cancelled' or 'error') and elapsed seconds. An 'ok'
+        query result has either columns/rows/offset/exhausted for a result set
+        (plus total when the whole result was read, and cached when it came
+        from the cache) or rowcount for statements that return no rows, and
+        archived_years unless it read the archives; an 'explain' result
+        carries statements (inspect_query's list), a 'rows' result carries
+        rows/offset/exhausted and a 'count' result carries total.
+        """
+        try:
+            return self._results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _worker(self):
+        """Query worker loop: run queued jobs one at a time"""
+        self._conn = database.get_connection(self.db_path)
+        while True:
+            try:
+                kind, job_id, payload, name = self._jobs.get(
+                    timeout=STREAM_IDLE_SECONDS if self._stream is not None else None
+                )
+            except queue.Empty:
+                self._close_stream()
+                continue
+            with self._lock:
+                self._running = job_id
+
+            start = time.perf_counter()
+            result = {'kind': kind, 'job_id': job_id, 'name': name}
+            try:
+                if kind == 'query':
+                    result.update(self._execute(job_id, *payload))
+                elif kind == 'explain':
+                    # The inspection rolls back, which would abort an open stream;
+                    # the displayed result is re-read with LIMIT/OFFSET instead
+                    self._close_stream()
+                    query, archives = payload
+                    result['statements'] = inspect_query(self._reader(archives), query)
+                else:
+                    result.update(self._fetch_rows(job_id, *payload))
+                result['status'] = 'ok'
+            except sqlite3.OperationalError as e:
+                self._rollback()
+                if kind == 'rows':
+                    self._close_stream()
+                if 'interrupted' in str(e):
+                    result['status'] = 'cancelled'
+                else:
+                    result.update(status='error', error=str(e))
+            except Exception as e:
+                self._rollback()
+                result.update(status='error', error=str(e))
+            result['elapsed'] = time.perf_counter() - start
+
+            with self._lock:
+                self._running = None
+            self._results.put(result)
+
+            # The row count runs on its own connection once the first page is out
+            if kind == 'query' and result['status'] == 'ok' and not result.get('exhausted', True) \
+                    and 'total' not in result:
+                self._count_jobs.put(self._statement)
+
+    def _count_worker(self):
+        """Row count worker loop"""
+        self._count_conn = database.get_connection(self.db_path)
+        while True:
+            job_id, statement, archives = self._count_jobs.get()
+            # Only the latest query's count is wanted; an Explain run since does not replace it
+            with self._lock:
+                if job_id != self._latest_query:
+                    continue
+                self._counting = job_id
+
+            start = time.perf_counter()
+            result = {'kind': 'count', 'job_id': job_id}
+            try:
+                conn = self._count_conn
+                if archives:
+                    conn = self._archive_count_conn = connection_for(db_path=self.db_path)
+                total = conn.execute(f"SELECT COUNT(*) FROM ({statement}\n)").fetchone()[0]
+                result.update(status='ok', total=total)
+            except sqlite3.OperationalError as e:
+                result.update(status='cancelled' if 'interrupted' in str(e) else 'error', error=str(e))
+            except Exception as e:
+                result.update(status='error', error=str(e))
+            result['elapsed'] = time.perf_counter() - start
+
+            with self._lock:
+                self._counting = None
+            self._results.put(result)
+
+    def _rollback(self):
+        """Roll back an unfinished transaction after a failed statement"""
+        for conn in (self._conn, self._archive_conn):
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+
+    def _reader(self, archives):
+        """The query worker's connection to read with, through the archive files with archives"""
+        if not archives:
+            return self._conn
+        self._archive_conn = connection_for(db_path=self.db_path)
+        return self._archive_conn
+
+    def _close_stream(self):
+        """Close the result stream of the previous query"""
+        if self._stream is not None:
+            self._stream[1].close()
+            self._stream = None
+
+    def _execute(self, job_id, query, archives=False):
+        """Run every statement of the query; the last one determines the result"""
+        self._close_stream()
+        self._statement = None
+        self._rows = None
+        statements = split_statements(query)
+        if not statements:
+            raise ValueError("The query contains no SQL statements")
+
+        # Serve the result from the cache while no table it reads was written
+        self.cache.check_external(self._conn)
+        key = (self.cache.key(query), archives)
+        skipped = {} if archives else {'archived_years': archived_years(self._conn)}
+        cached = self.cache.get(key)
+        if cached is not None:
+            columns, rows = cached
+            self._statement = (job_id, statements[-1], archives)
+            self._rows = (job_id, rows, True)
+            return {
+                'columns': columns, 'rows': rows[:self.page_size], 'offset': 0,
+                'exhausted': len(rows) <= self.page_size, 'total': len(rows), 'cached': True, **skipped
+            }
+
+        # The tables' write counters are read before the query runs, so a
+        # write that lands while it runs leaves the cached result stale
+        tables = self.cache.cacheable_tables(query)
+        versions = None
+        if tables is not None:
+            self.cache.miss()
+            versions = self.cache.versions(tables)
+
+        conn = self._reader(archives)
+        cursor = conn.cursor()
+        if conn not in self._counting_writes:
+            count_view_writes(cursor)
+            self._counting_writes.add(conn)
+        result = {'rowcount': 0}
+        written = []
+        with conn:
+            for statement in statements:
+                rowcount = execute_counted(cursor, statement)
+                if cursor.description is not None and statement is statements[-1]:
+                    columns = [column[0] for column in cursor.description]
+                    self._statement = (job_id, statement, archives)
+                    result = self._read_result(job_id, cursor, columns, key, tables, versions)
+                    break
+                if cursor.description is None:
+                    written.append(statement)
+                result = {'rowcount': rowcount}
+
+        for statement in written:
+            database.record_statement_writes(statement, self.db_path)
+        return dict(result, **skipped)
+
+    def _read_result(self, job_id, cursor, columns, key, tables, versions):
+        """Read the first page of a result set, or all of it when it can be cached"""
+        rows = cursor.fetchmany(self.page_size)
+        exhausted = len(rows) < self.page_size
+
+        # Keep reading while the result still fits in a cache entry
+        if tables is not None:
+            size = rows_size(rows)
+            while not exhausted and size <= self.cache.max_entry_bytes:
+                page = cursor.fetchmany(self.page_size)
+                exhausted = len(page) < self.page_size
+                size += rows_size(page)
+                rows.extend(page)
+            if exhausted:
+                self.cache.put(key, tables, versions, (columns, rows), size)
+
+        if len(rows) > self.page_size:
+            self._rows = (job_id, rows, exhausted)
+        if not exhausted:
+            self._stream = (job_id, cursor, len(rows))
+
+        result = {
+            'columns': columns, 'rows': rows[:self.page_size], 'offset': 0,
+            'exhausted': exhausted and len(rows) <= self.page_size
+        }
+        if exhausted:
+            result['total'] = len(rows)
+        return result
+
+    def _fetch_rows(self, job_id, offset, limit):
+        """Fetch rows of the latest query's result, from the open stream when possible"""
+        if self._statement is None or self._statement[0] != job_id:
+            raise ValueError("The query's result is no longer open")
+
+        # Rows already read (from the cache, or while trying to cache them)
+        if self._rows is not None and self._rows[0] == job_id:
+            _, rows, complete = self._rows
+            if offset + limit <= len(rows) or complete:
+                page = rows[offset:offset + limit]
+                return {'rows': page, 'offset': offset, 'exhausted': complete and offset + len(page) >= len(rows)}
+
+        # Next page of the stream: read on from the cursor
+        if self._stream is not None and self._stream[2] == offset:
+            _, cursor, position = self._stream
+            rows = cursor.fetchmany(limit)
+            exhausted = len(rows) < limit
+            if exhausted:
+                self._close_stream()
+            else:
+                self._stream = (job_id, cursor, position + len(rows))
+            return {'rows': rows, 'offset': offset, 'exhausted': exhausted}
+
+        # Anything else is re-read from the statement
+        _, statement, archives = self._statement
+        rows = self._reader(archives).execute(
+            f"SELECT * FROM ({statement}\n) LIMIT ? OFFSET ?", (limit, offset)
+        ).fetchall()
+        return {'rows': rows, 'offset': offset, 'exhausted': len(rows) < limit}
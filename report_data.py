@@ -0,0 +1,491 @@
+import argparse
+import statistics
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import database
+from archive import connection_for
+from carbon_emission_db import ACTIVITY_TABLES
+from emission_engine import CATEGORY_CODES as ENGINE_CODES, get_factors
+
+# Report categories: key in the report dictionary -> (table, id column, the
+# Emission_Factor source type its rows are multiplied by, or None when the
+# quantity already is the amount)
+REPORT_CATEGORIES = {
+    'transport': ('Transportation', 'Transport_ID', 't.Vehicle_Type'),
+    'energy': ('Energy_Consumption', 'Energy_ID', 't.Energy_Source'),
+    'waste': ('Waste_Management', 'Waste_ID', "'Waste'"),
+    'industrial': ('Industrial_Activity', 'Industry_ID', None),
+    'offset': ('Carbon_Offset', 'Offset_ID', None)
+}
+
+# Categories whose per-subtype quantities are charted
+BREAKDOWN_CATEGORIES = ['transport', 'energy']
+
+# Kind of each row of the long-format result, in its first column. Small
+# integers keep the split below a numpy sort rather than string compares.
+# The profile row carries User_ID, Full_Name, Email and Location; activity
+# rows carry their category's code (CATEGORY_CODES), id, subtype code (0 when
+# NULL), quantity and date.
+USER_ROW = 0
+CATEGORY_CODES = {key: code for code, key in enumerate(REPORT_CATEGORIES, start=1)}
+
+# Recommendations: the category named in the report -> (its summary key,
+# the advice for it). When several categories tie for the highest emissions
+# the first one listed wins.
+RECOMMENDATIONS = {
+    'Transportation': ('transport_emissions', [
+        "Consider using public transportation, carpooling, or switching to electric vehicles.",
+        "Reduce unnecessary travel and combine trips when possible."
+    ]),
+    'Energy Consumption': ('energy_emissions', [
+        "Switch to energy-efficient appliances and LED lighting.",
+        "Consider renewable energy sources like solar panels.",
+        "Improve insulation to reduce heating and cooling needs."
+    ]),
+    'Waste Management': ('waste_emissions', [
+        "Practice recycling and composting to reduce landfill waste.",
+        "Choose products with minimal packaging.",
+        "Donate or repurpose items instead of disposing them."
+    ]),
+    'Industrial Activity': ('industrial_emissions', [
+        "Implement more efficient industrial processes.",
+        "Consider cleaner energy sources for industrial operations.",
+        "Invest in carbon capture technologies."
+    ])
+}
+
+# Offsets below this share of the total emissions get a recommendation too
+OFFSET_SHARE = 0.1
+OFFSET_RECOMMENDATION = ("Consider increasing your carbon offset contributions through tree planting "
+                         "or renewable energy credits.")
+
+def category_recommendations(category, low_offset):
+    """The recommendations for a user whose highest emissions come from `category`"""
+    advice = [f"Your highest emissions come from {category}. Focus on reducing this area first."]
+    advice += RECOMMENDATIONS[category][1]
+    if low_offset:
+        advice.append(OFFSET_RECOMMENDATION)
+    return advice
+
+def recommendations(summary):
+    """The recommendations for a report's summary, as a list of sentences"""
+    emissions = {category: summary[key] for category, (key, _) in RECOMMENDATIONS.items()}
+    highest_category = max(emissions, key=emissions.get)
+    return category_recommendations(highest_category, summary['total_offset'] < summary['total_emissions'] * OFFSET_SHARE)
+
+def amount_sql(key):
+    """(factor, amount, join) SQL of a category's rows, read from its table aliased t"""
+    table, _, factor_source = REPORT_CATEGORIES[key]
+    quantity = f"t.{ACTIVITY_TABLES[table]['quantity']}"
+    if factor_source is None:
+        return "NULL", quantity, ""
+    return (
+        "ef.Emission_Per_Unit",
+        f"{quantity} * ef.Emission_Per_Unit",
+        f"LEFT JOIN Emission_Factor ef ON ef.Source_Type = {factor_source}"
+    )
+
+def report_sql():
+    """The single statement returning a user's profile and activity rows"""
+    where = "WHERE t.User_ID = :user_id AND t.Date BETWEEN :date_from AND :date_to"
+    activity = []
+    for key, (table, id_column, _) in REPORT_CATEGORIES.items():
+        spec = ACTIVITY_TABLES[table]
+        activity.append(
+            f"SELECT {CATEGORY_CODES[key]}, t.{id_column}, IFNULL(t.{spec['code']}, 0), t.{spec['quantity']}, t.Date\n"
+            f"    FROM {spec['data']} t\n"
+            f"    {where}"
+        )
+    # Neither subtype names nor emissions are joined in here: emission_engine
+    # decodes the codes and computes the emissions (and the totals) from the
+    # rows in one numpy pass, and every column is read from the index
+    # alone. Rows come by kind, then by Date and id: nothing else fixes
+    # their order, and a table read through archive.py's views would
+    # return the current rows before the archived ones.
+    return "\nUNION ALL\n".join(
+        [f"SELECT {USER_ROW}, User_ID, Full_Name, Email, Location FROM User_Profile WHERE User_ID = :user_id"]
+        + activity
+    ) + "\nORDER BY 1, 5, 2"
+
+REPORT_SQL = report_sql()
+
+# emission_engine category code of each kind code of the rows above (the
+# profile row's included, unused)
+CATEGORY_ENGINE_CODES = np.array(
+    [0] + [ENGINE_CODES[ACTIVITY_TABLES[table]['category']] for table, _, _ in REPORT_CATEGORIES.values()],
+    dtype=np.intp
+)
+
+def category_frame(columns, key, user_id):
+    """DataFrame of one category's activity rows, with the columns its table query would return
+
+    `columns` holds the category's slice of each column of the activity rows:
+    ids, subtypes, quantities, dates, then their factors and emissions.
+    """
+    table, id_column, factor_source = REPORT_CATEGORIES[key]
+    spec = ACTIVITY_TABLES[table]
+    ids, subtypes, quantities, dates, factors, amounts = columns
+    frame = {
+        id_column: ids,
+        'User_ID': np.full(len(ids), user_id, dtype=np.int64),
+        spec['subtype']: subtypes,
+        spec['quantity']: quantities,
+        'Date': dates
+    }
+    if factor_source:
+        frame['Emission_Per_Unit'] = factors
+        frame['Emission_Amount'] = amounts
+    return pd.DataFrame(frame, copy=False)
+
+def fetch_report_data(conn, user_id, date_from, date_to):
+    """A user's report data in one round trip
+
+    Returns the dictionary ReportsFrame displays: the profile ('user') and
+    each category's rows as DataFrames ordered by Date and id, the charted per-subtype quantities
+    ('breakdown') and the emission totals ('summary'). Emissions are the
+    quantities times the factors of emission_engine, for every row at once.
+    """
+    rows = conn.execute(REPORT_SQL, {'user_id': user_id, 'date_from': date_from, 'date_to': date_to}).fetchall()
+
+    # Row ranges of each kind (the rows come sorted by kind)
+    kinds = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    bounds = np.searchsorted(kinds, np.arange(len(CATEGORY_CODES) + 2))
+
+    user = pd.DataFrame([row[1:5] for row in rows[:bounds[1]]],
+                        columns=['User_ID', 'Full_Name', 'Email', 'Location'])
+
+    # Columns of all the activity rows, and their emissions
+    activity = rows[bounds[1]:]
+    columns = list(zip(*activity)) or [()] * 5
+    ids = np.array(columns[1], dtype=np.int64)
+    codes = np.array(columns[2], dtype=np.intp)
+    quantities = np.array(columns[3], dtype=float)
+    dates = np.array(columns[4], dtype=object)
+    categories = CATEGORY_ENGINE_CODES[kinds[bounds[1]:]]
+
+    # A subtype added since the factors were loaded means they are stale
+    engine = get_factors(conn)
+    if not engine.covers(categories, codes):
+        engine = get_factors(conn, reload=True)
+    subtypes, factors = engine.decode(categories, codes)
+    amounts = quantities * factors
+
+    data = {'user': user}
+    totals = {}
+    for key, code in CATEGORY_CODES.items():
+        part = slice(bounds[code] - bounds[1], bounds[code + 1] - bounds[1])
+        data[key] = category_frame(
+            [ids[part], subtypes[part], quantities[part], dates[part], factors[part], amounts[part]], key, user_id
+        )
+        # NULL emissions (no factor) count as 0, as in SQL's TOTAL()
+        totals[key] = float(np.nansum(amounts[part]))
+
+    # Chart breakdowns are summed from the rows already fetched
+    data['breakdown'] = {}
+    for key in BREAKDOWN_CATEGORIES:
+        spec = ACTIVITY_TABLES[REPORT_CATEGORIES[key][0]]
+        frame = data[key]
+        data['breakdown'][key] = frame.groupby(spec['subtype'], dropna=False)[spec['quantity']].sum().rename('Quantity')
+
+    emissions = {key: totals[key] for key in ('transport', 'energy', 'waste', 'industrial')}
+    total_emissions = sum(emissions.values())
+    total_offset = totals['offset']
+    data['summary'] = {
+        'transport_emissions': emissions['transport'],
+        'energy_emissions': emissions['energy'],
+        'waste_emissions': emissions['waste'],
+        'industrial_emissions': emissions['industrial'],
+        'total_emissions': total_emissions,
+        'total_offset': total_offset,
+        'net_emissions': total_emissions - total_offset
+    }
+    return data
+
+# Details tab: the columns shown for each category, the ones shown with two
+# decimals, and the row count above which a table's sorting and filtering is
+# left to SQLite rather than done on the report's DataFrame
+DETAILS_COLUMNS = {
+    'transport': ['Transport_ID', 'Vehicle_Type', 'Distance_KM', 'Date', 'Emission_Amount'],
+    'energy': ['Energy_ID', 'Energy_Source', 'Consumption_KWH', 'Date', 'Emission_Amount'],
+    'waste': ['Waste_ID', 'Waste_Type', 'Waste_Weight_KG', 'Date', 'Emission_Amount'],
+    'industrial': ['Industry_ID', 'Activity_Type', 'Emission_Produced', 'Date'],
+    'offset': ['Offset_ID', 'Offset_Type', 'Offset_Amount', 'Date']
+}
+DECIMAL_COLUMNS = {'Distance_KM', 'Consumption_KWH', 'Waste_Weight_KG', 'Emission_Amount', 'Emission_Produced',
+                   'Offset_Amount'}
+DETAILS_SQL_ROWS = 50000
+
+def format_details(frame, columns):
+    """Display rows (tuples) of a details table, formatted a column at a time"""
+    values = []
+    for column in columns:
+        if column in DECIMAL_COLUMNS:
+            values.append(np.char.mod('%.2f', frame[column].to_numpy(dtype=float)).tolist())
+        else:
+            values.append(frame[column].tolist())
+    return list(zip(*values))
+
+def like_pattern(text):
+    """A LIKE pattern matching `text` anywhere, with its wildcards escaped by '\\'"""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+class DetailsSource:
+    """The rows of one category's details table, sorted and filtered, a page at a time
+
+    Pages come from the report's DataFrame and only the rows of a page are
+    formatted. Sorting and filtering (a case-insensitive match on the subtype
+    or date) are done with pandas, except for categories with more than
+    DETAILS_SQL_ROWS rows: those run the category's query again with ORDER BY,
+    LIKE and LIMIT/OFFSET, so no sorted copy of the frame is made and a sort
+    on Date is read from the index. Other sorts are repeated for each page.
+    """
+
+    def __init__(self, key, frame, user_id, date_from, date_to, conn=None):
+        self.key = key
+        self.frame = frame
+        self.params = {'user_id': user_id, 'date_from': date_from, 'date_to': date_to}
+        self.conn = conn
+        self.columns = [column for column in DETAILS_COLUMNS[key] if column in frame.columns]
+        self.server_side = len(frame) > DETAILS_SQL_ROWS
+        self.set_order()
+
+    def set_order(self, sort=None, descending=False, text=""):
+        """Sort by a column (None keeps the report's order) and keep the rows matching `text`"""
+        if sort is not None and sort not in self.columns:
+            raise ValueError(f"Unknown column: {sort}")
+        self.sort, self.descending, self.text = sort, descending, text
+        if self.server_side and (sort or text):
+            self.rows = None
+            self.count = self.connection().execute(
+                f"SELECT COUNT(*) FROM {self.from_sql()}", self.sql_params()
+            ).fetchone()[0] if text else len(self.frame)
+            return
+
+        rows = self.frame
+        if text:
+            subtype = ACTIVITY_TABLES[REPORT_CATEGORIES[self.key][0]]['subtype']
+            matches = rows[subtype].str.contains(text, case=False, regex=False, na=False)
+            rows = rows[matches | rows['Date'].str.contains(text, case=False, regex=False, na=False)]
+        if sort:
+            # Ordered as the SQL below orders them: NULLs lowest, ties by id
+            rows = rows.sort_values([sort, self.columns[0]], ascending=not descending, kind='stable',
+                                    na_position='last' if descending else 'first')
+        self.rows = rows
+        self.count = len(rows)
+
+    def page(self, offset, limit):
+        """Display rows [offset, offset + limit) in the current order"""
+        if self.rows is not None:
+            return format_details(self.rows.iloc[offset:offset + limit], self.columns)
+
+        _, amount, _ = amount_sql(self.key)
+        select = ", ".join(
+            f"{amount} AS Emission_Amount" if column == 'Emission_Amount' else f"t.{column}"
+            for column in self.columns
+        )
+        # Ties are broken by id in the same direction, so a sort on Date reads
+        # the (User_ID, Date) index in order instead of sorting. Unsorted rows
+        # keep the report's order.
+        direction = 'DESC' if self.descending else 'ASC'
+        sort = self.sort or 'Date'
+        order = f"ORDER BY {sort} {direction}, t.{self.columns[0]} {direction}"
+        rows = self.connection().execute(
+            f"SELECT {select} FROM {self.from_sql()} {order} LIMIT :limit OFFSET :offset",
+            dict(self.sql_params(), limit=limit, offset=offset)
+        ).fetchall()
+        return format_details(pd.DataFrame(rows, columns=self.columns), self.columns)
+
+    def from_sql(self):
+        """FROM and WHERE clauses of the category's rows in the report, filtered"""
+        table = REPORT_CATEGORIES[self.key][0]
+        _, _, join = amount_sql(self.key)
+        sql = f"{table} t {join} WHERE t.User_ID = :user_id AND t.Date BETWEEN :date_from AND :date_to"
+        if self.text:
+            subtype = ACTIVITY_TABLES[table]['subtype']
+            sql += f" AND (t.{subtype} LIKE :text ESCAPE '\\' OR t.Date LIKE :text ESCAPE '\\')"
+        return sql
+
+    def sql_params(self):
+        """Parameters of from_sql()"""
+        return dict(self.params, text=like_pattern(self.text))
+
+    def connection(self):
+        """The connection the SQL runs on: the one for the report's dates (see archive.py) by default"""
+        return self.conn or connection_for(self.params['date_from'], self.params['date_to'])
+
+def subtype_totals(conn, table, user_id, date_from, date_to):
+    """Get a user's quantity per subtype (e.g. distance per vehicle type) for a date range
+
+    Whole months inside the range are read from Monthly_Rollup; only the two
+    (possibly partial) edge months are summed from the raw activity rows.
+    """
+    spec = ACTIVITY_TABLES[table]
+    from_month, to_month = date_from[:7], date_to[:7]
+
+    df = pd.read_sql_query(
+        f"""
+        SELECT Subtype, SUM(Quantity) as Quantity
+        FROM (
+            SELECT Subtype, Quantity FROM Monthly_Rollup
+            WHERE User_ID = ? AND Category = ? AND Month > ? AND Month < ?
+            UNION ALL
+            SELECT {spec['subtype']}, {spec['quantity']} FROM {table}
+            WHERE User_ID = ? AND (Date BETWEEN ? AND ? OR Date BETWEEN ? AND ?)
+        )
+        GROUP BY Subtype
+        """,
+        conn,
+        params=(
+            user_id, spec['category'], from_month, to_month,
+            user_id,
+            date_from, min(date_to, from_month + '-31'),
+            max(date_from, to_month + '-01'), date_to
+        )
+    )
+    return df.set_index('Subtype')['Quantity'].rename_axis(spec['subtype'])
+
+def legacy_report_data(conn, user_id, date_from, date_to):
+    """The report data fetched the previous way, one query per category
+
+    Kept as the baseline of the benchmark below and to check that
+    fetch_report_data returns the same data.
+    """
+    params = (user_id, date_from, date_to)
+    df_user = pd.read_sql_query("SELECT * FROM User_Profile WHERE User_ID = ?", conn, params=(user_id,))
+    df_transport = pd.read_sql_query(
+        """
+        SELECT t.*, ef.Emission_Per_Unit,
+               (t.Distance_KM * ef.Emission_Per_Unit) as Emission_Amount
+        FROM Transportation t
+        LEFT JOIN Emission_Factor ef ON t.Vehicle_Type = ef.Source_Type
+        WHERE t.User_ID = ? AND t.Date BETWEEN ? AND ?
+        ORDER BY t.Date, t.Transport_ID
+        """, conn, params=params
+    )
+    df_energy = pd.read_sql_query(
+        """
+        SELECT ec.*, ef.Emission_Per_Unit,
+               (ec.Consumption_KWH * ef.Emission_Per_Unit) as Emission_Amount
+        FROM Energy_Consumption ec
+        LEFT JOIN Emission_Factor ef ON ec.Energy_Source = ef.Source_Type
+        WHERE ec.User_ID = ? AND ec.Date BETWEEN ? AND ?
+        ORDER BY ec.Date, ec.Energy_ID
+        """, conn, params=params
+    )
+    df_waste = pd.read_sql_query(
+        """
+        SELECT wm.*, ef.Emission_Per_Unit,
+               (wm.Waste_Weight_KG * ef.Emission_Per_Unit) as Emission_Amount
+        FROM Waste_Management wm
+        LEFT JOIN Emission_Factor ef ON 'Waste' = ef.Source_Type
+        WHERE wm.User_ID = ? AND wm.Date BETWEEN ? AND ?
+        ORDER BY wm.Date, wm.Waste_ID
+        """, conn, params=params
+    )
+    df_industrial = pd.read_sql_query(
+        "SELECT * FROM Industrial_Activity WHERE User_ID = ? AND Date BETWEEN ? AND ? ORDER BY Date, Industry_ID",
+        conn, params=params
+    )
+    df_offset = pd.read_sql_query(
+        "SELECT * FROM Carbon_Offset WHERE User_ID = ? AND Date BETWEEN ? AND ? ORDER BY Date, Offset_ID", conn, params=params
+    )
+
+    transport_emissions = df_transport['Emission_Amount'].sum() if not df_transport.empty else 0
+    energy_emissions = df_energy['Emission_Amount'].sum() if not df_energy.empty else 0
+    waste_emissions = df_waste['Emission_Amount'].sum() if not df_waste.empty else 0
+    industrial_emissions = df_industrial['Emission_Produced'].sum() if not df_industrial.empty else 0
+    total_emissions = transport_emissions + energy_emissions + waste_emissions + industrial_emissions
+    total_offset = df_offset['Offset_Amount'].sum() if not df_offset.empty else 0
+
+    return {
+        'user': df_user,
+        'transport': df_transport,
+        'energy': df_energy,
+        'waste': df_waste,
+        'industrial': df_industrial,
+        'offset': df_offset,
+        'breakdown': {
+            'transport': subtype_totals(conn, 'Transportation', user_id, date_from, date_to),
+            'energy': subtype_totals(conn, 'Energy_Consumption', user_id, date_from, date_to)
+        },
+        'summary': {
+            'transport_emissions': transport_emissions,
+            'energy_emissions': energy_emissions,
+            'waste_emissions': waste_emissions,
+            'industrial_emissions': industrial_emissions,
+            'total_emissions': total_emissions,
+            'total_offset': total_offset,
+            'net_emissions': total_emissions - total_offset
+        }
+    }
+
+def same_report(a, b, tolerance=1e-6):
+    """Whether two report dictionaries hold the same data (ignoring dtypes of empty frames)"""
+    for key in ['user'] + list(REPORT_CATEGORIES):
+        if len(a[key]) != len(b[key]) or list(a[key].columns) != list(b[key].columns):
+            return False
+        if len(a[key]) and not a[key].equals(b[key]):
+            # A column without a single factor is None from SQL and NaN from the engine
+            left, right = (frame.astype(object).where(frame.notna(), None) for frame in (a[key], b[key]))
+            try:
+                pd.testing.assert_frame_equal(left, right, check_dtype=False, rtol=tolerance)
+            except AssertionError:
+                return False
+    for key in BREAKDOWN_CATEGORIES:
+        left, right = a['breakdown'][key], b['breakdown'][key]
+        if list(left.index) != list(right.index) or ((left - right).abs() > tolerance * (1 + right.abs())).any():
+            return False
+    return all(abs(a['summary'][k] - b['summary'][k]) <= tolerance * (1 + abs(b['summary'][k])) for k in a['summary'])
+
+def measure(fetch, conn, users, date_from, date_to, repeat):
+    """Median latency per report (ms) and peak traced allocation (KiB) of a fetch function"""
+    latencies = []
+    for _ in range(repeat):
+        for user_id in users:
+            start = time.perf_counter()
+            fetch(conn, user_id, date_from, date_to)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    peaks = []
+    for user_id in users:
+        tracemalloc.start()
+        fetch(conn, user_id, date_from, date_to)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return statistics.median(latencies), statistics.median(peaks)
+
+def run_benchmark(db_path=None, users=20, date_from='2000-01-01', date_to='2099-12-31', repeat=3):
+    """Compare legacy_report_data with fetch_report_data for the most active users"""
+    conn = database.get_connection(db_path)
+    records = " + ".join(f"{spec['category']}_Records" for spec in ACTIVITY_TABLES.values())
+    active = conn.execute(
+        f"SELECT User_ID, {records} AS Records FROM User_Emission_Totals ORDER BY Records DESC LIMIT ?", (users,)
+    ).fetchall()
+    user_ids = [user_id for user_id, _ in active]
+    for user_id in user_ids:
+        if not same_report(fetch_report_data(conn, user_id, date_from, date_to),
+                           legacy_report_data(conn, user_id, date_from, date_to)):
+            raise AssertionError(f"Report data differs for user {user_id}")
+
+    rows = statistics.mean(count for _, count in active) if active else 0
+    results = {}
+    for name, fetch in [('six queries', legacy_report_data), ('one query', fetch_report_data)]:
+        results[name] = measure(fetch, conn, user_ids, date_from, date_to, repeat)
+    return len(user_ids), rows, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the one-query report fetch against the six-query one")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--users", type=int, default=20, help="number of users (the most active ones)")
+    parser.add_argument("--from", dest="date_from", default='2000-01-01', help="first report date")
+    parser.add_argument("--to", dest="date_to", default='2099-12-31', help="last report date")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per user")
+    args = parser.parse_args()
+
+    count, rows, results = run_benchmark(args.db, args.users, args.date_from, args.date_to, args.repeat)
+    print(f"{count} users, {rows:.0f} activity rows per report on average; results are identical")
+    print(f"{'':12} {'median ms':>10} {'peak KiB':>10}")
+    for name, (latency, peak) in results.items():
+        print(f"{name:12} {latency:10.2f} {peak:10.0f}")
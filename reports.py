@@ -1,15 +1,29 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
-import pandas as pd
+import base64
+import database
 from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from result_cache import ReportCache
+from chart_renderer import ChartRenderer
+from details_table import DetailsTable
+
+# report_data (which brings in pandas) is imported by the methods that use
+# it, and matplotlib by the chart worker, so the tab is built without either
 
 class ReportsFrame(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
+        
+        # Reports already generated, with their charts rendered to PNG
+        self.report_cache = ReportCache()
+        
+        # Charts are drawn on a worker thread (started with the first report);
+        # the report whose charts are being drawn is (job_id, key, versions, data)
+        self.chart_renderer = None
+        self.chart_job = None
+        self.chart_poll = None
+        self.chart_image = None
         self.create_widgets()
         
     def create_widgets(self):
@@ -82,11 +96,8 @@ class ReportsFrame(ttk.Frame):
     def get_users(self):
         """Get list of users for dropdown"""
         try:
-            conn = sqlite3.connect('carbon_emission.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT User_ID, Full_Name FROM User_Profile")
-            users = cursor.fetchall()
-            conn.close()
+            conn = database.get_connection()
+            users = conn.execute("SELECT User_ID, Full_Name FROM User_Profile").fetchall()
             return [f"{user[0]} - {user[1]}" for user in users]
         except Exception as e:
             messagebox.showerror("Database Error", f"Error fetching users: {str(e)}")
@@ -123,16 +134,18 @@ class ReportsFrame(ttk.Frame):
             return
         
         try:
-            # Get user carbon emission data
-            data = self.get_user_emission_data(user_id, date_from, date_to)
+            # Get user carbon emission data and charts, from the cache if this
+            # user's rows have not been written since they were generated
+            # (chart_png is None while the charts are being drawn)
+            data, chart_png = self.get_report(user_id, date_from, date_to)
             
             # Clear existing report content
             self.clear_report_tabs()
             
             # Generate report content
             self.generate_summary_tab(data, user_string)
-            self.generate_charts_tab(data)
-            self.generate_details_tab(data)
+            self.generate_charts_tab(chart_png)
+            self.generate_details_tab(data, user_id, date_from, date_to)
             
             # Switch to summary tab
             self.report_notebook.select(0)
@@ -140,105 +153,75 @@ class ReportsFrame(ttk.Frame):
         except Exception as e:
             messagebox.showerror("Report Error", f"Error generating report: {str(e)}")
     
+    def get_report(self, user_id, date_from, date_to):
+        """Get a report's data dictionary and chart image, from the cache if possible
+        
+        On a cache miss the data is fetched and its charts queued for drawing:
+        the image is None, and the report is cached once the charts arrive.
+        """
+        cache = self.report_cache
+        cache.check_external(database.get_connection())
+        key = (user_id, date_from, date_to)
+        cached = cache.get(key)
+        if cached is not None:
+            self.chart_job = None
+            return cached
+        
+        # Counters are read first, so a write while the report is built leaves it stale
+        cache.miss()
+        versions = cache.versions(user_id)
+        data = self.get_user_emission_data(user_id, date_from, date_to)
+        self.render_charts(key, versions, data)
+        return data, None
+    
+    def render_charts(self, key, versions, data):
+        """Queue a report's charts on the chart worker, replacing any report still waiting"""
+        if self.chart_renderer is None:
+            self.chart_renderer = ChartRenderer()
+        self.chart_job = (self.chart_renderer.submit(data), key, versions, data)
+        if self.chart_poll is None:
+            self.chart_poll = self.after(50, self.poll_charts)
+    
+    def poll_charts(self):
+        """Show and cache the charts of the latest report when the worker has drawn them"""
+        self.chart_poll = None
+        result = self.chart_renderer.poll()
+        while result is not None:
+            if self.chart_job is not None and result['job_id'] == self.chart_job[0]:
+                _, key, versions, data = self.chart_job
+                self.chart_job = None
+                if result['status'] == 'ok':
+                    chart_png = result['png']
+                    self.report_cache.put(key, key[0], versions, (data, chart_png), self.report_size(data, chart_png))
+                self.show_charts(result)
+            result = self.chart_renderer.poll()
+        
+        if self.chart_job is not None:
+            self.chart_poll = self.after(50, self.poll_charts)
+    
+    def show_charts(self, result):
+        """Replace the charts tab's placeholder with the drawn charts (or the error)"""
+        for widget in self.charts_tab.winfo_children():
+            widget.destroy()
+        if result['status'] == 'ok':
+            self.generate_charts_tab(result['png'])
+        else:
+            ttk.Label(self.charts_tab, text=f"Error drawing charts: {result['error']}").pack(pady=20)
+    
+    def report_size(self, data, chart_png):
+        """Estimated memory held by a report's data and chart, in bytes"""
+        size = len(chart_png)
+        for name in ('user', 'transport', 'energy', 'waste', 'industrial', 'offset'):
+            size += int(data[name].memory_usage(deep=True).sum())
+        for series in data['breakdown'].values():
+            size += int(series.memory_usage(deep=True))
+        return size
+    
     def get_user_emission_data(self, user_id, date_from, date_to):
-        """Get carbon emission data for the user"""
-        conn = sqlite3.connect('carbon_emission.db')
-        
-        # Get user profile info
-        df_user = pd.read_sql_query(
-            "SELECT * FROM User_Profile WHERE User_ID = ?", 
-            conn, 
-            params=(user_id,)
-        )
-        
-        # Get transportation data
-        df_transport = pd.read_sql_query(
-            """
-            SELECT t.*, ef.Emission_Per_Unit, 
-                   (t.Distance_KM * ef.Emission_Per_Unit) as Emission_Amount
-            FROM Transportation t
-            LEFT JOIN Emission_Factor ef ON t.Vehicle_Type = ef.Source_Type
-            WHERE t.User_ID = ? AND t.Date BETWEEN ? AND ?
-            """, 
-            conn, 
-            params=(user_id, date_from, date_to)
-        )
-        
-        # Get energy consumption data
-        df_energy = pd.read_sql_query(
-            """
-            SELECT ec.*, ef.Emission_Per_Unit,
-                   (ec.Consumption_KWH * ef.Emission_Per_Unit) as Emission_Amount
-            FROM Energy_Consumption ec
-            LEFT JOIN Emission_Factor ef ON ec.Energy_Source = ef.Source_Type
-            WHERE ec.User_ID = ? AND ec.Date BETWEEN ? AND ?
-            """, 
-            conn, 
-            params=(user_id, date_from, date_to)
-        )
-        
-        # Get waste management data
-        df_waste = pd.read_sql_query(
-            """
-            SELECT wm.*, ef.Emission_Per_Unit,
-                   (wm.Waste_Weight_KG * ef.Emission_Per_Unit) as Emission_Amount
-            FROM Waste_Management wm
-            LEFT JOIN Emission_Factor ef ON 'Waste' = ef.Source_Type
-            WHERE wm.User_ID = ? AND wm.Date BETWEEN ? AND ?
-            """, 
-            conn, 
-            params=(user_id, date_from, date_to)
-        )
-        
-        # Get industrial activity data
-        df_industrial = pd.read_sql_query(
-            """
-            SELECT * FROM Industrial_Activity
-            WHERE User_ID = ? AND Date BETWEEN ? AND ?
-            """, 
-            conn, 
-            params=(user_id, date_from, date_to)
-        )
-        
-        # Get carbon offset data
-        df_offset = pd.read_sql_query(
-            """
-            SELECT * FROM Carbon_Offset
-            WHERE User_ID = ? AND Date BETWEEN ? AND ?
-            """, 
-            conn, 
-            params=(user_id, date_from, date_to)
-        )
-        
-        # Calculate summary totals
-        transport_emissions = df_transport['Emission_Amount'].sum() if not df_transport.empty else 0
-        energy_emissions = df_energy['Emission_Amount'].sum() if not df_energy.empty else 0
-        waste_emissions = df_waste['Emission_Amount'].sum() if not df_waste.empty else 0
-        industrial_emissions = df_industrial['Emission_Produced'].sum() if not df_industrial.empty else 0
-        total_emissions = transport_emissions + energy_emissions + waste_emissions + industrial_emissions
-        total_offset = df_offset['Offset_Amount'].sum() if not df_offset.empty else 0
-        net_emissions = total_emissions - total_offset
-        
-        conn.close()
-        
-        # Return all data in a dictionary
-        return {
-            'user': df_user,
-            'transport': df_transport,
-            'energy': df_energy,
-            'waste': df_waste,
-            'industrial': df_industrial,
-            'offset': df_offset,
-            'summary': {
-                'transport_emissions': transport_emissions,
-                'energy_emissions': energy_emissions,
-                'waste_emissions': waste_emissions,
-                'industrial_emissions': industrial_emissions,
-                'total_emissions': total_emissions,
-                'total_offset': total_offset,
-                'net_emissions': net_emissions
-            }
-        }
+        """Get carbon emission data for the user (one query, see report_data.py)"""
+        from archive import connection_for
+        from report_data import fetch_report_data
+        return fetch_report_data(connection_for(date_from, date_to), user_id, date_from, date_to)
     
     def clear_report_tabs(self):
         """Clear all content from report tabs"""
@@ -322,133 +305,30 @@ class ReportsFrame(ttk.Frame):
     
     def generate_recommendations(self, summary):
         """Generate recommendations based on emissions data"""
-        recommendations = []
-        
-        # Check which category has highest emissions
-        emissions = {
-            'Transportation': summary['transport_emissions'],
-            'Energy Consumption': summary['energy_emissions'],
-            'Waste Management': summary['waste_emissions'],
-            'Industrial Activity': summary['industrial_emissions']
-        }
-        
-        highest_category = max(emissions, key=emissions.get)
-        
-        # General recommendation
-        recommendations.append(f"Your highest emissions come from {highest_category}. Focus on reducing this area first.")
-        
-        # Category-specific recommendations
-        if highest_category == 'Transportation':
-            recommendations.append("Consider using public transportation, carpooling, or switching to electric vehicles.")
-            recommendations.append("Reduce unnecessary travel and combine trips when possible.")
-            
-        elif highest_category == 'Energy Consumption':
-            recommendations.append("Switch to energy-efficient appliances and LED lighting.")
-            recommendations.append("Consider renewable energy sources like solar panels.")
-            recommendations.append("Improve insulation to reduce heating and cooling needs.")
-            
-        elif highest_category == 'Waste Management':
-            recommendations.append("Practice recycling and composting to reduce landfill waste.")
-            recommendations.append("Choose products with minimal packaging.")
-            recommendations.append("Donate or repurpose items instead of disposing them.")
-            
-        elif highest_category == 'Industrial Activity':
-            recommendations.append("Implement more efficient industrial processes.")
-            recommendations.append("Consider cleaner energy sources for industrial operations.")
-            recommendations.append("Invest in carbon capture technologies.")
-        
-        # Carbon offset recommendations
-        if summary['total_offset'] < summary['total_emissions'] * 0.1:
-            recommendations.append("Consider increasing your carbon offset contributions through tree planting or renewable energy credits.")
-        
-        return "\n• ".join([""] + recommendations)
+        from report_data import recommendations
+        return "\n• ".join([""] + recommendations(summary))
     
-    def generate_charts_tab(self, data):
-        """Generate charts for visual representation"""
-        summary = data['summary']
-        
+    def generate_charts_tab(self, chart_png):
+        """Show the rendered charts, or a placeholder while they are being drawn"""
         # Create charts frame
         charts_frame = ttk.Frame(self.charts_tab)
         charts_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Create a figure with subplots
-        fig = plt.Figure(figsize=(10, 8), dpi=100)
-        
-        # Emissions breakdown pie chart
-        ax1 = fig.add_subplot(221)
-        emissions = [
-            summary['transport_emissions'],
-            summary['energy_emissions'],
-            summary['waste_emissions'],
-            summary['industrial_emissions']
-        ]
-        labels = ['Transportation', 'Energy', 'Waste', 'Industrial']
-        
-        # Filter out zero values for better visualization
-        filtered_emissions = []
-        filtered_labels = []
-        for e, l in zip(emissions, labels):
-            if e > 0:
-                filtered_emissions.append(e)
-                filtered_labels.append(l)
-        
-        if filtered_emissions:
-            ax1.pie(filtered_emissions, labels=filtered_labels, autopct='%1.1f%%')
-            ax1.set_title('Emissions by Source')
-        else:
-            ax1.text(0.5, 0.5, 'No emissions data available', ha='center', va='center')
-            ax1.set_title('Emissions by Source')
-        
-        # Emissions vs Offset bar chart
-        ax2 = fig.add_subplot(222)
-        categories = ['Total Emissions', 'Carbon Offset', 'Net Emissions']
-        values = [summary['total_emissions'], summary['total_offset'], summary['net_emissions']]
-        bars = ax2.bar(categories, values, color=['red', 'green', 'blue'])
-        ax2.set_title('Emissions vs Offset')
-        ax2.tick_params(axis='x', rotation=15)
-        
-        # Add data labels
-        for bar in bars:
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{height:.1f}',
-                    ha='center', va='bottom')
-        
-        # Additional charts based on available detailed data
-        
-        # Transportation by vehicle type (if available)
-        ax3 = fig.add_subplot(223)
-        if not data['transport'].empty:
-            transport_by_type = data['transport'].groupby('Vehicle_Type')['Distance_KM'].sum()
-            transport_by_type.plot(kind='bar', ax=ax3)
-            ax3.set_title('Transportation by Vehicle Type')
-            ax3.set_ylabel('Distance (km)')
-            plt.tight_layout()
-        else:
-            ax3.text(0.5, 0.5, 'No transportation data available', ha='center', va='center')
-            ax3.set_title('Transportation by Vehicle Type')
-        
-        # Energy by source type (if available)
-        ax4 = fig.add_subplot(224)
-        if not data['energy'].empty:
-            energy_by_source = data['energy'].groupby('Energy_Source')['Consumption_KWH'].sum()
-            energy_by_source.plot(kind='bar', ax=ax4)
-            ax4.set_title('Energy by Source')
-            ax4.set_ylabel('Consumption (kWh)')
-        else:
-            ax4.text(0.5, 0.5, 'No energy data available', ha='center', va='center')
-            ax4.set_title('Energy by Source')
-        
-        # Adjust layout
-        fig.tight_layout()
+        if chart_png is None:
+            ttk.Label(charts_frame, text="Drawing charts...", font=('Arial', 12)).pack(pady=20)
+            return
         
-        # Create canvas and add to frame
-        canvas = FigureCanvasTkAgg(fig, master=charts_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # One photo image is reused for every report, so Tk holds a single chart bitmap
+        if self.chart_image is None:
+            self.chart_image = tk.PhotoImage()
+        self.chart_image.configure(data=base64.b64encode(chart_png))
+        chart_label = ttk.Label(charts_frame, image=self.chart_image)
+        chart_label.pack(fill=tk.BOTH, expand=True)
     
-    def generate_details_tab(self, data):
+    def generate_details_tab(self, data, user_id, date_from, date_to):
         """Generate detailed data tables"""
+        from report_data import DetailsSource
+        
         # Create notebook for data categories
         details_notebook = ttk.Notebook(self.details_tab)
         details_notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -466,71 +346,18 @@ class ReportsFrame(ttk.Frame):
         details_notebook.add(industrial_tab, text="Industrial")
         details_notebook.add(offset_tab, text="Carbon Offset")
         
-        # Add data tables to each tab
-        self.create_data_table(transport_tab, data['transport'], ['Transport_ID', 'Vehicle_Type', 'Distance_KM', 'Date', 'Emission_Amount'])
-        self.create_data_table(energy_tab, data['energy'], ['Energy_ID', 'Energy_Source', 'Consumption_KWH', 'Date', 'Emission_Amount'])
-        self.create_data_table(waste_tab, data['waste'], ['Waste_ID', 'Waste_Type', 'Waste_Weight_KG', 'Date', 'Emission_Amount'])
-        self.create_data_table(industrial_tab, data['industrial'], ['Industry_ID', 'Activity_Type', 'Emission_Produced', 'Date'])
-        self.create_data_table(offset_tab, data['offset'], ['Offset_ID', 'Offset_Type', 'Offset_Amount', 'Date'])
+        # Add data tables to each tab (columns per category in report_data.DETAILS_COLUMNS)
+        for tab, key in [(transport_tab, 'transport'), (energy_tab, 'energy'), (waste_tab, 'waste'),
+                         (industrial_tab, 'industrial'), (offset_tab, 'offset')]:
+            self.create_data_table(tab, DetailsSource(key, data[key], user_id, date_from, date_to))
     
-    def create_data_table(self, parent, df, columns):
-        """Create a treeview to display dataframe"""
-        if df.empty:
+    def create_data_table(self, parent, source):
+        """Create a paged, sortable table of a category's rows"""
+        if source.frame.empty:
             ttk.Label(parent, text="No data available for this category").pack(pady=20)
             return
         
-        # Keep only columns we want to display
-        display_columns = [col for col in columns if col in df.columns]
-        
-        # Create frame with scrollbars
-        frame = ttk.Frame(parent)
-        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # Scrollbars
-        vsb = ttk.Scrollbar(frame, orient="vertical")
-        hsb = ttk.Scrollbar(frame, orient="horizontal")
-        
-        # Treeview
-        tree = ttk.Treeview(frame, columns=display_columns, show='headings',
-                           yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        # Configure scrollbars
-        vsb.config(command=tree.yview)
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        hsb.config(command=tree.xview)
-        hsb.pack(side=tk.BOTTOM, fill=tk.X)
-        
-        tree.pack(fill=tk.BOTH, expand=True)
-        
-        # Set column headings and formats
-        for col in display_columns:
-            tree.heading(col, text=col.replace('_', ' '))
-            
-            # Adjust column width based on content
-            if 'Date' in col:
-                tree.column(col, width=100, anchor='center')
-            elif 'ID' in col:
-                tree.column(col, width=80, anchor='center')
-            elif any(x in col for x in ['Amount', 'KWH', 'KM', 'KG']):
-                tree.column(col, width=120, anchor='e')
-            else:
-                tree.column(col, width=150, anchor='w')
-        
-        # Add data rows
-        for i, row in df.iterrows():
-            values = []
-            for col in display_columns:
-                val = row[col] if col in row else ""
-                
-                # Format numeric values
-                if isinstance(val, (int, float)):
-                    if col in ['Distance_KM', 'Consumption_KWH', 'Waste_Weight_KG', 'Emission_Amount', 'Emission_Produced', 'Offset_Amount']:
-                        val = f"{val:.2f}"
-                
-                values.append(val)
-            
-            tree.insert("", tk.END, values=values)
+        DetailsTable(parent, source).pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
     
     def refresh_users(self, show_message=False):
         """Refresh the user dropdown list"""
@@ -0,0 +1,182 @@
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+import database
+from emission_engine import SQL_FUNCTIONS, FACTOR_TABLE
+
+# Total size of the cached results, and the largest result worth caching.
+# Sizes are estimates of the Python objects holding the rows.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+
+# Functions whose result changes from one run to the next. The date and time
+# functions only do so when given 'now', which is checked in the SQL text.
+VOLATILE_FUNCTIONS = {'random', 'randomblob', 'changes', 'total_changes', 'last_insert_rowid'}
+TIME_FUNCTIONS = {'date', 'time', 'datetime', 'julianday', 'strftime', 'unixepoch', 'timediff'}
+
+# String literals and quoted identifiers are kept as they are when normalising
+_SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])|(\s+)""")
+
+def normalize_sql(sql):
+    """SQL text with comments dropped and whitespace outside literals collapsed"""
+    statements = database.split_statements(sql)
+    return ";\n".join(
+        _SQL_TOKENS.sub(lambda m: m.group(1) or ' ', statement).strip() for statement in statements
+    )
+
+def rows_size(rows):
+    """Estimated memory held by a list of result rows, in bytes"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+    return size
+
+class ResultCache:
+    """LRU cache of query results, bounded by their estimated size in bytes
+
+    Entries are keyed by normalised SQL and parameters. Each one remembers
+    what it depends on (the tables the query reads) and their write counters
+    from database.py at the time it was run; an entry whose counters have
+    moved on is stale and dropped on lookup. Writes made by other processes are not counted, so
+    check_external() clears the whole cache when PRAGMA data_version shows
+    a commit by another connection.
+    """
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=DEFAULT_MAX_ENTRY_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, sql, params=()):
+        """Cache key of a query"""
+        return (normalize_sql(sql), tuple(params))
+
+    def cacheable_tables(self, sql):
+        """The tables a query reads if its result can be cached, else None
+
+        Only queries made of read-only statements with repeatable results are
+        cached. The statements are compiled (not run) to find the tables.
+        """
+        tables = set()
+        for statement in database.split_statements(sql):
+            try:
+                access = database.statement_access(statement, self.db_path)
+            except sqlite3.Error:
+                return None
+            if access['writes'] or access['schema'] or access['functions'] & VOLATILE_FUNCTIONS:
+                return None
+            if access['functions'] & TIME_FUNCTIONS and 'now' in statement.lower():
+                return None
+            tables |= access['reads']
+            # emission() and emission_factor() read Emission_Factor behind SQLite's back
+            if access['functions'] & set(SQL_FUNCTIONS):
+                tables.add(FACTOR_TABLE)
+        return tables
+
+    def check_external(self, conn):
+        """Clear the cache if another connection has committed since the last check
+
+        data_version changes when any other connection commits, in this
+        process or another, and does not say which tables were written, so
+        every change clears the cache. Commits by other connections of this
+        process were recorded too and would only have dropped the entries
+        they concern, but they cannot be told apart from a commit by another
+        process made at the same time.
+        """
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if self._data_version is not None and data_version != self._data_version:
+                self._clear()
+            self._data_version = data_version
+
+    def versions(self, tables):
+        """Current write counters of what an entry depends on: here, a set of tables"""
+        return database.write_versions(tables, self.db_path)
+
+    def get(self, key):
+        """The cached value, e.g. (columns, rows) of a query, or None if absent or stale
+
+        Only hits are counted here: whether a miss counts depends on whether
+        the query can be cached at all, so the caller reports it with miss().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['versions'] != self.versions(entry['depends']):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+
+    def miss(self):
+        """Count a lookup of a cacheable query that was not in the cache"""
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, depends, versions, value, size):
+        """Store a value computed while the write counters of what it depends on were `versions`
+
+        Returns False if the value (of `size` bytes) is too large to cache.
+        """
+        if size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {'depends': depends, 'versions': versions, 'value': value, 'size': size}
+            self._bytes += size
+            # Evict least recently used entries until the cache fits again
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """Hit/miss counters and the current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+    def _remove(self, key):
+        """Drop one entry (the lock must be held)"""
+        self._bytes -= self._entries.pop(key)['size']
+
+    def _clear(self):
+        """Drop every entry (the lock must be held)"""
+        self._entries.clear()
+        self._bytes = 0
+
+class ReportCache(ResultCache):
+    """Cache of generated reports, keyed by (user_id, date_from, date_to)
+
+    An entry depends on its user: it stays valid until a write is recorded
+    for that user's rows, or one whose users are not known (e.g. an UPDATE
+    run from the Query Database tab). Writes for other users leave it alone.
+    """
+
+    def versions(self, user_id):
+        """Current write counters that concern a user's rows"""
+        return database.user_write_versions(user_id, self.db_path)
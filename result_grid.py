@@ -0,0 +1,135 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Rows requested per page, and the most rows kept in the Treeview at once.
+# Rows scrolled further than the window are dropped and fetched again if the
+# user scrolls back to them.
+PAGE_SIZE = 500
+WINDOW_SIZE = 5000
+
+class ResultGrid(ttk.Frame):
+    """Treeview showing a bounded window over a result set fetched page by page
+
+    The grid never holds the whole result. When the user scrolls near either
+    edge of the window it calls request_rows(offset, limit); the owner fetches
+    those rows (usually on a worker thread) and hands them back with
+    add_rows(). Rows beyond WINDOW_SIZE on the far side are dropped.
+    """
+
+    def __init__(self, parent, request_rows=None, page_size=PAGE_SIZE, window_size=WINDOW_SIZE):
+        super().__init__(parent)
+        self.request_rows = request_rows
+        self.page_size = page_size
+        self.window_size = window_size
+
+        # Scrollbars for the Treeview
+        self.vsb = ttk.Scrollbar(self, orient="vertical")
+        hsb = ttk.Scrollbar(self, orient="horizontal")
+
+        # Results Treeview
+        self.tree = ttk.Treeview(self, yscrollcommand=self.on_scroll, xscrollcommand=hsb.set)
+
+        # Configure scrollbars
+        self.vsb.config(command=self.tree.yview)
+        hsb.config(command=self.tree.xview)
+
+        # Place the Treeview and scrollbars
+        self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        hsb.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.reset_window()
+
+    def reset_window(self):
+        """Forget the current window position"""
+        self.window_start = 0
+        self.window_end = 0
+        self.total = None
+        self.pending = False
+
+    def show(self, columns, rows, exhausted):
+        """Display the first page of a new result"""
+        self.clear()
+
+        # Configure columns
+        self.tree["columns"] = list(columns)
+
+        # Format column headings
+        self.tree.column("#0", width=0, stretch=False)
+        for col in columns:
+            self.tree.column(col, anchor=tk.W, width=100)
+            self.tree.heading(col, text=col, anchor=tk.W)
+
+        self.add_rows(0, rows, exhausted)
+
+    def set_total(self, total):
+        """Record the total row count once it is known"""
+        self.total = total
+
+    def add_rows(self, offset, rows, exhausted):
+        """Add rows [offset, offset + len(rows)) next to the current window"""
+        self.pending = False
+        if exhausted:
+            self.total = offset + len(rows)
+        if not rows:
+            return
+
+        first, _ = self.tree.yview()
+        first_visible = first * (self.window_end - self.window_start)
+
+        if offset == self.window_end:
+            # Rows after the window: append, then drop rows from the top
+            for i, row in enumerate(rows, start=offset):
+                self.tree.insert("", tk.END, text=str(i), values=row)
+            self.window_end += len(rows)
+            dropped = self.trim(from_top=True)
+            first_visible -= dropped
+        elif offset + len(rows) == self.window_start:
+            # Rows before the window: prepend, then drop rows from the bottom
+            for i, row in enumerate(rows, start=offset):
+                self.tree.insert("", i - offset, text=str(i), values=row)
+            self.window_start = offset
+            self.trim(from_top=False)
+            first_visible += len(rows)
+        else:
+            # A stale page (e.g. for an earlier scroll position); ignore it
+            return
+
+        # Keep the same rows in view after items were added or dropped
+        if self.window_end > self.window_start:
+            self.tree.yview_moveto(max(first_visible, 0) / (self.window_end - self.window_start))
+
+    def trim(self, from_top):
+        """Drop rows beyond the window size; return how many were dropped"""
+        excess = (self.window_end - self.window_start) - self.window_size
+        if excess <= 0:
+            return 0
+
+        children = self.tree.get_children()
+        if from_top:
+            self.tree.delete(*children[:excess])
+            self.window_start += excess
+        else:
+            self.tree.delete(*children[-excess:])
+            self.window_end -= excess
+        return excess
+
+    def on_scroll(self, first, last):
+        """Scroll callback: update the scrollbar and fetch rows near the edges"""
+        self.vsb.set(first, last)
+        if self.pending or self.request_rows is None:
+            return
+
+        if float(last) > 0.9 and (self.total is None or self.window_end < self.total):
+            self.pending = True
+            self.request_rows(self.window_end, self.page_size)
+        elif float(first) < 0.1 and self.window_start > 0:
+            start = max(self.window_start - self.page_size, 0)
+            self.pending = True
+            self.request_rows(start, self.window_start - start)
+
+    def clear(self):
+        """Clear the rows and columns"""
+        self.tree.delete(*self.tree.get_children())
+        self.tree["columns"] = []
+        self.reset_window()
@@ -0,0 +1,186 @@
+import argparse
+import time
+import numpy as np
+import database
+from validation import VOCABULARIES
+from carbon_emission_db import ACTIVITY_TABLES, setup_database, insert_reference_data, dimension_codes
+
+# Rows generated and inserted per executemany call. Part of the output's
+# definition: the same seed and chunk size always give the same database.
+CHUNK_SIZE = 200000
+
+# For every subtype value: its relative frequency and the median quantity of
+# one record. Quantities are log-normal around the median with the table's sigma.
+DISTRIBUTIONS = {
+    'Vehicle_Type': {
+        'sigma': 0.8,
+        'Car': (0.40, 25.0), 'Bus': (0.14, 12.0), 'Train': (0.10, 45.0), 'Airplane': (0.03, 1200.0),
+        'Bicycle': (0.09, 6.0), 'Electric Car': (0.10, 25.0), 'Motorcycle': (0.05, 15.0), 'Walking': (0.09, 2.5)
+    },
+    'Energy_Source': {
+        'sigma': 0.5,
+        'Electricity': (0.50, 320.0), 'Natural Gas': (0.22, 210.0), 'Solar': (0.10, 150.0), 'Wind': (0.06, 110.0),
+        'Coal': (0.04, 420.0), 'Biomass': (0.04, 130.0), 'Geothermal': (0.04, 100.0)
+    },
+    'Waste_Type': {
+        'sigma': 0.6,
+        'Plastic': (0.22, 4.0), 'Paper': (0.22, 3.5), 'Glass': (0.12, 4.5), 'Metal': (0.08, 2.5),
+        'Organic': (0.26, 7.5), 'Electronic': (0.05, 1.5), 'Hazardous': (0.05, 1.0)
+    },
+    'Activity_Type': {
+        'sigma': 0.5,
+        'Manufacturing': (0.28, 520.0), 'Construction': (0.20, 740.0), 'Chemical Processing': (0.12, 810.0),
+        'Food Processing': (0.14, 360.0), 'Textile Production': (0.10, 420.0), 'Mining': (0.08, 950.0),
+        'Agriculture': (0.08, 300.0)
+    },
+    'Offset_Type': {
+        'sigma': 0.5,
+        'Tree Planting': (0.35, 50.0), 'Renewable Energy Credits': (0.30, 110.0), 'Methane Capture': (0.12, 80.0),
+        'Carbon Sequestration': (0.10, 150.0), 'Energy Efficiency': (0.13, 60.0)
+    }
+}
+
+# User locations, weighted roughly by population
+LOCATIONS = {
+    'New York': 8.3, 'Los Angeles': 3.9, 'Chicago': 2.7, 'Houston': 2.3, 'Phoenix': 1.6,
+    'Philadelphia': 1.6, 'San Antonio': 1.5, 'San Diego': 1.4, 'Dallas': 1.3, 'Austin': 1.0,
+    'San Jose': 1.0, 'Seattle': 0.75, 'Denver': 0.71, 'Boston': 0.67, 'Atlanta': 0.5,
+    'Miami': 0.44, 'Portland': 0.65, 'Minneapolis': 0.43, 'Detroit': 0.63, 'Nashville': 0.69
+}
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Daniel', 'Karen',
+    'Wei', 'Priya', 'Carlos', 'Aisha', 'Mohammed', 'Yuki', 'Olga', 'Luis', 'Fatima', 'Noah'
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Chen', 'Patel', 'Nguyen', 'Kim', 'Khan', 'Singh', 'Ivanova', 'Tanaka', 'Cohen', 'Silva'
+]
+
+# Sustainability programs a user may be enrolled in, and the chance of each enrolment
+PROGRAM_COUNT = 5
+ENROLMENT_RATE = 0.2
+
+def weights(values):
+    """Normalise a list of relative frequencies into probabilities"""
+    values = np.asarray(values, dtype=float)
+    return values / values.sum()
+
+def date_strings(rng, size, start, end):
+    """Uniformly distributed 'YYYY-MM-DD' dates in [start, end]"""
+    first = np.datetime64(start, 'D')
+    span = (np.datetime64(end, 'D') - first).astype(int)
+    return np.datetime_as_string(first + rng.integers(0, span + 1, size), unit='D')
+
+def chunks(total):
+    """Sizes of the CHUNK_SIZE chunks making up `total` rows"""
+    for start in range(0, total, CHUNK_SIZE):
+        yield min(CHUNK_SIZE, total - start)
+
+def insert_users(cursor, rng, count, start, end):
+    """Insert `count` users with random names and locations and some program enrolments"""
+    cities = np.array(list(LOCATIONS), dtype=object)
+    city_p = weights(list(LOCATIONS.values()))
+    first_names = np.array(FIRST_NAMES, dtype=object)
+    last_names = np.array(LAST_NAMES, dtype=object)
+
+    user_id = 0
+    for size in chunks(count):
+        ids = np.arange(user_id + 1, user_id + size + 1)
+        first = first_names[rng.integers(0, len(FIRST_NAMES), size)]
+        last = last_names[rng.integers(0, len(LAST_NAMES), size)]
+        locations = cities[rng.choice(len(cities), size, p=city_p)]
+
+        names = first + ' ' + last
+        emails = [f"{f.lower()}.{l.lower()}{i}@example.com" for f, l, i in zip(first, last, ids.tolist())]
+        cursor.executemany(
+            "INSERT INTO User_Profile (User_ID, Full_Name, Email, Location) VALUES (?, ?, ?, ?)",
+            zip(ids.tolist(), names.tolist(), emails, locations.tolist())
+        )
+
+        # Enrolments: each (user, program) pair independently with ENROLMENT_RATE
+        users, programs = np.nonzero(rng.random((size, PROGRAM_COUNT)) < ENROLMENT_RATE)
+        cursor.executemany(
+            "INSERT INTO User_Program (User_ID, Program_ID, Enrollment_Date) VALUES (?, ?, ?)",
+            zip(ids[users].tolist(), (programs + 1).tolist(), date_strings(rng, len(users), start, end).tolist())
+        )
+        cursor.connection.commit()
+        user_id += size
+
+def insert_activity(cursor, rng, table, count, user_p, start, end):
+    """Insert `count` random rows into an activity table
+
+    Rows go straight into the table's data table, each subtype as the code
+    its dimension table gives it.
+    """
+    spec = ACTIVITY_TABLES[table]
+    subtype, quantity = spec['subtype'], spec['quantity']
+    distribution = DISTRIBUTIONS[subtype]
+    vocabulary = VOCABULARIES[subtype]
+
+    known = dimension_codes(cursor, spec)
+    values = np.array([known[value] for value in vocabulary])
+    value_p = weights([distribution[value][0] for value in vocabulary])
+    medians = np.array([distribution[value][1] for value in vocabulary])
+
+    sql = f"INSERT INTO {spec['data']} (User_ID, {spec['code']}, {quantity}, Date) VALUES (?, ?, ?, ?)"
+    for size in chunks(count):
+        users = rng.choice(len(user_p), size, p=user_p) + 1
+        codes = rng.choice(len(values), size, p=value_p)
+        amounts = np.round(medians[codes] * rng.lognormal(0.0, distribution['sigma'], size), 2)
+        dates = date_strings(rng, size, start, end)
+
+        cursor.executemany(sql, zip(users.tolist(), values[codes].tolist(), amounts.tolist(), dates.tolist()))
+        cursor.connection.commit()
+
+def populate(cursor, users, records, seed, start, end, progress=None):
+    """Fill an empty database with reference data, `users` users and `records` rows per activity table"""
+    insert_reference_data(cursor)
+
+    # Independent streams per table, so changing one table's size does not
+    # change the data generated for the others
+    streams = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(ACTIVITY_TABLES) + 2)]
+
+    insert_users(cursor, streams[0], users, start, end)
+    if progress:
+        progress('User_Profile', users)
+
+    # Some users are far more active than others
+    activity = streams[1].lognormal(0.0, 1.0, users)
+    user_p = activity / activity.sum()
+
+    for rng, table in zip(streams[2:], ACTIVITY_TABLES):
+        insert_activity(cursor, rng, table, records, user_p, start, end)
+        if progress:
+            progress(table, records)
+
+def generate_database(db_path=None, users=1000, records=10000, seed=0,
+                      start='2022-01-01', end='2024-12-31', progress=None):
+    """Recreate the database filled with deterministic synthetic data
+
+    The derived tables, triggers and indexes are built once the raw rows are
+    loaded, exactly as for the demo database.
+    """
+    if users < 1:
+        raise ValueError("At least one user is needed")
+    setup_database(db_path, populate=lambda cursor: populate(cursor, users, records, seed, start, end, progress))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recreate the database with deterministic synthetic data")
+    parser.add_argument("--db", help="database file (default: %s)" % database.get_database_path())
+    parser.add_argument("--users", type=int, default=1000, help="number of users")
+    parser.add_argument("--records", type=int, default=10000, help="rows per activity table")
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed gives the same data")
+    parser.add_argument("--start", default='2022-01-01', help="first activity date")
+    parser.add_argument("--end", default='2024-12-31', help="last activity date")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate_database(
+        args.db, args.users, args.records, args.seed, args.start, args.end,
+        progress=lambda table, rows: print(f"{table}: {rows:,} rows ({time.perf_counter() - started:.1f} s)", flush=True)
+    )
+    total = args.users + args.records * len(ACTIVITY_TABLES)
+    print(f"Generated {total:,} rows in {time.perf_counter() - started:.1f} s")
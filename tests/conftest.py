@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# The tables the triggers keep in step with the activity tables, and the
+# columns that identify a row of each (Emission_Record's own ids depend on
+# the order its rows were written in)
+DERIVED_TABLES = {
+    'User_Emission_Totals': None,
+    'Monthly_Rollup': None,
+    'Emission_Record': ('Factor_ID', 'Source_Type', 'Source_ID', 'Emission_Amount', 'Date', 'Category', 'User_ID')
+}
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A database file of its own, made the default one for the test"""
+    path = str(tmp_path / 'carbon_emission.db')
+    previous = database.get_database_path()
+    database.set_database_path(path)
+    yield path
+    database.set_database_path(previous)
+
+@pytest.fixture
+def derived_rows():
+    """Function returning the rows of every derived table, sorted and rounded"""
+    def rows(conn):
+        result = {}
+        for table, columns in DERIVED_TABLES.items():
+            columns = columns or [info[1] for info in conn.execute(f"PRAGMA table_info({table})")]
+            select = ", ".join(columns)
+            result[table] = [
+                tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                for row in conn.execute(f"SELECT {select} FROM {table} ORDER BY {select}")
+            ]
+        return result
+    return rows
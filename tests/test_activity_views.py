@@ -0,0 +1,30 @@
+import time
+
+import database
+from carbon_emission_db import setup_database
+from cli import run_sql
+from query_runner import QueryRunner
+
+def test_writes_through_the_views_are_counted(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+
+    assert run_sql(conn, "INSERT INTO Transportation (User_ID, Vehicle_Type, Distance_KM, Date) "
+                         "VALUES (1, 'Hovercraft', 12.5, '2023-04-01'), (2, 'Car', 3.0, '2023-04-02')") == (0, 2)
+    assert run_sql(conn, "UPDATE Transportation SET Distance_KM = Distance_KM + 1 WHERE User_ID = 1") == (0, 3)
+    assert run_sql(conn, "DELETE FROM Transportation WHERE Vehicle_Type = 'Hovercraft'") == (0, 1)
+    # Tables that are not views are counted by SQLite itself, once
+    assert run_sql(conn, "UPDATE User_Profile SET Location = 'Boston' WHERE User_ID <= 2") == (0, 2)
+    assert run_sql(conn, "UPDATE Transportation_Data SET Distance_KM = 1 WHERE User_ID = 2") == (0, 3)
+
+def test_query_runner_reports_rows_written_through_the_views(db_path):
+    setup_database(db_path)
+    runner = QueryRunner(db_path)
+    runner.submit("DELETE FROM Energy_Consumption WHERE User_ID = 1", "delete")
+    result = None
+    deadline = time.monotonic() + 10
+    while result is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+        result = runner.poll()
+    assert result['status'] == 'ok'
+    assert result['rowcount'] == 2
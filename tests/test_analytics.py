@@ -0,0 +1,28 @@
+import pytest
+
+import database
+from analytics import NAMED_AGGREGATES, export_snapshot, named_aggregate, open_snapshot, same_rows
+from predefined_queries import predefined_queries
+from synthetic_data import generate_database
+
+def test_snapshot_aggregates_match_the_sql(db_path):
+    generate_database(db_path, users=25, records=600, seed=5, start='2022-06-01', end='2023-09-30')
+    conn = database.get_connection(db_path)
+    export_snapshot(db_path)
+
+    snapshot = open_snapshot(db_path)
+    for name in NAMED_AGGREGATES:
+        rows = conn.execute(predefined_queries[name]).fetchall()
+        assert len(rows) > 1 and same_rows(named_aggregate(snapshot, name), rows), name
+
+    # A write, recorded as the app's writers do, leaves the snapshot stale until it is exported again
+    insert = ("INSERT INTO Energy_Consumption (User_ID, Energy_Source, Consumption_KWH, Date) "
+              "VALUES (3, 'Solar', 250.0, '2023-09-30')")
+    with conn:
+        conn.execute(insert)
+    database.record_statement_writes(insert, db_path, [3])
+    with pytest.raises(ValueError, match="out of date"):
+        open_snapshot(db_path)
+    snapshot = open_snapshot(db_path, refresh=True)
+    name = "Energy Source Distribution"
+    assert same_rows(named_aggregate(snapshot, name), conn.execute(predefined_queries[name]).fetchall())
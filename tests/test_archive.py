@@ -0,0 +1,90 @@
+import os
+import time
+
+import database
+from archive import archive_rows, archive_status, connection_for
+from carbon_emission_db import ACTIVITY_TABLES
+from query_runner import QueryRunner
+from report_data import fetch_report_data, same_report
+from synthetic_data import generate_database
+
+DATES = ('2000-01-01', '2099-12-31')
+
+def activity(conn):
+    """Every activity row of every table, in id order"""
+    return {
+        table: conn.execute(
+            f"SELECT {spec['id']}, User_ID, {spec['subtype']}, {spec['quantity']}, Date FROM {table} ORDER BY 1"
+        ).fetchall()
+        for table, spec in ACTIVITY_TABLES.items()
+    }
+
+def monthly_totals(conn):
+    """Monthly_Rollup summed per (user, category, subtype, month), which has a row per file holding the month"""
+    return [
+        tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+        for row in conn.execute(
+            "SELECT User_ID, Category, Subtype, Month, SUM(Record_Count), SUM(Quantity), SUM(Emissions) "
+            "FROM Monthly_Rollup GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4"
+        )
+    ]
+
+def test_archive_round_trip(db_path, derived_rows):
+    generate_database(db_path, users=20, records=500, seed=1, start='2022-01-01', end='2024-12-31')
+    conn = database.get_connection(db_path)
+    users = [user_id for (user_id,) in conn.execute("SELECT User_ID FROM User_Profile ORDER BY User_ID")]
+    rows = activity(conn)
+    reports = {user_id: fetch_report_data(conn, user_id, *DATES) for user_id in users}
+    derived = derived_rows(conn)
+    months = monthly_totals(conn)
+
+    moved = archive_rows('2024-01-01', db_path, chunk_rows=100)
+    assert moved > 0
+    assert [year for year, _, _ in archive_status(db_path)] == [2022, 2023]
+    assert all(os.path.exists(database.database_file(db_path)[:-3] + f"_{year}.db") for year in (2022, 2023))
+
+    # The main file keeps only the newest row of each table before the cutoff
+    for table in ACTIVITY_TABLES:
+        older = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE Date < '2024-01-01'").fetchone()[0]
+        assert older <= 1
+
+    # Read through the archives, everything is as it was
+    reader = connection_for(*DATES, db_path=db_path)
+    assert reader is not conn
+    assert activity(reader) == rows
+    assert monthly_totals(reader) == months
+    for table, table_rows in derived_rows(reader).items():
+        if table != 'Monthly_Rollup':
+            assert table_rows == derived[table]
+    for user_id in users:
+        assert same_report(fetch_report_data(reader, user_id, *DATES), reports[user_id])
+
+    # A date range after the cutoff is read from the main file alone
+    assert connection_for('2024-01-01', '2024-12-31', db_path) is conn
+
+    # Archiving again moves nothing
+    assert archive_rows('2024-01-01', db_path) == 0
+
+def test_query_runner_reads_the_archives_when_asked(db_path):
+    generate_database(db_path, users=5, records=200, seed=2, start='2022-01-01', end='2024-12-31')
+    conn = database.get_connection(db_path)
+    query = "SELECT COUNT(*), SUM(Distance_KM) FROM Transportation"
+    before = conn.execute(query).fetchone()
+    archive_rows('2024-01-01', db_path)
+
+    runner = QueryRunner(db_path)
+    answers = {}
+    for archives in (False, True, False):
+        job_id = runner.submit(query, "transport", archives)
+        result = None
+        deadline = time.monotonic() + 10
+        while (result is None or result['job_id'] != job_id) and time.monotonic() < deadline:
+            time.sleep(0.01)
+            result = runner.poll() or result
+        assert result['status'] == 'ok'
+        answers[archives] = result
+
+    # Without the archives the result says which years it left out
+    assert tuple(answers[True]['rows'][0]) == before and 'archived_years' not in answers[True]
+    assert answers[False]['rows'][0][0] < before[0]
+    assert answers[False]['archived_years'] == [2022, 2023]
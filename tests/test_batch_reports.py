@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import database
+from batch_reports import SUMMARY_COLUMNS, generate_batch_reports, write_reports
+from cli import ALL_DATES
+from report_data import fetch_report_data, recommendations
+from synthetic_data import generate_database
+
+@pytest.mark.parametrize('dates', [(None, None), ('2023-03-01', '2023-08-31')])
+def test_batch_reports_match_each_users_report(db_path, dates):
+    generate_database(db_path, users=12, records=300, seed=3, start='2023-01-01', end='2023-12-31')
+    conn = database.get_connection(db_path)
+    reports = generate_batch_reports(db_path, *dates)
+    assert list(reports['User_ID']) == list(range(1, 13))
+
+    # fetch_report_data needs both ends of the range, as cli.py report gives them
+    date_from, date_to = dates[0] or ALL_DATES[0], dates[1] or ALL_DATES[1]
+    for report in reports.to_dict('records'):
+        data = fetch_report_data(conn, report['User_ID'], date_from, date_to)
+        assert report['Full_Name'] == data['user'].iloc[0]['Full_Name']
+        for column in SUMMARY_COLUMNS:
+            assert report[column] == pytest.approx(data['summary'][column], abs=1e-6), column
+        assert report['recommendations'] == recommendations(data['summary'])
+
+def test_write_reports(db_path, tmp_path):
+    generate_database(db_path, users=3, records=20, seed=4)
+    reports = generate_batch_reports(db_path)
+    write_reports(reports, str(tmp_path / 'reports.json'))
+    written = json.loads((tmp_path / 'reports.json').read_text())
+    assert [report['User_ID'] for report in written] == [1, 2, 3]
+    assert written[0]['recommendations'] == reports['recommendations'][0]
+
+    write_reports(reports, str(tmp_path / 'reports.csv'))
+    header = (tmp_path / 'reports.csv').read_text().splitlines()[0]
+    assert header.split(',') == list(reports.columns)
+    with pytest.raises(ValueError):
+        write_reports(reports, str(tmp_path / 'reports.txt'))
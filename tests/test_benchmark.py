@@ -0,0 +1,29 @@
+import copy
+
+from benchmark import compare_reports, format_markdown, prepare_database, run_benchmark
+
+def test_benchmark_report_and_baseline_comparison(tmp_path):
+    work_dir = str(tmp_path)
+    report = run_benchmark(scales=[200], repeat=2, budget=5.0, work_dir=work_dir, pattern="by month")
+    queries = report['scales']['200']['queries']
+    assert len(queries) >= 3
+    for result in queries.values():
+        assert 'error' not in result and result['rows'] > 0
+        assert result['cold_p50_ms'] <= result['cold_p95_ms'] and result['plan']
+
+    # The generated database is reused while its schema is current
+    path = prepare_database(work_dir, 200, 0)
+    modified = (tmp_path / 'bench_200_seed0.db').stat().st_mtime_ns
+    assert prepare_database(work_dir, 200, 0) == path
+    assert (tmp_path / 'bench_200_seed0.db').stat().st_mtime_ns == modified
+
+    # A query three times as slow (and by more than the noise floor) is a regression
+    assert compare_reports(report, report) == []
+    slower = copy.deepcopy(report)
+    key = next(iter(queries))
+    result = slower['scales']['200']['queries'][key]
+    result['warm_p50_ms'] = queries[key]['warm_p50_ms'] * 3 + 2.0
+    result['plan'] = [["SCAN Something"]]
+    findings = compare_reports(slower, report)
+    assert [(finding['query'], finding['kind']) for finding in findings] == [(key, 'regression'), (key, 'plan changed')]
+    assert key in format_markdown(slower, findings)
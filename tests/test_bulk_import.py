@@ -0,0 +1,109 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+import database
+from bulk_import import import_file
+from carbon_emission_db import ACTIVITY_TABLES, bulk_insert, rebuild_derived_tables, setup_database
+from validation import ValidationError, validate_record, validate_records
+
+def test_validate_records_matches_validate_record():
+    rows = [
+        ['1', 'Car', '12.5', '2023-01-01'],
+        [' 2 ', ' Bus ', '3', '2023-01-02'],
+        [3, 'Train', 7.25, '2023-01-03'],
+        ['x', 'Car', '1', '2023-01-04'],
+        ['1', 'Car', 'far', '2023-01-05'],
+        ['0', 'Car', '1', '2023-01-06'],
+        ['1', '  ', '1', '2023-01-07'],
+        ['1', 'Car', None, '2023-01-08'],
+        ['1', 'Car', '1']
+    ]
+    expected_records, expected_rejects = [], []
+    for i, values in enumerate(rows):
+        try:
+            expected_records.append(validate_record("Transportation", values))
+        except ValidationError as e:
+            expected_rejects.append((i, str(e)))
+
+    assert validate_records("Transportation", rows) == (expected_records, expected_rejects)
+    # A block without bad rows takes the column-wise path and agrees too
+    good = [values for values in rows[:3]] * 500
+    assert validate_records("Transportation", good)[0] == [validate_record("Transportation", v) for v in good]
+
+def test_import_counts_rows_and_writes_the_rejects(db_path, tmp_path):
+    setup_database(db_path)
+    path, rejects = tmp_path / 'transport.csv', tmp_path / 'rejects.csv'
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'distance_km', 'User_ID', 'Vehicle_Type', 'Notes'])
+        writer.writerow(['2023-05-01', '10.5', '1', 'Car', 'extra columns are ignored'])
+        writer.writerow(['2023-05-02', 'far', '2', 'Bus', ''])
+        writer.writerow(['2023-05-03', '4'])
+        writer.writerow(['2023-05-04', '8', '3', 'Hovercraft', ''])
+
+    report = import_file(str(path), 'transportation', db_path=db_path, batch_size=2, rejects_path=str(rejects))
+    assert (report['rows_read'], report['rows_inserted'], report['rows_rejected']) == (4, 2, 2)
+    assert report['errors'] == [(3, "Distance must be a number"), (4, "Line is not a valid record")]
+    with open(rejects, newline='') as file:
+        assert [row[:2] for row in csv.reader(file)] == [
+            ['Line', 'Error'], ['3', 'Distance must be a number'], ['4', 'Line is not a valid record']
+        ]
+
+    conn = database.get_connection(db_path)
+    assert conn.execute(
+        "SELECT User_ID, Vehicle_Type, Distance_KM FROM Transportation WHERE Date >= '2023-05-01' ORDER BY Date"
+    ).fetchall() == [(1, 'Car', 10.5), (3, 'Hovercraft', 8.0)]
+
+def test_import_ndjson(db_path, tmp_path):
+    setup_database(db_path)
+    path = tmp_path / 'offsets.ndjson'
+    lines = [
+        json.dumps({'User_ID': 2, 'Offset_Type': 'Tree Planting', 'Offset_Amount': 12, 'Date': '2023-06-01'}),
+        '[1, 2, 3]',
+        'not json',
+        json.dumps({'User_ID': 4, 'Offset_Type': 'Methane Capture', 'Offset_Amount': 3.5, 'Date': '2023-06-02'})
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+    report = import_file(str(path), 'Carbon Offset', db_path=db_path)
+    assert (report['rows_read'], report['rows_inserted'], report['rows_rejected']) == (4, 2, 2)
+
+def test_import_needs_a_migrated_database(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE Transportation (Transport_ID INTEGER PRIMARY KEY, User_ID INTEGER, "
+                 "Vehicle_Type VARCHAR(50), Distance_KM FLOAT, Date DATE)")
+    conn.close()
+    path = tmp_path / 'transport.csv'
+    path.write_text("User_ID,Vehicle_Type,Distance_KM,Date\n1,Car,10,2023-01-01\n")
+
+    with pytest.raises(ValueError, match="Migrate the database"):
+        import_file(str(path), 'Transportation', db_path=db_path)
+
+def test_bulk_insert_matches_rebuild(db_path, derived_rows):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    cursor = conn.cursor()
+    with conn:
+        cursor.execute("INSERT INTO User_Profile VALUES (6, 'New User', 'new@email.com', 'Boston')")
+        for table, spec in ACTIVITY_TABLES.items():
+            columns = ['User_ID', spec['subtype'], spec['quantity'], 'Date']
+            # A known, a new and a NULL subtype, with several rows per (user, subtype, month)
+            known = conn.execute(f"SELECT {spec['subtype']} FROM {table} LIMIT 1").fetchone()[0]
+            subtypes = [known, table + ' New', None]
+            rows = [(1 + i % 6, subtypes[i % 3], 1.5 * i, f"2023-{1 + i % 3:02d}-{1 + i % 2:02d}") for i in range(40)]
+            assert bulk_insert(cursor, table, columns, rows) == len(rows)
+
+    loaded = derived_rows(conn)
+    rebuild_derived_tables(db_path)
+    assert derived_rows(conn) == loaded
+
+    # The triggers are back in place for the rows written afterwards
+    with conn:
+        conn.execute("INSERT INTO Transportation (User_ID, Vehicle_Type, Distance_KM, Date) "
+                     "VALUES (2, 'Bus', 42.0, '2023-03-03')")
+    written = derived_rows(conn)
+    rebuild_derived_tables(db_path)
+    assert derived_rows(conn) == written
@@ -0,0 +1,48 @@
+import time
+
+import database
+from carbon_emission_db import setup_database
+from chart_renderer import ChartRenderer, ReportCharts
+from report_data import fetch_report_data
+
+DATES = ('2000-01-01', '2099-12-31')
+
+def test_renderer_draws_the_latest_report(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    reports = [fetch_report_data(conn, user_id, *DATES) for user_id in (1, 2, 3, 99)]
+
+    # Queued faster than the first one is drawn, so the middle ones are skipped
+    renderer = ChartRenderer()
+    job_ids = [renderer.submit(data) for data in reports]
+    found = {}
+    deadline = time.monotonic() + 60
+    while job_ids[-1] not in found and time.monotonic() < deadline:
+        result = renderer.poll()
+        if result is None:
+            time.sleep(0.01)
+        else:
+            found[result['job_id']] = result
+
+    assert sorted(found) == job_ids
+    assert found[job_ids[-1]]['status'] == 'ok'
+    assert found[job_ids[-1]]['png'].startswith(b'\x89PNG')
+    assert 'skipped' in [found[job_id]['status'] for job_id in job_ids[1:-1]]
+
+def test_charts_are_reused_between_reports(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    charts = ReportCharts()
+    full, empty = fetch_report_data(conn, 1, *DATES), fetch_report_data(conn, 99, *DATES)
+
+    first = charts.render(full)
+    assert first.startswith(b'\x89PNG')
+    artists = len(charts.figure.findobj())
+    # A user without data hides the wedges and bars rather than removing them
+    charts.render(empty)
+    assert not any(wedge.get_visible() for wedge in charts.wedges)
+    assert charts.no_emissions.get_visible()
+    # and drawing the first report again shows them from the same artists
+    assert charts.render(full).startswith(b'\x89PNG')
+    assert all(wedge.get_visible() for wedge in charts.wedges)
+    assert len(charts.figure.findobj()) == artists
@@ -0,0 +1,59 @@
+import csv
+import json
+
+import database
+from carbon_emission_db import setup_database
+from cli import main
+from updated_queries import updated_queries
+
+def test_named_query_and_sql(db_path, capsys):
+    setup_database(db_path)
+    capsys.readouterr()
+    assert main(["--db", db_path, "query", "transport by month"]) == 0
+    rows = list(csv.reader(capsys.readouterr().out.splitlines()))
+    expected = database.get_connection(db_path).execute(updated_queries["Transport by Month"]).fetchall()
+    assert rows[0] == ["Month", "Trip_Count", "Total_Distance"]
+    assert [(month, int(count), float(total)) for month, count, total in rows[1:]] == expected
+
+    # Ad-hoc SQL may call the emission functions; writes are counted on stderr
+    assert main(["--db", db_path, "sql", "SELECT emission('Transport', 'Car', 10.0) AS kg"]) == 0
+    assert capsys.readouterr().out.splitlines() == ["kg", "23.1"]
+    assert main(["--db", db_path, "sql", "DELETE FROM Transportation WHERE User_ID = 1"]) == 0
+    assert capsys.readouterr().err.strip() == "2 rows changed"
+
+    # Unknown and ambiguous names are errors
+    assert main(["--db", db_path, "query", "no such query"]) == 1
+    assert "No query named" in capsys.readouterr().err
+    assert main(["--db", db_path, "query", "View"]) == 1
+    assert "matches several queries" in capsys.readouterr().err
+
+def test_export_and_import_round_trip(db_path, tmp_path, capsys):
+    setup_database(db_path)
+    path = str(tmp_path / 'energy.ndjson')
+    assert main(["--db", db_path, "export", "energy_consumption", "-o", path]) == 0
+    with open(path) as file:
+        exported = [json.loads(line) for line in file]
+    assert len(exported) == 8 and set(exported[0]) == {'Energy_ID', 'User_ID', 'Energy_Source', 'Consumption_KWH', 'Date'}
+
+    # Imported again, every row is there twice
+    assert main(["--db", db_path, "import", path, "--category", "Energy Consumption"]) == 0
+    rows = database.get_connection(db_path).execute(
+        "SELECT User_ID, Energy_Source, Consumption_KWH, Date, COUNT(*) FROM Energy_Consumption GROUP BY 1, 2, 3, 4"
+    ).fetchall()
+    assert len(rows) == len(exported) and all(row[-1] == 2 for row in rows)
+
+    assert main(["--db", db_path, "export", "No_Such_Table"]) == 1
+
+def test_report(db_path, tmp_path, capsys):
+    setup_database(db_path)
+    path = tmp_path / 'report.json'
+    assert main(["--db", db_path, "report", "2", "-o", str(path)]) == 0
+    report = json.loads(path.read_text())
+    assert report['User_ID'] == 2 and report['recommendations']
+    totals = database.get_connection(db_path).execute(
+        "SELECT Net_Emissions FROM User_Emission_Totals WHERE User_ID = 2"
+    ).fetchone()[0]
+    assert abs(report['summary']['net_emissions'] - totals) < 1e-6
+
+    assert main(["--db", db_path, "report", "99"]) == 1
+    assert "No user with ID 99" in capsys.readouterr().err
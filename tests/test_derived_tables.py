@@ -0,0 +1,90 @@
+import database
+from carbon_emission_db import ACTIVITY_TABLES, rebuild_derived_tables, record_tables, setup_database
+from updated_queries import updated_queries
+
+def activity_rows(table):
+    """(User_ID, subtype, quantity, Date) rows with known, new and NULL subtypes over several months"""
+    subtypes = {
+        'Transportation': ['Car', 'Bus', 'Hovercraft'],
+        'Energy_Consumption': ['Electricity', 'Natural Gas', 'Geothermal'],
+        'Waste_Management': ['Plastic', 'Paper', 'Textile'],
+        'Industrial_Activity': ['Manufacturing', 'Construction', 'Mining'],
+        'Carbon_Offset': ['Tree Planting', 'Methane Capture', 'Kelp Farming']
+    }[table]
+    rows = []
+    for i in range(30):
+        subtype = None if i % 10 == 9 else subtypes[i % len(subtypes)]
+        rows.append((1 + i % 6, subtype, 10.0 + i * 2.5, f"2023-{1 + i % 4:02d}-{1 + i % 28:02d}"))
+    return rows
+
+def mixed_writes(db_path):
+    """The demo database after inserts, updates and deletes of every activity table and of the factors"""
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    with conn:
+        conn.execute("INSERT INTO User_Profile VALUES (6, 'New User', 'new@email.com', 'Boston')")
+        for table, spec in ACTIVITY_TABLES.items():
+            subtype, quantity = spec['subtype'], spec['quantity']
+            conn.executemany(
+                f"INSERT INTO {table} (User_ID, {subtype}, {quantity}, Date) VALUES (?, ?, ?, ?)",
+                activity_rows(table)
+            )
+            # Change quantities, subtypes, dates and owners, and remove rows
+            conn.execute(f"UPDATE {table} SET {quantity} = {quantity} * 2 WHERE {spec['id']} % 3 = 0")
+            conn.execute(f"UPDATE {table} SET {subtype} = 'Car' WHERE {spec['id']} % 7 = 0")
+            conn.execute(f"UPDATE {table} SET Date = '2023-06-15' WHERE {spec['id']} % 5 = 0")
+            conn.execute(f"UPDATE {table} SET User_ID = 6 WHERE {spec['id']} % 4 = 1")
+            conn.execute(f"DELETE FROM {table} WHERE {spec['id']} % 6 = 2")
+        # A factor change moves the emissions of every row using it
+        conn.execute("UPDATE Emission_Factor SET Emission_Per_Unit = 3.0 WHERE Source_Type = 'Car'")
+        conn.execute("INSERT INTO Emission_Factor (Source_Type, Emission_Per_Unit) VALUES ('Hovercraft', 1.5)")
+        conn.execute("DELETE FROM Emission_Factor WHERE Source_Type = 'Bus'")
+    return conn
+
+def test_totals_match_rebuild_after_mixed_writes(db_path, derived_rows):
+    conn = mixed_writes(db_path)
+    maintained = derived_rows(conn)['User_Emission_Totals']
+    assert len(maintained) == 6
+    rebuild_derived_tables(db_path)
+    assert derived_rows(conn)['User_Emission_Totals'] == maintained
+
+def test_rollup_matches_rebuild_after_mixed_writes(db_path, derived_rows):
+    conn = mixed_writes(db_path)
+    maintained = derived_rows(conn)['Monthly_Rollup']
+    rebuild_derived_tables(db_path)
+    assert derived_rows(conn)['Monthly_Rollup'] == maintained
+
+    # The monthly named queries read the rollup and give what the activity rows do
+    raw = {
+        "Transport by Month": "SELECT strftime('%Y-%m', Date) as Month, COUNT(*), SUM(Distance_KM) "
+                              "FROM Transportation GROUP BY Month ORDER BY Month",
+        "Energy Consumption by Month": "SELECT strftime('%Y-%m', Date) as Month, SUM(Consumption_KWH) "
+                                       "FROM Energy_Consumption GROUP BY Month ORDER BY Month",
+        "Waste Generation by Month": "SELECT strftime('%Y-%m', Date) as Month, SUM(Waste_Weight_KG) "
+                                     "FROM Waste_Management GROUP BY Month ORDER BY Month"
+    }
+    for name, sql in raw.items():
+        rollup, rows = (
+            [tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+             for row in conn.execute(query)]
+            for query in (updated_queries[name], sql)
+        )
+        assert len(rows) > 1 and rollup == rows, name
+
+def test_emission_records_match_rebuild_after_mixed_writes(db_path, derived_rows):
+    conn = mixed_writes(db_path)
+    maintained = derived_rows(conn)['Emission_Record']
+    rebuild_derived_tables(db_path)
+    assert derived_rows(conn)['Emission_Record'] == maintained
+
+    # One record per emitting activity row, following the factor rows written after it
+    activity = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in record_tables())
+    assert len(maintained) == activity
+    by_source = dict(conn.execute(
+        "SELECT r.Source_Type, MAX(r.Factor_ID IS f.Factor_ID) FROM Emission_Record r "
+        "LEFT JOIN Emission_Factor f ON f.Source_Type = r.Source_Type "
+        "WHERE r.Category = 'Transport' GROUP BY r.Source_Type"
+    ).fetchall())
+    assert by_source['Hovercraft'] == by_source['Car'] == 1
+    assert conn.execute("SELECT COUNT(*) FROM Emission_Record WHERE Source_Type = 'Bus' "
+                        "AND (Factor_ID IS NOT NULL OR Emission_Amount != 0)").fetchone()[0] == 0
@@ -0,0 +1,63 @@
+import math
+
+import database
+from carbon_emission_db import ACTIVITY_TABLES, emission_sql, setup_database
+from emission_engine import CATEGORY_CODES, get_factors, register_functions
+
+def same(expected, computed):
+    """Whether an emission computed without a factor for the row (None or NaN,
+    as the named queries' LEFT JOIN gives) or with one matches the derived
+    tables' SQL, which counts the first as 0"""
+    if computed is None or math.isnan(computed):
+        return expected == 0
+    return math.isclose(expected, computed)
+
+def test_engine_matches_the_sql(db_path):
+    # Connections opened from here on get emission() and emission_factor()
+    database.on_connect(register_functions)
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    with conn:
+        for table, spec in ACTIVITY_TABLES.items():
+            # A subtype with no Emission_Factor row, and a NULL one
+            conn.execute(f"INSERT INTO {table} (User_ID, {spec['subtype']}, {spec['quantity']}, Date) "
+                         f"VALUES (1, 'Unknown Kind', 5.0, '2023-02-01'), (2, NULL, 7.0, '2023-02-02')")
+
+    def check():
+        factors = get_factors(conn, db_path)
+        for table, spec in ACTIVITY_TABLES.items():
+            category = spec['category']
+            rows = conn.execute(
+                f"SELECT {spec['subtype']}, {spec['quantity']}, {emission_sql(spec, 'r')}, "
+                f"emission('{category}', {spec['subtype']}, {spec['quantity']}) FROM {table} r ORDER BY {spec['id']}"
+            ).fetchall()
+            assert len(rows) >= 3
+            engine = factors.emissions([CATEGORY_CODES[category]] * len(rows), [row[0] for row in rows],
+                                       [row[1] for row in rows])
+            for (subtype, quantity, expected, function), computed in zip(rows, engine):
+                assert same(expected, function), (table, subtype)
+                assert same(expected, float(computed)), (table, subtype)
+                assert same(expected, factors.emission(category, subtype, quantity)), (table, subtype)
+
+            # Rows read by subtype code decode to the same factors, and the
+            # inlined SQL batch reports use agrees with the joins
+            codes = conn.execute(f"SELECT COALESCE({spec['code']}, 0), {spec['quantity']}, "
+                                 f"{factors.emission_sql(category, spec['code'], spec['quantity'])} "
+                                 f"FROM {spec['data']} ORDER BY {spec['id']}").fetchall()
+            names, row_factors = factors.decode([CATEGORY_CODES[category]] * len(codes), [row[0] for row in codes])
+            assert list(names) == [row[0] for row in rows]
+            for (_, quantity, inlined), row_factor, (_, _, expected, _) in zip(codes, row_factors, rows):
+                assert same(expected, inlined) and same(expected, quantity * row_factor)
+
+    check()
+    assert conn.execute("SELECT emission('Transport', 'Unknown Kind', 5.0), "
+                        "emission_factor('Energy', 'Coal')").fetchone() == (None, 0.34)
+
+    # A factor changed by another connection is picked up by the functions too
+    other = database.connect(db_path)
+    with other:
+        other.execute("UPDATE Emission_Factor SET Emission_Per_Unit = Emission_Per_Unit * 2")
+        other.execute("INSERT INTO Emission_Factor (Source_Type, Emission_Per_Unit) VALUES ('Unknown Kind', 0.5)")
+    other.close()
+    check()
+    assert conn.execute("SELECT emission('Transport', 'Unknown Kind', 5.0)").fetchone() == (2.5,)
@@ -0,0 +1,178 @@
+import sqlite3
+
+import pytest
+
+import database
+from carbon_emission_db import (ACTIVITY_TABLES, INDEXES, MIGRATIONS, backfill_emission_records, migrate_database,
+                                rebuild_derived_tables)
+
+# The schema the first release of the app created, before any migration
+BASELINE_SCHEMA = '''
+CREATE TABLE User_Profile (
+    User_ID INTEGER PRIMARY KEY,
+    Full_Name VARCHAR(100),
+    Email VARCHAR(100),
+    Location VARCHAR(100)
+);
+CREATE TABLE Transportation (
+    Transport_ID INTEGER PRIMARY KEY,
+    User_ID INTEGER,
+    Vehicle_Type VARCHAR(50),
+    Distance_KM FLOAT,
+    Date DATE,
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+);
+CREATE TABLE Energy_Consumption (
+    Energy_ID INTEGER PRIMARY KEY,
+    User_ID INTEGER,
+    Energy_Source VARCHAR(50),
+    Consumption_KWH FLOAT,
+    Date DATE,
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+);
+CREATE TABLE Waste_Management (
+    Waste_ID INTEGER PRIMARY KEY,
+    User_ID INTEGER,
+    Waste_Type VARCHAR(50),
+    Waste_Weight_KG FLOAT,
+    Date DATE,
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+);
+CREATE TABLE Industrial_Activity (
+    Industry_ID INTEGER PRIMARY KEY,
+    User_ID INTEGER,
+    Activity_Type VARCHAR(100),
+    Emission_Produced FLOAT,
+    Date DATE,
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+);
+CREATE TABLE Emission_Factor (
+    Factor_ID INTEGER PRIMARY KEY,
+    Source_Type VARCHAR(50),
+    Emission_Per_Unit FLOAT
+);
+CREATE TABLE Emission_Record (
+    Record_ID INTEGER PRIMARY KEY,
+    Factor_ID INTEGER,
+    Source_Type VARCHAR(50),
+    Source_ID INTEGER,
+    Emission_Amount FLOAT,
+    Date DATE,
+    FOREIGN KEY (Factor_ID) REFERENCES Emission_Factor(Factor_ID)
+);
+CREATE TABLE Sustainability_Program (
+    Program_ID INTEGER PRIMARY KEY,
+    Program_Name VARCHAR(100),
+    Description TEXT
+);
+CREATE TABLE User_Program (
+    User_ID INTEGER,
+    Program_ID INTEGER,
+    Enrollment_Date DATE,
+    PRIMARY KEY (User_ID, Program_ID),
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID),
+    FOREIGN KEY (Program_ID) REFERENCES Sustainability_Program(Program_ID)
+);
+CREATE TABLE Carbon_Offset (
+    Offset_ID INTEGER PRIMARY KEY,
+    User_ID INTEGER,
+    Offset_Type VARCHAR(50),
+    Offset_Amount FLOAT,
+    Date DATE,
+    FOREIGN KEY (User_ID) REFERENCES User_Profile(User_ID)
+);
+'''
+
+BASELINE_ROWS = {
+    'User_Profile': [
+        (1, 'John Doe', 'john.doe@email.com', 'New York'),
+        (2, 'Jane Smith', 'jane.smith@email.com', 'Los Angeles'),
+        (3, 'Robert Johnson', 'robert.j@email.com', 'Chicago')
+    ],
+    'Transportation': [
+        (1, 1, 'Car', 150.5, '2023-01-15'),
+        (2, 1, 'Bus', 75.2, '2023-02-10'),
+        (3, 2, 'Airplane', 2500.0, '2023-03-01'),
+        (4, 3, 'Bicycle', 30.0, '2023-01-30')
+    ],
+    'Energy_Consumption': [
+        (1, 1, 'Electricity', 350.0, '2023-01-31'),
+        (2, 2, 'Natural Gas', 200.5, '2023-01-31'),
+        (3, 3, 'Solar', 150.0, '2023-02-28')
+    ],
+    'Waste_Management': [
+        (1, 1, 'Plastic', 5.2, '2023-01-20'),
+        (2, 3, 'Organic', 8.0, '2023-02-15')
+    ],
+    'Industrial_Activity': [
+        (1, 2, 'Manufacturing', 500.0, '2023-01-15'),
+        (2, 3, 'Construction', 750.5, '2023-02-20')
+    ],
+    'Emission_Factor': [
+        (1, 'Car', 2.31),
+        (2, 'Bus', 0.89),
+        (3, 'Airplane', 8.75),
+        (4, 'Electricity', 0.45),
+        (5, 'Natural Gas', 0.20),
+        (6, 'Manufacturing', 5.20),
+        (7, 'Construction', 4.35),
+        (8, 'Waste', 0.58)
+    ],
+    # Hand-written records the migration replaces with computed ones
+    'Emission_Record': [
+        (1, 1, 'Car', 1, 347.65, '2023-01-15'),
+        (2, 4, 'Electricity', 1, 157.50, '2023-01-31')
+    ],
+    'Sustainability_Program': [
+        (1, 'Green Energy Initiative', 'Promoting renewable energy sources')
+    ],
+    'User_Program': [
+        (1, 1, '2022-12-01')
+    ],
+    'Carbon_Offset': [
+        (1, 1, 'Tree Planting', 50.0, '2023-01-10'),
+        (2, 2, 'Methane Capture', 75.5, '2023-01-20')
+    ]
+}
+
+@pytest.fixture
+def baseline_db(db_path):
+    """A database as the first release of the app left it"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    for table, rows in BASELINE_ROWS.items():
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def test_migrate_baseline_database(baseline_db, derived_rows):
+    migrate_database(baseline_db)
+    conn = database.get_connection(baseline_db)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(INDEXES) <= indexes
+
+    # The activity rows are still read through the old table names
+    for table, spec in ACTIVITY_TABLES.items():
+        rows = conn.execute(
+            f"SELECT {spec['id']}, User_ID, {spec['subtype']}, {spec['quantity']}, Date FROM {table} ORDER BY 1"
+        ).fetchall()
+        assert rows == BASELINE_ROWS[table]
+
+    # Once the older rows are backfilled the derived tables match a rebuild
+    backfill_emission_records(baseline_db)
+    migrated = derived_rows(conn)
+    assert migrated['Emission_Record']
+    rebuild_derived_tables(baseline_db)
+    assert derived_rows(conn) == migrated
+
+def test_migrate_current_database_is_a_no_op(baseline_db):
+    migrate_database(baseline_db)
+    conn = database.get_connection(baseline_db)
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+
+    migrate_database(baseline_db)
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
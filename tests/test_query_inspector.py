@@ -0,0 +1,29 @@
+import database
+from carbon_emission_db import setup_database
+from query_inspector import FULL_SCAN, format_inspection, inspect_query
+
+def test_scan_is_flagged_with_an_index_suggestion(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    result, = inspect_query(conn, "SELECT Full_Name FROM User_Profile p WHERE p.Email = 'jane@email.com'")
+
+    assert [node['warning'] for node in result['warnings']] == [FULL_SCAN]
+    assert result['suggestions'] == ["CREATE INDEX idx_user_profile_email ON User_Profile (Email)"]
+    assert result['rows'] == 0
+    assert all(result[phase] >= 0 for phase in ('prepare', 'step', 'fetch'))
+    assert "suggested: CREATE INDEX idx_user_profile_email" in format_inspection([result])
+
+    # The suggestion removes the scan
+    conn.execute(result['suggestions'][0])
+    result, = inspect_query(conn, result['sql'])
+    assert result['warnings'] == [] and result['suggestions'] == []
+
+def test_inspection_leaves_the_database_unchanged(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    results = inspect_query(conn, "INSERT INTO User_Profile VALUES (9, 'New User', 'new@email.com', 'Boston');\n"
+                                  "SELECT * FROM User_Profile")
+    # rows is the row count written by an INSERT and returned by a SELECT
+    assert [result['rows'] for result in results] == [1, 6]
+    assert conn.execute("SELECT COUNT(*) FROM User_Profile").fetchone()[0] == 5
+    assert not conn.in_transaction
@@ -0,0 +1,21 @@
+import database
+from carbon_emission_db import setup_database
+from query_plans import compare_plans
+
+def test_user_date_indexes_replace_the_scans(db_path):
+    setup_database(db_path)
+    plans = {name: (before, after) for name, before, after in compare_plans(db_path)}
+
+    # A per-user query scans the data table without the indexes and searches it with them
+    before, after = plans["User Transportation Data"]
+    assert any(line.strip() == "SCAN Transportation_Data" for line in before[0])
+    assert any("idx_transportation_user_date (User_ID=?)" in line for line in after[0])
+    # Every statement of every named query can be planned
+    lines = [line for sides in plans.values() for side in sides for statement in side for line in statement]
+    assert not any(line.startswith("ERROR") for line in lines)
+
+    # The comparison works on copies: the database keeps its indexes
+    indexes = {name for (name,) in database.get_connection(db_path).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    )}
+    assert 'idx_transportation_user_date' in indexes
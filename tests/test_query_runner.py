@@ -0,0 +1,54 @@
+import time
+
+import database
+import query_runner
+from carbon_emission_db import setup_database
+from query_runner import QueryRunner
+from result_cache import ResultCache
+
+def results(runner, wanted, timeout=10):
+    """Poll the runner until a result of each wanted kind arrived; return them by kind"""
+    found = {}
+    deadline = time.monotonic() + timeout
+    while not set(wanted) <= found.keys() and time.monotonic() < deadline:
+        result = runner.poll()
+        if result is None:
+            time.sleep(0.01)
+        else:
+            found[result['kind']] = result
+    return found
+
+def test_explain_keeps_the_displayed_querys_count(db_path):
+    setup_database(db_path)
+    # Pages of two rows and no caching, so the total comes from the count worker
+    runner = QueryRunner(db_path, page_size=2, cache=ResultCache(db_path, max_entry_bytes=0))
+    query = "SELECT * FROM Transportation"
+    job_id = runner.submit(query, "transport")
+    runner.explain(query, "transport")
+
+    found = results(runner, ['query', 'explain', 'count'])
+    assert found['query']['job_id'] == job_id and not found['query']['exhausted']
+    assert found['explain']['status'] == 'ok'
+    assert found['count']['job_id'] == job_id
+    assert found['count']['total'] == 8
+
+def test_idle_stream_is_closed_and_re_read(db_path, monkeypatch):
+    setup_database(db_path)
+    monkeypatch.setattr(query_runner, 'STREAM_IDLE_SECONDS', 0.2)
+    runner = QueryRunner(db_path, page_size=2, cache=ResultCache(db_path, max_entry_bytes=0))
+    job_id = runner.submit("SELECT * FROM Transportation ORDER BY Transport_ID", "transport")
+    assert results(runner, ['query', 'count'])['query']['status'] == 'ok'
+
+    # Once the stream is closed nothing holds a snapshot back from a checkpoint
+    writer = database.connect(db_path)
+    with writer:
+        writer.execute("UPDATE User_Profile SET Location = 'Boston' WHERE User_ID = 1")
+    deadline = time.monotonic() + 10
+    while runner._stream is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0] == 0
+    writer.close()
+
+    runner.fetch_rows(job_id, 2, 2)
+    rows = results(runner, ['rows'])['rows']
+    assert [row[0] for row in rows['rows']] == [3, 4]
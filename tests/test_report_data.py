@@ -0,0 +1,64 @@
+import pytest
+
+import database
+import report_data
+from cli import ALL_DATES
+from report_data import DetailsSource, fetch_report_data, legacy_report_data, same_report
+from synthetic_data import generate_database
+
+RANGES = [ALL_DATES, ('2023-02-01', '2023-05-31'), ('2030-01-01', '2030-12-31')]
+
+def test_one_query_fetch_matches_the_per_category_queries(db_path):
+    generate_database(db_path, users=15, records=300, seed=6, start='2023-01-01', end='2023-12-31')
+    conn = database.get_connection(db_path)
+    with conn:
+        # A subtype without an emission factor, added after the factors were first read
+        fetch_report_data(conn, 1, *ALL_DATES)
+        conn.execute("INSERT INTO Transportation (User_ID, Vehicle_Type, Distance_KM, Date) "
+                     "VALUES (1, 'Hovercraft', 40.0, '2023-03-03')")
+        conn.execute("INSERT INTO User_Profile VALUES (16, 'No Activity', 'none@email.com', 'Boston')")
+
+    for user_id in range(1, 17):
+        for dates in RANGES:
+            data = fetch_report_data(conn, user_id, *dates)
+            assert same_report(data, legacy_report_data(conn, user_id, *dates)), (user_id, dates)
+
+    # Over every date the summary is what the totals triggers keep
+    for user_id, net in conn.execute("SELECT User_ID, Net_Emissions FROM User_Emission_Totals"):
+        assert fetch_report_data(conn, user_id, *ALL_DATES)['summary']['net_emissions'] == pytest.approx(net)
+    assert fetch_report_data(conn, 99, *ALL_DATES)['user'].empty
+
+def test_details_pages_are_the_same_from_pandas_and_sql(db_path, monkeypatch):
+    generate_database(db_path, users=3, records=400, seed=7, start='2023-01-01', end='2023-12-31')
+    conn = database.get_connection(db_path)
+    with conn:
+        conn.execute("INSERT INTO Transportation (User_ID, Vehicle_Type, Distance_KM, Date) "
+                     "VALUES (1, NULL, 5.0, '2023-06-01'), (1, 'Hover_craft 100%', 7.0, '2023-06-02')")
+    dates = ('2023-02-01', '2023-10-31')
+    data = fetch_report_data(conn, 1, *dates)
+
+    for key in ('transport', 'energy', 'offset'):
+        in_memory = DetailsSource(key, data[key], 1, *dates, conn=conn)
+        monkeypatch.setattr(report_data, 'DETAILS_SQL_ROWS', 0)
+        in_sql = DetailsSource(key, data[key], 1, *dates, conn=conn)
+        monkeypatch.undo()
+        assert not in_memory.server_side and in_sql.server_side
+
+        # The subtype, quantity and last column, with and without filters
+        _, subtype, quantity, *_, last = in_memory.columns
+        orders = [(None, False, ""), ('Date', True, ""), (subtype, True, ""), (quantity, False, "a"),
+                  (last, False, ""), (None, False, "2023-07"), (subtype, False, "_"), (None, False, "100%"),
+                  ('Date', False, "no such thing")]
+        for order in orders:
+            in_memory.set_order(*order)
+            in_sql.set_order(*order)
+            assert in_memory.count == in_sql.count, (key, order)
+            for offset in (0, 25, in_memory.count - 10):
+                assert in_memory.page(max(offset, 0), 20) == in_sql.page(max(offset, 0), 20), (key, order, offset)
+
+    # The filters match what they say, wildcards included
+    source = DetailsSource('transport', data['transport'], 1, *dates, conn=conn)
+    source.set_order(text="_")
+    assert [row[1] for row in source.page(0, 10)] == ['Hover_craft 100%']
+    with pytest.raises(ValueError):
+        source.set_order('No_Such_Column')
@@ -0,0 +1,62 @@
+import database
+from carbon_emission_db import setup_database
+from bulk_import import import_file
+from result_cache import ReportCache, ResultCache
+
+QUERY = "SELECT Full_Name FROM User_Profile"
+
+def cache_query(cache, conn, sql):
+    """Run a query and cache its rows as QueryRunner does; return its key"""
+    key = cache.key(sql)
+    tables = cache.cacheable_tables(sql)
+    versions = cache.versions(tables)
+    rows = conn.execute(sql).fetchall()
+    cache.put(key, tables, versions, rows, 100)
+    return key
+
+def test_recorded_writes_drop_the_entries_reading_the_table(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    cache = ResultCache(db_path)
+    key = cache_query(cache, conn, QUERY)
+    assert cache.get(key) is not None
+
+    database.record_writes(['Emission_Factor'], db_path)
+    assert cache.get(key) is not None
+    database.record_writes(['User_Profile'], db_path)
+    assert cache.get(key) is None
+
+def test_commit_by_another_connection_clears_the_cache(db_path):
+    setup_database(db_path)
+    conn = database.get_connection(db_path)
+    cache = ResultCache(db_path)
+    cache.check_external(conn)
+    key = cache_query(cache, conn, QUERY)
+
+    # Another process commits while this one records a write of its own
+    other = database.connect(db_path)
+    with other:
+        other.execute("UPDATE User_Profile SET Full_Name = 'Renamed' WHERE User_ID = 1")
+    other.close()
+    database.record_writes(['Emission_Factor'], db_path)
+
+    cache.check_external(conn)
+    assert cache.get(key) is None
+
+def test_report_entries_follow_their_users_writes(db_path, tmp_path):
+    setup_database(db_path)
+    cache = ReportCache(db_path)
+    for user_id in (1, 2):
+        key = (user_id, None, None)
+        cache.put(key, user_id, cache.versions(user_id), f"report of {user_id}", 100)
+
+    # An import knows whose rows it wrote
+    path = tmp_path / 'transport.csv'
+    path.write_text("User_ID,Vehicle_Type,Distance_KM,Date\n2,Car,10,2023-07-01\n")
+    assert import_file(str(path), 'Transportation', db_path=db_path)['rows_inserted'] == 1
+    assert cache.get((1, None, None)) == "report of 1"
+    assert cache.get((2, None, None)) is None
+
+    # A statement typed in the Query Database tab may concern anyone
+    database.record_statement_writes("UPDATE Transportation SET Distance_KM = 1 WHERE User_ID = 3", db_path)
+    assert cache.get((1, None, None)) is None
@@ -0,0 +1,28 @@
+import database
+from carbon_emission_db import ACTIVITY_TABLES
+from synthetic_data import generate_database
+
+def dump(path):
+    """Every row of every table and view of a database, by name"""
+    conn = database.connect(path)
+    try:
+        names = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {name: conn.execute(f"SELECT * FROM {name}").fetchall() for name in names}
+    finally:
+        conn.close()
+
+def test_same_seed_gives_the_same_database(tmp_path):
+    paths = [str(tmp_path / name) for name in ('a.db', 'b.db', 'c.db')]
+    for path, seed in zip(paths, (7, 7, 8)):
+        generate_database(path, users=30, records=400, seed=seed, start='2023-01-01', end='2023-12-31')
+    first, second, other = map(dump, paths)
+
+    assert first == second
+    assert first != other
+    assert len(first['User_Profile']) == 30
+    for table in ACTIVITY_TABLES:
+        rows = first[table]
+        assert len(rows) == 400
+        assert all('2023-01-01' <= row[-1] <= '2023-12-31' for row in rows)
@@ -103,26 +103,29 @@ updated_queries = {
     
     # Date-based queries
     "Transport by Month": """
-    SELECT strftime('%Y-%m', Date) as Month, 
-           COUNT(*) as Trip_Count, 
-           SUM(Distance_KM) as Total_Distance
-    FROM Transportation
+    SELECT Month, 
+           SUM(Record_Count) as Trip_Count, 
+           SUM(Quantity) as Total_Distance
+    FROM Monthly_Rollup
+    WHERE Category = 'Transport'
     GROUP BY Month
     ORDER BY Month
     """,
     
     "Energy Consumption by Month": """
-    SELECT strftime('%Y-%m', Date) as Month, 
-           SUM(Consumption_KWH) as Total_KWH
-    FROM Energy_Consumption
+    SELECT Month, 
+           SUM(Quantity) as Total_KWH
+    FROM Monthly_Rollup
+    WHERE Category = 'Energy'
     GROUP BY Month
     ORDER BY Month
     """,
     
     "Waste Generation by Month": """
-    SELECT strftime('%Y-%m', Date) as Month, 
-           SUM(Waste_Weight_KG) as Total_Waste
-    FROM Waste_Management
+    SELECT Month, 
+           SUM(Quantity) as Total_Waste
+    FROM Monthly_Rollup
+    WHERE Category = 'Waste'
     GROUP BY Month
     ORDER BY Month
     """,
@@ -181,21 +184,13 @@ updated_queries = {
     # CREATE VIEW Example (shown as SELECT)
     "User Carbon Footprint View": """
     SELECT up.User_ID, up.Full_Name,
-           COALESCE(SUM(t.Distance_KM * ef_t.Emission_Per_Unit), 0) as Transport_Emissions,
-           COALESCE(SUM(ec.Consumption_KWH * ef_e.Emission_Per_Unit), 0) as Energy_Emissions,
-           COALESCE(SUM(wm.Waste_Weight_KG * ef_w.Emission_Per_Unit), 0) as Waste_Emissions,
-           COALESCE(SUM(ia.Emission_Produced), 0) as Industrial_Emissions,
-           COALESCE(SUM(co.Offset_Amount), 0) as Carbon_Offset
+           COALESCE(uet.Transport_Emissions, 0) as Transport_Emissions,
+           COALESCE(uet.Energy_Emissions, 0) as Energy_Emissions,
+           COALESCE(uet.Waste_Emissions, 0) as Waste_Emissions,
+           COALESCE(uet.Industrial_Emissions, 0) as Industrial_Emissions,
+           COALESCE(uet.Offset_Amount, 0) as Carbon_Offset
     FROM User_Profile up
-    LEFT JOIN Transportation t ON up.User_ID = t.User_ID
-    LEFT JOIN Emission_Factor ef_t ON t.Vehicle_Type = ef_t.Source_Type
-    LEFT JOIN Energy_Consumption ec ON up.User_ID = ec.User_ID
-    LEFT JOIN Emission_Factor ef_e ON ec.Energy_Source = ef_e.Source_Type
-    LEFT JOIN Waste_Management wm ON up.User_ID = wm.User_ID
-    LEFT JOIN Emission_Factor ef_w ON 'Waste' = ef_w.Source_Type
-    LEFT JOIN Industrial_Activity ia ON up.User_ID = ia.User_ID
-    LEFT JOIN Carbon_Offset co ON up.User_ID = co.User_ID
-    GROUP BY up.User_ID
+    LEFT JOIN User_Emission_Totals uet ON uet.User_ID = up.User_ID
     """,
     
     # INSERT Example (shown as SELECT)
@@ -227,34 +222,20 @@ updated_queries = {
     
     # View creation and usage example
     "Create Carbon Footprint View": """
-    -- First create the view
+    -- First create the view (User_Emission_Totals is kept current by triggers)
     CREATE VIEW IF NOT EXISTS Carbon_Footprint_View AS
     SELECT 
         up.User_ID, 
         up.Full_Name,
         up.Location,
-        COALESCE(SUM(t.Distance_KM * ef_t.Emission_Per_Unit), 0) as Transport_Emissions,
-        COALESCE(SUM(ec.Consumption_KWH * ef_e.Emission_Per_Unit), 0) as Energy_Emissions,
-        COALESCE(SUM(wm.Waste_Weight_KG * ef_w.Emission_Per_Unit), 0) as Waste_Emissions,
-        COALESCE(SUM(ia.Emission_Produced), 0) as Industrial_Emissions,
-        COALESCE(SUM(co.Offset_Amount), 0) as Offset_Amount,
-        (
-            COALESCE(SUM(t.Distance_KM * ef_t.Emission_Per_Unit), 0) +
-            COALESCE(SUM(ec.Consumption_KWH * ef_e.Emission_Per_Unit), 0) +
-            COALESCE(SUM(wm.Waste_Weight_KG * ef_w.Emission_Per_Unit), 0) +
-            COALESCE(SUM(ia.Emission_Produced), 0) -
-            COALESCE(SUM(co.Offset_Amount), 0)
-        ) as Net_Emissions
+        COALESCE(uet.Transport_Emissions, 0) as Transport_Emissions,
+        COALESCE(uet.Energy_Emissions, 0) as Energy_Emissions,
+        COALESCE(uet.Waste_Emissions, 0) as Waste_Emissions,
+        COALESCE(uet.Industrial_Emissions, 0) as Industrial_Emissions,
+        COALESCE(uet.Offset_Amount, 0) as Offset_Amount,
+        COALESCE(uet.Net_Emissions, 0) as Net_Emissions
     FROM User_Profile up
-    LEFT JOIN Transportation t ON up.User_ID = t.User_ID
-    LEFT JOIN Emission_Factor ef_t ON t.Vehicle_Type = ef_t.Source_Type
-    LEFT JOIN Energy_Consumption ec ON up.User_ID = ec.User_ID
-    LEFT JOIN Emission_Factor ef_e ON ec.Energy_Source = ef_e.Source_Type
-    LEFT JOIN Waste_Management wm ON up.User_ID = wm.User_ID
-    LEFT JOIN Emission_Factor ef_w ON 'Waste' = ef_w.Source_Type
-    LEFT JOIN Industrial_Activity ia ON up.User_ID = ia.User_ID
-    LEFT JOIN Carbon_Offset co ON up.User_ID = co.User_ID
-    GROUP BY up.User_ID;
+    LEFT JOIN User_Emission_Totals uet ON uet.User_ID = up.User_ID;
     
     -- Then select from the view
     SELECT * FROM Carbon_Footprint_View;
@@ -269,24 +250,9 @@ updated_queries = {
     "Users with No Carbon Offset": """
     SELECT up.User_ID, up.Full_Name, up.Email, up.Location
     FROM User_Profile up
-    WHERE NOT EXISTS (
-        SELECT 1 
-        FROM Carbon_Offset co 
-        WHERE co.User_ID = up.User_ID
-    )
-    AND EXISTS (
-        SELECT 1 
-        FROM (
-            SELECT t.User_ID FROM Transportation t 
-            UNION
-            SELECT ec.User_ID FROM Energy_Consumption ec
-            UNION
-            SELECT wm.User_ID FROM Waste_Management wm
-            UNION
-            SELECT ia.User_ID FROM Industrial_Activity ia
-        ) as active_users
-        WHERE active_users.User_ID = up.User_ID
-    )
+    JOIN User_Emission_Totals uet ON uet.User_ID = up.User_ID
+    WHERE uet.Has_Offset = 0
+    AND (uet.Has_Transport OR uet.Has_Energy OR uet.Has_Waste OR uet.Has_Industrial)
     ORDER BY up.User_ID;
     """,
     
@@ -348,41 +314,17 @@ updated_queries = {
     
     # UNION, INTERSECT, EXCEPT example
     "Users Activity Comparison": """
-    -- Users with transportation but no energy consumption
-    SELECT up.User_ID, up.Full_Name, 'Transportation Only' as Activity_Type
-    FROM User_Profile up
-    WHERE EXISTS (
-        SELECT 1 FROM Transportation t WHERE t.User_ID = up.User_ID
-    )
-    AND NOT EXISTS (
-        SELECT 1 FROM Energy_Consumption ec WHERE ec.User_ID = up.User_ID
-    )
-    
-    UNION
-    
-    -- Users with energy consumption but no transportation
-    SELECT up.User_ID, up.Full_Name, 'Energy Only' as Activity_Type
-    FROM User_Profile up
-    WHERE EXISTS (
-        SELECT 1 FROM Energy_Consumption ec WHERE ec.User_ID = up.User_ID
-    )
-    AND NOT EXISTS (
-        SELECT 1 FROM Transportation t WHERE t.User_ID = up.User_ID
-    )
-    
-    UNION
-    
-    -- Users with both
-    SELECT up.User_ID, up.Full_Name, 'Both Activities' as Activity_Type
+    SELECT up.User_ID, up.Full_Name,
+        CASE 
+            WHEN uet.Has_Transport AND NOT uet.Has_Energy THEN 'Transportation Only'
+            WHEN uet.Has_Energy AND NOT uet.Has_Transport THEN 'Energy Only'
+            ELSE 'Both Activities'
+        END as Activity_Type
     FROM User_Profile up
-    WHERE EXISTS (
-        SELECT 1 FROM Transportation t WHERE t.User_ID = up.User_ID
-    )
-    AND EXISTS (
-        SELECT 1 FROM Energy_Consumption ec WHERE ec.User_ID = up.User_ID
-    )
-    
-    ORDER BY User_ID;
+    JOIN User_Emission_Totals uet ON uet.User_ID = up.User_ID
+    -- Users with transportation, energy consumption or both
+    WHERE uet.Has_Transport OR uet.Has_Energy
+    ORDER BY up.User_ID;
     """,
     
     # Self-join example
@@ -0,0 +1,136 @@
+# Data entry categories shared by the Insert Data forms and the bulk importer:
+# the table each one writes to, its columns in insert order, and the numeric
+# column with the label used in its validation message.
+CATEGORIES = {
+    "User Profile": {
+        'table': 'User_Profile',
+        'columns': ['Full_Name', 'Email', 'Location'],
+        'numeric': None
+    },
+    "Transportation": {
+        'table': 'Transportation',
+        'columns': ['User_ID', 'Vehicle_Type', 'Distance_KM', 'Date'],
+        'numeric': ('Distance_KM', "Distance")
+    },
+    "Energy Consumption": {
+        'table': 'Energy_Consumption',
+        'columns': ['User_ID', 'Energy_Source', 'Consumption_KWH', 'Date'],
+        'numeric': ('Consumption_KWH', "Consumption")
+    },
+    "Waste Management": {
+        'table': 'Waste_Management',
+        'columns': ['User_ID', 'Waste_Type', 'Waste_Weight_KG', 'Date'],
+        'numeric': ('Waste_Weight_KG', "Weight")
+    },
+    "Industrial Activity": {
+        'table': 'Industrial_Activity',
+        'columns': ['User_ID', 'Activity_Type', 'Emission_Produced', 'Date'],
+        'numeric': ('Emission_Produced', "Emission")
+    },
+    "Carbon Offset": {
+        'table': 'Carbon_Offset',
+        'columns': ['User_ID', 'Offset_Type', 'Offset_Amount', 'Date'],
+        'numeric': ('Offset_Amount', "Offset amount")
+    }
+}
+
+# Suggested values for the subtype field of each category, offered in the form
+# dropdowns (other values are still accepted)
+VOCABULARIES = {
+    'Vehicle_Type': ["Car", "Bus", "Train", "Airplane", "Bicycle", "Electric Car", "Motorcycle", "Walking"],
+    'Energy_Source': ["Electricity", "Natural Gas", "Solar", "Wind", "Coal", "Biomass", "Geothermal"],
+    'Waste_Type': ["Plastic", "Paper", "Glass", "Metal", "Organic", "Electronic", "Hazardous"],
+    'Activity_Type': ["Manufacturing", "Construction", "Chemical Processing", "Food Processing",
+                      "Textile Production", "Mining", "Agriculture"],
+    'Offset_Type': ["Tree Planting", "Renewable Energy Credits", "Methane Capture",
+                    "Carbon Sequestration", "Energy Efficiency"]
+}
+
+class ValidationError(ValueError):
+    """A record failed validation; the message is shown to the user"""
+
+def find_category(name):
+    """Look up a category by its display name or table name (case-insensitive)"""
+    key = name.strip().lower().replace('_', ' ')
+    for category, spec in CATEGORIES.items():
+        if key in (category.lower(), spec['table'].lower().replace('_', ' ')):
+            return category
+    raise KeyError(f"Unknown category: {name}")
+
+def validate_record(category, values):
+    """Validate one record and return it as a tuple ready to insert
+
+    `values` holds the raw values in the order of the category's columns.
+    Every field is required, User_ID must be an integer and the numeric
+    column a number.
+    """
+    spec = CATEGORIES[category]
+    values = [value.strip() if isinstance(value, str) else value for value in values]
+
+    if len(values) != len(spec['columns']) or any(value is None or value == '' for value in values):
+        raise ValidationError("Please fill in all fields")
+
+    record = []
+    for column, value in zip(spec['columns'], values):
+        if column == 'User_ID':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValidationError("User ID must be an integer")
+            if not value:
+                raise ValidationError("Please fill in all fields")
+        elif spec['numeric'] and column == spec['numeric'][0]:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValidationError(f"{spec['numeric'][1]} must be a number")
+        record.append(value)
+    return tuple(record)
+
+# Rows converted together by validate_records' column-wise fast path
+VALIDATION_BLOCK = 1024
+
+def validate_records(category, rows):
+    """Validate many records at once; return (records, rejects)
+
+    Gives the same result as calling validate_record on every row, but
+    converts whole columns at a time. A block that fails the fast path is
+    re-checked row by row, so rejects holds (index, message) for exactly the
+    rows validate_record would reject.
+    """
+    spec = CATEGORIES[category]
+    converters = []
+    for column in spec['columns']:
+        if column == 'User_ID':
+            converters.append(int)
+        elif spec['numeric'] and column == spec['numeric'][0]:
+            converters.append(float)
+        else:
+            converters.append(str.strip)
+
+    records, rejects = [], []
+    for start in range(0, len(rows), VALIDATION_BLOCK):
+        block = rows[start:start + VALIDATION_BLOCK]
+        try:
+            if set(map(len, block)) != {len(converters)}:
+                raise ValueError
+            columns = [list(map(convert, values)) for convert, values in zip(converters, zip(*block))]
+            # Blank text and a zero user id are rejected like missing fields
+            for convert, values in zip(converters, columns):
+                if (convert is str.strip and '' in values) or (convert is int and 0 in values):
+                    raise ValueError
+            records.extend(zip(*columns))
+        except (TypeError, ValueError):
+            for i, values in enumerate(block, start=start):
+                try:
+                    records.append(validate_record(category, values))
+                except ValidationError as e:
+                    rejects.append((i, str(e)))
+    return records, rejects
+
+def insert_sql(category):
+    """The parameterised INSERT statement for a category"""
+    spec = CATEGORIES[category]
+    columns = ", ".join(spec['columns'])
+    placeholders = ", ".join("?" for _ in spec['columns'])
+    return f"INSERT INTO {spec['table']} ({columns}) VALUES ({placeholders})"